@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""Controle de admissão das escritas.
+
+Quando o banco de dados está saturado, as escritas acumulam, excedem o
+tempo limite do proxy e são repetidas pelos clientes, o que agrava a
+sobrecarga. O controle de admissão limita, por escopo da view, quantas
+escritas são executadas ao mesmo tempo no processo:
+
+* as requisições acima do limite aguardam em uma fila limitada a
+  `ADMISSAO_FILA` posições, na ordem de chegada;
+* nenhuma requisição aguarda mais de `ADMISSAO_ESPERA` segundos. Quando a
+  espera estimada (posição na fila x latência média / limite) excede esse
+  prazo, a requisição é recusada imediatamente com 503 e `Retry-After`,
+  em vez de ocupar o servidor até o tempo limite do proxy;
+* o limite se adapta à latência observada (AIMD): cresce aos poucos
+  enquanto as escritas estão saturadas e rápidas e é reduzido pela metade
+  quando a latência excede `ADMISSAO_TOLERANCIA` vezes a latência base (a
+  menor observada) ou quando a escrita falha com erro do servidor.
+
+Assim o banco recebe apenas a concorrência que consegue atender e a vazão
+se mantém na capacidade, em vez de colapsar.
+"""
+import math
+import threading
+import time
+
+from collections import deque
+from typing import Optional
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import SAFE_METHODS
+
+from .constants import SERVICO_SOBRECARREGADO
+
+
+# Fator aplicado ao limite quando a latência indica congestionamento
+REDUCAO = 0.5
+# Fração pela qual a latência base pode crescer a cada escrita, para que o
+# limite se ajuste quando as escritas ficam mais lentas de forma permanente
+DERIVA_BASE = 0.01
+# Peso da última latência na média móvel exponencial
+PESO_MEDIA = 0.2
+
+
+class ServicoSobrecarregado(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = SERVICO_SOBRECARREGADO
+    default_code = 'servico_sobrecarregado'
+
+    def __init__(self, wait: float, detail=None, code=None):
+        super().__init__(detail, code)
+        # O DRF envia `wait` no cabeçalho Retry-After
+        self.wait = wait
+
+
+class Espera:
+    """Posição de uma requisição na fila"""
+    __slots__ = ('evento', 'admitida')
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.admitida = False
+
+
+class ControleAdmissao:
+    """Limitador de concorrência adaptativo com fila limitada.
+
+    Args:
+        limite (int): Limite inicial de escritas simultâneas.
+        minimo (int): Menor limite possível.
+        maximo (int): Maior limite possível.
+        fila (int): Quantidade máxima de requisições aguardando.
+        espera (float): Tempo máximo, em segundos, de espera na fila.
+        tolerancia (float): Razão entre a latência e a latência base a
+        partir da qual o limite é reduzido.
+        relogio (Callable, optional): Fonte de tempo. Defaults to time.monotonic.
+    """
+
+    def __init__(self, limite: int, minimo: int, maximo: int, fila: int, espera: float,
+                 tolerancia: float, relogio=time.monotonic):
+        self.limite = float(limite)
+        self.minimo = minimo
+        self.maximo = maximo
+        self.tamanho_fila = fila
+        self.espera = espera
+        self.tolerancia = tolerancia
+        self.relogio = relogio
+        self.em_execucao = 0
+        self.fila = deque()
+        self.latencia_base = None
+        self.latencia_media = None
+        self._ultima_reducao = None
+        self._lock = threading.Lock()
+
+    @property
+    def vagas(self) -> int:
+        return max(self.minimo, int(self.limite))
+
+    def estimar_espera(self, posicao: int) -> float:
+        """Tempo estimado, em segundos, até a requisição na `posicao` da
+        fila ser executada"""
+        if self.latencia_media is None:
+            return 0
+        return self.latencia_media * math.ceil(posicao / self.vagas)
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self.estimar_espera(len(self.fila) + 1)))
+
+    def admitir(self) -> Optional[int]:
+        """Reserva uma vaga, aguardando na fila se necessário.
+
+        Returns:
+            int: None quando a requisição foi admitida ou os segundos
+            sugeridos no Retry-After quando foi recusada.
+        """
+        with self._lock:
+            if self.em_execucao < self.vagas and not self.fila:
+                self.em_execucao += 1
+                return None
+            if (len(self.fila) >= self.tamanho_fila
+                    or self.estimar_espera(len(self.fila) + 1) > self.espera):
+                return self._retry_after()
+            espera = Espera()
+            self.fila.append(espera)
+
+        espera.evento.wait(self.espera)
+        with self._lock:
+            # A vaga pode ter sido cedida junto com o fim do prazo
+            if espera.admitida:
+                return None
+            self.fila.remove(espera)
+            return self._retry_after()
+
+    def liberar(self, latencia: float, sucesso: bool = True):
+        """Libera a vaga de uma requisição admitida, ajusta o limite pela
+        latência observada e cede as vagas livres às requisições da fila"""
+        with self._lock:
+            self._ajustar(latencia, sucesso)
+            self.em_execucao -= 1
+            while self.fila and self.em_execucao < self.vagas:
+                espera = self.fila.popleft()
+                espera.admitida = True
+                self.em_execucao += 1
+                espera.evento.set()
+
+    def _ajustar(self, latencia: float, sucesso: bool):
+        if self.latencia_base is None:
+            self.latencia_base = self.latencia_media = latencia
+        else:
+            self.latencia_base = min(latencia, self.latencia_base * (1 + DERIVA_BASE))
+            self.latencia_media += PESO_MEDIA * (latencia - self.latencia_media)
+
+        if not sucesso or latencia > self.latencia_base * self.tolerancia:
+            # Uma redução por "ciclo": as escritas que já estavam em execução
+            # durante o congestionamento não reduzem o limite novamente
+            agora = self.relogio()
+            if self._ultima_reducao is None or agora - self._ultima_reducao >= self.latencia_media:
+                self._ultima_reducao = agora
+                self.limite = max(self.minimo, self.limite * REDUCAO)
+        elif self.fila or self.em_execucao >= self.vagas:
+            # Aumento aditivo de uma vaga a cada `limite` escritas saturadas
+            self.limite = min(self.maximo, self.limite + 1 / self.limite)
+
+
+# escopo -> ControleAdmissao
+_controles = {}
+_controles_lock = threading.Lock()
+
+
+def controle_admissao(escopo: str) -> ControleAdmissao:
+    """Retorna o controle de admissão do escopo, criando-o no primeiro uso"""
+    try:
+        return _controles[escopo]
+    except KeyError:
+        pass
+
+    with _controles_lock:
+        if escopo not in _controles:
+            _controles[escopo] = ControleAdmissao(
+                settings.ADMISSAO_LIMITE_INICIAL,
+                settings.ADMISSAO_LIMITE_MINIMO,
+                settings.ADMISSAO_LIMITE_MAXIMO,
+                settings.ADMISSAO_FILA,
+                settings.ADMISSAO_ESPERA,
+                settings.ADMISSAO_TOLERANCIA)
+        return _controles[escopo]
+
+
+@receiver(setting_changed)
+def _reiniciar_controles(setting, **kwargs):
+    if setting.startswith('ADMISSAO_'):
+        with _controles_lock:
+            _controles.clear()
+
+
+class AdmissaoMixin:
+    """Submete as escritas da view ao controle de admissão do seu escopo
+    (`throttle_escopo` ou o nome da classe). A vaga é reservada após as
+    checagens do DRF (autenticação, permissões e throttle) e liberada ao
+    fim da requisição, mesmo quando a view levanta uma exceção."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if not settings.ADMISSAO_ESCRITAS or request._request.method in SAFE_METHODS:
+            return
+
+        controle = controle_admissao(
+            getattr(self, 'throttle_escopo', None) or self.__class__.__name__)
+        retry_after = controle.admitir()
+        if retry_after is not None:
+            raise ServicoSobrecarregado(retry_after)
+        self.admissao = (controle, time.monotonic())
+
+    def dispatch(self, request, *args, **kwargs):
+        self.admissao = None
+        response = None
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+            return response
+        finally:
+            if self.admissao is not None:
+                controle, inicio = self.admissao
+                self.admissao = None
+                controle.liberar(
+                    time.monotonic() - inicio,
+                    sucesso=response is not None and response.status_code < 500)
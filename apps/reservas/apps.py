@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ReservasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.reservas'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .shards import verificar_configuracao
+
+        verificar_configuracao()
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""Busca textual nos comentários das reservas e nos códigos dos imóveis.
+
+O índice é escolhido conforme o banco de dados:
+
+* SQLite: uma tabela FTS5 de conteúdo externo com o tokenizador `trigram`,
+  que encontra qualquer trecho com 3 ou mais caracteres. A tabela é mantida
+  sincronizada por triggers de INSERT, UPDATE e DELETE na tabela do modelo
+  e os resultados são ordenados pelo `bm25`;
+* PostgreSQL: um índice GIN sobre a expressão `to_tsvector` do campo, que o
+  próprio banco mantém atualizado. São encontradas as palavras e os seus
+  prefixos e os resultados são ordenados pelo `ts_rank_cd`;
+* demais bancos: `icontains` sem índice, ordenado pelo id.
+
+As estruturas são criadas pela operação de migração `CriarIndiceBusca`. O
+SQLite recria a tabela do modelo em algumas alterações de schema, o que
+descarta os triggers; nesses casos, ou para corrigir um índice
+dessincronizado, execute `python manage.py reconstruir_busca`.
+"""
+import re
+
+from typing import NamedTuple
+
+from django.db import connections
+
+
+class Indice(NamedTuple):
+    tabela: str
+    campo: str
+    # Configuração do `to_tsvector` no PostgreSQL
+    configuracao: str
+
+
+# model_name -> Indice
+INDICES = {
+    'imovel': Indice('reservas_imovel', 'codigo', 'simple'),
+    'reserva': Indice('reservas_reserva', 'comentario', 'portuguese'),
+}
+
+# Tamanho mínimo dos termos buscados, imposto pelo tokenizador trigram
+TAMANHO_MINIMO_TERMO = 3
+
+
+class TermoInvalido(ValueError):
+    pass
+
+
+def termos(texto: str) -> list:
+    """Palavras do texto buscado com ao menos `TAMANHO_MINIMO_TERMO` caracteres"""
+    return [termo for termo in re.findall(r'\w+', texto or '') if len(termo) >= TAMANHO_MINIMO_TERMO]
+
+
+def _tabela_fts(indice: Indice) -> str:
+    return f'{indice.tabela}_busca'
+
+
+def _nome_indice_gin(indice: Indice) -> str:
+    return f'{indice.tabela}_{indice.campo}_busca_idx'
+
+
+def _expressao_tsvector(indice: Indice) -> str:
+    return f"to_tsvector('{indice.configuracao}', coalesce({indice.campo}, ''))"
+
+
+def sql_criar(vendor: str, model_name: str) -> list:
+    indice = INDICES[model_name]
+    if vendor == 'sqlite':
+        fts = _tabela_fts(indice)
+        tabela, campo = indice.tabela, indice.campo
+        return [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{campo}, content='{tabela}', content_rowid='id', tokenize='trigram')",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tabela} BEGIN "
+            f"INSERT INTO {fts}(rowid, {campo}) VALUES (new.id, new.{campo}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tabela} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {campo}) VALUES ('delete', old.id, old.{campo}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {campo} ON {tabela} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {campo}) VALUES ('delete', old.id, old.{campo}); "
+            f"INSERT INTO {fts}(rowid, {campo}) VALUES (new.id, new.{campo}); END",
+            f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+        ]
+    if vendor == 'postgresql':
+        return [
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {_nome_indice_gin(indice)} "
+            f"ON {indice.tabela} USING GIN ({_expressao_tsvector(indice)})",
+        ]
+    return []
+
+
+def sql_remover(vendor: str, model_name: str) -> list:
+    indice = INDICES[model_name]
+    if vendor == 'sqlite':
+        fts = _tabela_fts(indice)
+        return [
+            *(f"DROP TRIGGER IF EXISTS {fts}_{sufixo}" for sufixo in ('ai', 'ad', 'au')),
+            f"DROP TABLE IF EXISTS {fts}",
+        ]
+    if vendor == 'postgresql':
+        return [f"DROP INDEX CONCURRENTLY IF EXISTS {_nome_indice_gin(indice)}"]
+    return []
+
+
+def reconstruir(model, using: str = 'default'):
+    """Recria as estruturas de busca do modelo e reindexa o seu conteúdo"""
+    connection = connections[using]
+    model_name = model._meta.model_name
+    if connection.vendor == 'postgresql':
+        indice = INDICES[model_name]
+        comandos = [
+            *sql_criar(connection.vendor, model_name),
+            f"REINDEX INDEX CONCURRENTLY {_nome_indice_gin(indice)}"]
+    else:
+        comandos = [*sql_remover(connection.vendor, model_name), *sql_criar(connection.vendor, model_name)]
+
+    with connection.cursor() as cursor:
+        for comando in comandos:
+            cursor.execute(comando)
+
+
+def buscar(model, texto: str, limite: int, deslocamento: int = 0, using: str = 'default') -> list:
+    """Busca os objetos do modelo cujo campo indexado contém os termos
+    informados (todos eles), em ordem de relevância.
+
+    Returns:
+        list: Tuplas (id, relevância).
+
+    Raises:
+        TermoInvalido: Quando o texto não possui termos com o tamanho mínimo.
+    """
+    palavras = termos(texto)
+    if not palavras:
+        raise TermoInvalido(texto)
+
+    indice = INDICES[model._meta.model_name]
+    connection = connections[using]
+
+    if connection.vendor == 'sqlite':
+        fts = _tabela_fts(indice)
+        # Cada termo entre aspas é buscado como um trecho literal
+        consulta = ' AND '.join(f'"{palavra}"' for palavra in palavras)
+        sql = (f"SELECT rowid, -rank FROM {fts} WHERE {fts} MATCH %s "
+               f"ORDER BY rank LIMIT %s OFFSET %s")
+        parametros = [consulta, limite, deslocamento]
+    elif connection.vendor == 'postgresql':
+        consulta = ' & '.join(f"'{palavra}':*" for palavra in palavras)
+        sql = (f"SELECT id, ts_rank_cd({_expressao_tsvector(indice)}, consulta) AS relevancia "
+               f"FROM {indice.tabela}, to_tsquery('{indice.configuracao}', %s) consulta "
+               f"WHERE {_expressao_tsvector(indice)} @@ consulta "
+               f"ORDER BY relevancia DESC, id LIMIT %s OFFSET %s")
+        parametros = [consulta, limite, deslocamento]
+    else:
+        queryset = model._default_manager.using(using)
+        for palavra in palavras:
+            queryset = queryset.filter(**{f'{indice.campo}__icontains': palavra})
+        return [
+            (pk, 0.0) for pk in
+            queryset.order_by('pk').values_list('pk', flat=True)[deslocamento:deslocamento + limite]]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros)
+        return [(pk, float(relevancia)) for pk, relevancia in cursor.fetchall()]
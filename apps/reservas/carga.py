@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""Carga rápida de fixtures de imóveis, anúncios e reservas.
+
+Alternativa ao `loaddata` para conjuntos grandes de dados. O arquivo é lido
+em streaming, em JSON (o formato do `dumpdata`) ou NDJSON (um objeto por
+linha), e os objetos são inseridos com `bulk_create` em blocos dentro de uma
+única transação, com as checagens de chaves estrangeiras adiadas para o fim
+da carga.
+
+As datas de cadastro e atualização presentes no arquivo são preservadas,
+assim como no `loaddata`. Os sinais de `save` não são disparados, portanto
+a carga não gera registros no log de mudanças.
+
+Também oferece cópias (snapshots) de bancos SQLite, que permitem restaurar
+um banco previamente carregado sem processar as fixtures novamente.
+"""
+import contextlib
+import json
+import os
+import sqlite3
+
+from typing import IO, Iterable, Iterator, Union
+
+from django.apps import apps
+from django.core.management.color import no_style
+from django.core.serializers.base import DeserializationError
+from django.core.serializers.python import Deserializer
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .codigos import gerar as gerar_codigo_curto
+from .disponibilidade import invalidar_agendas
+from .models import Anuncio, Imovel, Reserva
+
+
+# Modelos aceitos, em ordem de dependência
+MODELOS = (Imovel, Anuncio, Reserva)
+
+TAMANHO_BLOCO_PADRAO = 2000
+
+EXTENSOES_NDJSON = ('.ndjson', '.jsonl')
+
+# Tamanho das leituras do arquivo JSON
+TAMANHO_LEITURA = 1 << 16
+
+
+class SnapshotIndisponivel(Exception):
+    """O banco informado não suporta snapshots (apenas o SQLite suporta)"""
+
+
+def ler_ndjson(arquivo: IO[str]) -> Iterator[dict]:
+    for linha in arquivo:
+        linha = linha.strip()
+        if linha:
+            yield json.loads(linha)
+
+
+def ler_json(arquivo: IO[str]) -> Iterator[dict]:
+    """Lê os objetos de uma lista JSON sem carregar o arquivo inteiro na memória"""
+    decodificador = json.JSONDecoder()
+    buffer = arquivo.read(TAMANHO_LEITURA).lstrip()
+    if not buffer.startswith('['):
+        raise DeserializationError("A fixture deve conter uma lista de objetos.")
+    buffer = buffer[1:]
+    fim_arquivo = False
+
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            objeto, posicao = decodificador.raw_decode(buffer)
+        except json.JSONDecodeError:
+            # Objeto incompleto no buffer, ler o restante do arquivo
+            if fim_arquivo:
+                raise DeserializationError("Fixture JSON inválida ou incompleta.")
+            dados = arquivo.read(TAMANHO_LEITURA)
+            fim_arquivo = not dados
+            buffer += dados
+            continue
+        yield objeto
+        buffer = buffer[posicao:]
+
+
+def ler_fixture(arquivo: IO[str], ndjson: bool = False) -> Iterator[dict]:
+    return ler_ndjson(arquivo) if ndjson else ler_json(arquivo)
+
+
+def localizar_fixture(nome: str) -> str:
+    """Retorna o caminho da fixture, procurando nos diretórios `fixtures`
+    das aplicações quando o nome não for um caminho existente"""
+    if os.path.exists(nome):
+        return nome
+    for config in apps.get_app_configs():
+        caminho = os.path.join(config.path, 'fixtures', nome)
+        if os.path.exists(caminho):
+            return caminho
+    raise FileNotFoundError(nome)
+
+
+@contextlib.contextmanager
+def datas_automaticas_desabilitadas():
+    """Desabilita o `auto_now` e `auto_now_add` dos modelos carregados, para
+    que o `bulk_create` mantenha as datas informadas na fixture"""
+    campos = [
+        campo for modelo in MODELOS for campo in modelo._meta.concrete_fields
+        if getattr(campo, 'auto_now', False) or getattr(campo, 'auto_now_add', False)]
+    originais = [(campo, campo.auto_now, campo.auto_now_add) for campo in campos]
+    try:
+        for campo in campos:
+            campo.auto_now = campo.auto_now_add = False
+        yield
+    finally:
+        for campo, auto_now, auto_now_add in originais:
+            campo.auto_now, campo.auto_now_add = auto_now, auto_now_add
+
+
+def carregar_objetos(objetos: Iterable[dict], using: str = DEFAULT_DB_ALIAS,
+                     tamanho_bloco: int = TAMANHO_BLOCO_PADRAO) -> dict:
+    """Insere objetos no formato de serialização do Django.
+
+    Args:
+        objetos (Iterable[dict]): Objetos com as chaves "model", "pk" e "fields".
+        using (str, optional): Banco de dados. Defaults to 'default'.
+        tamanho_bloco (int, optional): Objetos por `bulk_create`. Defaults to 2000.
+
+    Returns:
+        dict: Quantidade de objetos inseridos por modelo.
+    """
+    conexao = connections[using]
+    pendentes = {modelo: [] for modelo in MODELOS}
+    totais = {modelo: 0 for modelo in MODELOS}
+
+    def inserir(modelo):
+        objetos = pendentes[modelo]
+        if modelo is Reserva:
+            # Os códigos curtos derivam do id, informado na fixture
+            for reserva in objetos:
+                if reserva.codigo_curto is None and reserva.pk is not None:
+                    reserva.codigo_curto = gerar_codigo_curto(reserva.pk)
+        modelo.objects.using(using).bulk_create(objetos)
+        if modelo is Reserva:
+            # Reservas sem id na fixture recebem o código após a inserção
+            sem_codigo = [reserva for reserva in objetos if reserva.codigo_curto is None]
+            for reserva in sem_codigo:
+                reserva.codigo_curto = gerar_codigo_curto(reserva.pk)
+            Reserva.objects.using(using).bulk_update(sem_codigo, ['codigo_curto'])
+        totais[modelo] += len(objetos)
+        pendentes[modelo] = []
+
+    with transaction.atomic(using=using), datas_automaticas_desabilitadas():
+        with conexao.constraint_checks_disabled():
+            for deserializado in Deserializer(objetos, using=using):
+                instancia = deserializado.object
+                modelo = type(instancia)
+                if modelo not in pendentes:
+                    raise DeserializationError(
+                        f"O modelo {modelo._meta.label} não é suportado pela carga rápida.")
+                pendentes[modelo].append(instancia)
+                if len(pendentes[modelo]) >= tamanho_bloco:
+                    inserir(modelo)
+
+            for modelo in MODELOS:
+                if pendentes[modelo]:
+                    inserir(modelo)
+
+        # Checagem adiada das chaves estrangeiras, como no `loaddata`
+        conexao.check_constraints(table_names=[modelo._meta.db_table for modelo in MODELOS])
+
+        # Com chaves primárias explícitas as sequências precisam ser atualizadas
+        sql = conexao.ops.sequence_reset_sql(no_style(), MODELOS)
+        if sql:
+            with conexao.cursor() as cursor:
+                for comando in sql:
+                    cursor.execute(comando)
+
+        transaction.on_commit(invalidar_agendas, using=using)
+
+    return {modelo._meta.label: total for modelo, total in totais.items()}
+
+
+def carregar_fixture(nome: str, using: str = DEFAULT_DB_ALIAS,
+                     tamanho_bloco: int = TAMANHO_BLOCO_PADRAO) -> dict:
+    """Carrega uma fixture JSON ou NDJSON (extensões .ndjson e .jsonl)"""
+    caminho = localizar_fixture(nome)
+    with open(caminho, encoding='utf-8') as arquivo:
+        return carregar_objetos(
+            ler_fixture(arquivo, ndjson=caminho.endswith(EXTENSOES_NDJSON)),
+            using=using, tamanho_bloco=tamanho_bloco)
+
+
+def _conexao_sqlite(using: str) -> sqlite3.Connection:
+    conexao = connections[using]
+    if conexao.vendor != 'sqlite':
+        raise SnapshotIndisponivel("Snapshots estão disponíveis apenas para o SQLite.")
+    conexao.ensure_connection()
+    return conexao.connection
+
+
+def salvar_snapshot(caminho: Union[str, os.PathLike], using: str = DEFAULT_DB_ALIAS):
+    """Copia o banco SQLite para o arquivo com a API de backup do SQLite"""
+    destino = sqlite3.connect(caminho)
+    try:
+        _conexao_sqlite(using).backup(destino)
+    finally:
+        destino.close()
+
+
+def restaurar_snapshot(caminho: Union[str, os.PathLike], using: str = DEFAULT_DB_ALIAS):
+    """Substitui o conteúdo do banco SQLite pelo snapshot salvo no arquivo"""
+    if not os.path.exists(caminho):
+        raise FileNotFoundError(caminho)
+    origem = sqlite3.connect(caminho)
+    try:
+        origem.backup(_conexao_sqlite(using))
+    finally:
+        origem.close()
+    invalidar_agendas()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""Coalescência de requisições idênticas e simultâneas ("single-flight").
+
+Quando vários clientes pedem o mesmo recurso ao mesmo tempo, apenas a
+primeira requisição (a líder) executa a consulta e a serialização. As
+demais, enquanto a líder está em andamento, aguardam o seu resultado e
+recebem uma cópia da resposta já renderizada. Nada é guardado após a
+conclusão: uma requisição que chega depois executa normalmente.
+
+Apenas requisições anônimas, sem `Cookie` nem `Authorization`, são
+coalescidas (`coalescivel`): a resposta renderizada pela líder pode
+depender de quem a pediu (ex: o usuário e o token CSRF na API navegável).
+
+As views do DRF são síncronas, então também no ASGI o Django as executa
+em threads (uma por requisição, através do `ThreadSensitiveContext`) e a
+espera com as primitivas de `threading` não bloqueia o event loop.
+"""
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+
+
+class Voo:
+    """Execução em andamento de uma chave"""
+
+    def __init__(self):
+        self.concluido = threading.Event()
+        self.resultado = None
+        self.erro = None
+        self.aguardando = 0
+
+
+class RespostaRenderizada:
+    """Conteúdo, status e cabeçalhos de uma resposta já renderizada,
+    compartilhados entre as requisições coalescidas"""
+
+    def __init__(self, response):
+        self.status = response.status_code
+        self.conteudo = response.content
+        self.cabecalhos = list(response.items())
+
+    def response(self) -> HttpResponse:
+        """Uma nova resposta para cada requisição, já que os middlewares
+        podem alterá-la (ex: compressão)"""
+        response = HttpResponse(self.conteudo, status=self.status)
+        for nome, valor in self.cabecalhos:
+            response[nome] = valor
+        return response
+
+
+class Coalescedor:
+    """Agrupa as execuções simultâneas de uma mesma chave"""
+
+    def __init__(self):
+        self._voos = {}
+        self._lock = threading.Lock()
+
+    def executar(self, chave: str, funcao, espera: float = None):
+        """Executa `funcao` ou, se outra thread já a executa para a mesma
+        chave, aguarda e retorna o seu resultado. Os erros da líder são
+        repassados às requisições que a aguardavam. Após `espera` segundos
+        sem resultado a requisição executa `funcao` por conta própria."""
+        with self._lock:
+            voo = self._voos.get(chave)
+            lider = voo is None
+            if lider:
+                voo = self._voos[chave] = Voo()
+            else:
+                voo.aguardando += 1
+
+        if not lider:
+            if voo.concluido.wait(espera):
+                if voo.erro is not None:
+                    raise voo.erro
+                if voo.resultado is not None:
+                    return voo.resultado
+            return funcao()
+
+        try:
+            voo.resultado = funcao()
+        except Exception as erro:
+            voo.erro = erro
+            raise
+        finally:
+            with self._lock:
+                del self._voos[chave]
+            voo.concluido.set()
+        return voo.resultado
+
+    def em_andamento(self, chave: str) -> int:
+        """Quantidade de requisições aguardando a líder da chave ou None"""
+        with self._lock:
+            voo = self._voos.get(chave)
+            return None if voo is None else voo.aguardando
+
+
+coalescedor = Coalescedor()
+
+
+def coalescivel(request) -> bool:
+    """Indica se a resposta não depende das credenciais do cliente: sem
+    cookies, sem `Authorization` e sem usuário autenticado"""
+    if request.headers.get('Cookie') or request.headers.get('Authorization'):
+        return False
+    usuario = getattr(request, 'user', None)
+    return not (usuario is not None and usuario.is_authenticated)
+
+
+def chave_requisicao(request) -> str:
+    """Chave das requisições que produzem a mesma resposta: método, host,
+    caminho com a query string e os cabeçalhos de `COALESCENCIA_CABECALHOS`"""
+    cabecalhos = '|'.join(
+        request.headers.get(nome, '') for nome in settings.COALESCENCIA_CABECALHOS)
+    return f'{request.method}|{request.get_host()}|{request.get_full_path()}|{cabecalhos}'
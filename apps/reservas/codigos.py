@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Códigos curtos das reservas, fáceis de ditar por telefone.
+
+O código é derivado do id da reserva, o que garante que não há colisões
+sem consultas ao banco:
+
+1. o id é embaralhado por uma multiplicação módulo 2^40 (uma bijeção), para
+   que reservas consecutivas não tenham códigos parecidos. Não é uma medida
+   de segurança: o id pode ser recuperado a partir do código;
+2. o resultado é escrito com 8 caracteres do base32 de Crockford, que não
+   usa as letras I, L, O e U, facilmente confundidas;
+3. um dígito verificador (Luhn módulo 32) é acrescentado, detectando
+   qualquer caractere errado e quase todas as trocas de dois caracteres
+   vizinhos.
+
+Na leitura o código é normalizado: maiúsculas e minúsculas são
+equivalentes, hífens e espaços são ignorados e O, I e L são lidos como 0,
+1 e 1. Exemplo: `KRVQ-KEBZ-S` (reserva 1).
+"""
+from typing import Optional
+
+
+ALFABETO = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+BASE = len(ALFABETO)
+VALORES = {caractere: valor for valor, caractere in enumerate(ALFABETO)}
+SUBSTITUICOES = str.maketrans({'O': '0', 'I': '1', 'L': '1', '-': None, ' ': None})
+
+BITS = 40
+MODULO = 1 << BITS
+# Ímpar, portanto inversível módulo 2^40
+MULTIPLICADOR = 0x9E3779B97F
+INVERSO = pow(MULTIPLICADOR, -1, MODULO)
+
+TAMANHO_SEQUENCIA = BITS // 5
+TAMANHO = TAMANHO_SEQUENCIA + 1
+
+
+def digito_verificador(sequencia: str) -> str:
+    """Dígito verificador Luhn módulo 32 da sequência"""
+    soma = 0
+    for posicao, caractere in enumerate(reversed(sequencia)):
+        valor = VALORES[caractere] * (2 if posicao % 2 == 0 else 1)
+        soma += valor // BASE + valor % BASE
+    return ALFABETO[-soma % BASE]
+
+
+def gerar(numero: int) -> str:
+    """Código curto do número (o id da reserva)"""
+    if not 0 < numero < MODULO:
+        raise ValueError(f'O número deve estar entre 1 e {MODULO - 1}.')
+
+    valor = numero * MULTIPLICADOR % MODULO
+    caracteres = []
+    for _ in range(TAMANHO_SEQUENCIA):
+        valor, resto = divmod(valor, BASE)
+        caracteres.append(ALFABETO[resto])
+    sequencia = ''.join(reversed(caracteres))
+    return sequencia + digito_verificador(sequencia)
+
+
+def normalizar(codigo: str) -> Optional[str]:
+    """Código no formato armazenado ou None quando ele não é válido, o que
+    dispensa a consulta ao banco"""
+    codigo = codigo.upper().translate(SUBSTITUICOES)
+    if len(codigo) != TAMANHO or any(caractere not in VALORES for caractere in codigo):
+        return None
+    if digito_verificador(codigo[:-1]) != codigo[-1]:
+        return None
+    return codigo
+
+
+def numero(codigo: str) -> int:
+    """Número a partir do qual o código (normalizado) foi gerado"""
+    valor = 0
+    for caractere in codigo[:TAMANHO_SEQUENCIA]:
+        valor = valor * BASE + VALORES[caractere]
+    return valor * INVERSO % MODULO
+
+
+def formatar(codigo: str) -> str:
+    """Código agrupado com hífens, para exibição"""
+    return f'{codigo[:4]}-{codigo[4:8]}-{codigo[8:]}'
@@ -21,3 +21,38 @@ VALIDADOR_RESERVA_INDISPONIVEL = _(
 VALIDADOR_ACOMODACOES = _(
     'O imóvel não pode acomodar todos os hospedes. '
     'O limite de hospedes no imóvel é %(capacidade)s, %(excedente)s a mais que a quantidade indicada')
+
+PARAMETRO_INVALIDO = _('O parâmetro "%(parametro)s" deve ser um número inteiro não negativo.')
+
+DATA_HORA_INVALIDA = _('Informe uma data e hora no formato ISO 8601.')
+
+LOTE_IDS_INVALIDOS = _('Informe uma lista de ids numéricos.')
+
+LOTE_LIMITE_EXCEDIDO = _('É permitido informar no máximo %(limite)s ids por requisição.')
+
+LOTE_SELECAO_OBRIGATORIA = _('Informe os "ids" e/ou o "filtro" dos objetos afetados pela operação.')
+
+LOTE_CAMPO_NAO_PERMITIDO = _('O campo "%(campo)s" não pode ser utilizado em operações em lote.')
+
+LOTE_FILTRO_INVALIDO = _('O valor informado para o campo "%(campo)s" não é válido.')
+
+LOTE_VALORES_OBRIGATORIOS = _('Informe os "valores" a serem atribuídos aos objetos.')
+
+LOTE_SHARD_DIFERENTE = _('Há objetos selecionados armazenados em outro servidor que não podem ser associados ao '
+                         'valor do campo "%(campo)s".')
+
+VALIDADOR_JANELA_HORIZONTE = _('A data final da busca deve ser posterior à data inicial.')
+
+EXPORTACAO_FORMATO_INVALIDO = _('Formato inválido. Os formatos disponíveis são: %(formatos)s.')
+
+EXPORTACAO_INDISPONIVEL = _('A exportação não está disponível neste servidor.')
+
+SERVICO_SOBRECARREGADO = _('O servidor está sobrecarregado. Tente novamente em instantes.')
+
+BUSCA_TERMO_INVALIDO = _('Informe ao menos um termo com %(tamanho)s ou mais caracteres.')
+
+IMOVEL_EM_MIGRACAO = _('O imóvel está sendo movido para outro servidor. Tente novamente em instantes.')
+
+ANUNCIO_SHARD_DIFERENTE = _('O anúncio não pode ser transferido para um imóvel armazenado em outro servidor.')
+
+PRE_RESERVA_EXPIRADA = _('A pré-reserva expirou. Crie uma nova pré-reserva para o período.')
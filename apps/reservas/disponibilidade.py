@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""Motor de disponibilidade em memória.
+
+Mantém, para cada imóvel, os intervalos reservados ordenados pela data de
+check-in, permitindo checar conflitos e encontrar janelas livres com buscas
+binárias em vez de uma consulta ao banco por verificação.
+
+As agendas são carregadas sob demanda e associadas a uma versão armazenada
+no cache do Django. Toda escrita em reservas ou anúncios incrementa a versão
+do imóvel após o commit e a versão é conferida a cada uso, então agendas
+desatualizadas são recarregadas. Com um backend de cache compartilhado
+(Redis, Memcached) a coerência vale entre processos; com o `LocMemCache`
+padrão vale apenas dentro do processo.
+"""
+import threading
+
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Anuncio, Imovel, Reserva
+from .shards import obter, shard_do_imovel
+
+
+UM_DIA = timedelta(days=1)
+
+# Versão global, incrementada por operações em lote que não identificam
+# os imóveis afetados
+CHAVE_VERSAO_GLOBAL = 'disponibilidade:versao'
+
+
+def _chave_versao(imovel_id: int) -> str:
+    return f'disponibilidade:versao:{imovel_id}'
+
+
+def versao_agenda(imovel_id: int) -> tuple:
+    """Retorna a versão atual da agenda do imóvel"""
+    chave = _chave_versao(imovel_id)
+    versoes = cache.get_many([CHAVE_VERSAO_GLOBAL, chave])
+    return versoes.get(CHAVE_VERSAO_GLOBAL, 0), versoes.get(chave, 0)
+
+
+def _incrementar(chave: str):
+    try:
+        cache.incr(chave)
+    except ValueError:
+        # Chave inexistente ou removida do cache
+        if not cache.add(chave, 1, timeout=None):
+            cache.incr(chave)
+
+
+def invalidar_agenda(imovel_id: int):
+    """Invalida a agenda do imóvel em todos os processos"""
+    _incrementar(_chave_versao(imovel_id))
+
+
+def invalidar_agendas():
+    """Invalida as agendas de todos os imóveis"""
+    _incrementar(CHAVE_VERSAO_GLOBAL)
+
+
+def carregar_anuncio(anuncio_id) -> Optional[Anuncio]:
+    """Anúncio (apenas o id do imóvel) no shard em que está ou None quando o
+    id é inválido ou não existe, casos tratados pela validação do serializer"""
+    try:
+        return obter(Anuncio.objects.only('imovel_id'), int(anuncio_id))
+    except (TypeError, ValueError):
+        return None
+
+
+def bloquear_imovel(imovel_id: int, using: str):
+    """Bloqueia a linha do imóvel até o fim da transação atual
+    (`SELECT ... FOR UPDATE`), serializando as escritas que validam e ocupam
+    períodos do mesmo imóvel: criação de reservas e pré-reservas, confirmação
+    de pré-reservas e remarcação. O SQLite ignora o bloqueio."""
+    list(Imovel.objects.using(using).select_for_update().filter(
+        pk=imovel_id).values_list('pk', flat=True))
+
+
+def janelas_livres(intervalos: Iterable[tuple], inicio: date, fim: date, noites: int,
+                   limite: int = 1, inclusivo: bool = True) -> List[dict]:
+    """Encontra as primeiras janelas livres para uma estadia de `noites`
+    noites com uma única varredura sobre os intervalos reservados.
+
+    Args:
+        intervalos (Iterable[tuple]): Pares (check-in, check-out) ordenados pelo check-in.
+        inicio (date): Data mínima de check-in.
+        fim (date): Data máxima de check-out.
+        noites (int): Duração da estadia.
+        limite (int, optional): Quantidade máxima de janelas. Defaults to 1.
+        inclusivo (bool, optional): Quando True o imóvel não está disponível na
+        data do check-out de outra reserva. Defaults to True.
+
+    Returns:
+        List[dict]: Uma janela por lacuna, com a primeira data de check-in
+        possível e a última data de check-out possível na lacuna.
+    """
+    folga = UM_DIA if inclusivo else timedelta()
+    estadia = timedelta(days=noites)
+    janelas = []
+    cursor = inicio
+
+    for checkin, checkout in intervalos:
+        if len(janelas) >= limite or cursor + estadia > fim:
+            return janelas
+
+        checkout_maximo = min(checkin - folga, fim)
+        if cursor + estadia <= checkout_maximo:
+            janelas.append({
+                'data_checkin': cursor,
+                'data_checkout': cursor + estadia,
+                'checkout_maximo': checkout_maximo})
+
+        cursor = max(cursor, checkout + folga)
+
+    if len(janelas) < limite and cursor + estadia <= fim:
+        janelas.append({
+            'data_checkin': cursor,
+            'data_checkout': cursor + estadia,
+            'checkout_maximo': fim})
+
+    return janelas
+
+
+class AgendaImovel:
+    """Intervalos reservados de um imóvel, ordenados pelo check-in.
+
+    `fim_maximo[i]` guarda o maior check-out entre os intervalos `0..i`,
+    o que permite interromper a busca por conflitos assim que nenhum
+    intervalo anterior alcança a data de check-in consultada."""
+    __slots__ = ('versao', 'inicios', 'fins', 'ids', 'fim_maximo')
+
+    def __init__(self, versao, intervalos: Iterable[tuple]):
+        self.versao = versao
+        self.inicios = []
+        self.fins = []
+        self.ids = []
+        self.fim_maximo = []
+
+        maior = None
+        for checkin, checkout, pk in intervalos:
+            maior = checkout if maior is None else max(maior, checkout)
+            self.inicios.append(checkin)
+            self.fins.append(checkout)
+            self.ids.append(pk)
+            self.fim_maximo.append(maior)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def conflito(self, inicio: date, fim: date, inclusivo: bool = True,
+                 ignorar: int = None) -> Optional[int]:
+        """Retorna o id de uma reserva em conflito com o intervalo ou None.
+
+        Args:
+            inicio (date): Data de check-in.
+            fim (date): Data de check-out.
+            inclusivo (bool, optional): Mesma semântica de `ReservaDisponivelValidator`,
+            o imóvel não está disponível no dia do check-out. Defaults to True.
+            ignorar (int, optional): Id de uma reserva a ser desconsiderada. Defaults to None.
+        """
+        # Intervalos com índice menor que `i` começam antes do fim consultado
+        i = bisect_right(self.inicios, fim) if inclusivo else bisect_left(self.inicios, fim)
+
+        while i > 0:
+            i -= 1
+            alcanca = self.fim_maximo[i] >= inicio if inclusivo else self.fim_maximo[i] > inicio
+            if not alcanca:
+                return None
+
+            sobrepoe = self.fins[i] >= inicio if inclusivo else self.fins[i] > inicio
+            if sobrepoe and self.ids[i] != ignorar:
+                return self.ids[i]
+        return None
+
+    def janelas_livres(self, inicio: date, fim: date, noites: int,
+                       limite: int = 1, inclusivo: bool = True) -> List[dict]:
+        """Janelas livres a partir de `inicio`. A varredura começa no primeiro
+        intervalo que pode alcançar `inicio`, localizado por busca binária."""
+        primeiro = bisect_left(self.fim_maximo, inicio)
+        return janelas_livres(
+            zip(self.inicios[primeiro:], self.fins[primeiro:]),
+            inicio, fim, noites, limite=limite, inclusivo=inclusivo)
+
+
+class MotorDisponibilidade:
+    """Cache em memória das agendas dos imóveis, limitado aos
+    `DISPONIBILIDADE_MAX_IMOVEIS` imóveis usados mais recentemente."""
+
+    def __init__(self, max_imoveis: int = None):
+        self.max_imoveis = max_imoveis
+        self._agendas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def carregar(self, imovel_id: int, versao) -> AgendaImovel:
+        intervalos = Reserva.objects.using(shard_do_imovel(imovel_id)).filter(
+            anuncio__imovel=imovel_id).order_by(
+                'data_checkin', 'data_checkout').values_list(
+                    'data_checkin', 'data_checkout', 'id')
+        return AgendaImovel(versao, intervalos)
+
+    def agenda(self, imovel_id: int) -> AgendaImovel:
+        """Retorna a agenda do imóvel, recarregando-a caso a versão tenha mudado"""
+        # A versão é lida antes dos dados: uma escrita concorrente sempre
+        # resulta em uma versão mais nova que a armazenada com a agenda
+        versao = versao_agenda(imovel_id)
+
+        with self._lock:
+            agenda = self._agendas.get(imovel_id)
+            if agenda is not None and agenda.versao == versao:
+                self._agendas.move_to_end(imovel_id)
+                return agenda
+
+        agenda = self.carregar(imovel_id, versao)
+
+        with self._lock:
+            self._agendas[imovel_id] = agenda
+            self._agendas.move_to_end(imovel_id)
+            limite = self.max_imoveis or settings.DISPONIBILIDADE_MAX_IMOVEIS
+            while len(self._agendas) > limite:
+                self._agendas.popitem(last=False)
+        return agenda
+
+    def conflito(self, imovel_id: int, inicio: date, fim: date,
+                 inclusivo: bool = True, ignorar: int = None) -> Optional[int]:
+        return self.agenda(imovel_id).conflito(
+            inicio, fim, inclusivo=inclusivo, ignorar=ignorar)
+
+    def janelas_livres(self, imovel_id: int, inicio: date, fim: date, noites: int,
+                       limite: int = 1, inclusivo: bool = True) -> List[dict]:
+        return self.agenda(imovel_id).janelas_livres(
+            inicio, fim, noites, limite=limite, inclusivo=inclusivo)
+
+    def limpar(self):
+        with self._lock:
+            self._agendas.clear()
+
+
+# Instância compartilhada pelo processo
+motor = MotorDisponibilidade()
+
+
+def motor_habilitado() -> bool:
+    return settings.DISPONIBILIDADE_MOTOR
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""Exportação colunar das reservas em Parquet ou Arrow IPC.
+
+Cada linha exportada é uma reserva com os dados do anúncio e do imóvel.
+As linhas são lidas do cursor em blocos de `tamanho_lote` e convertidas em
+record batches do Arrow, de modo que a memória utilizada depende apenas do
+tamanho do lote e não da quantidade de reservas. Os tipos das colunas são
+derivados dos campos dos modelos, preservando a precisão dos decimais e as
+datas sem conversão para texto.
+
+Requer a biblioteca `pyarrow`.
+"""
+import heapq
+
+from operator import itemgetter
+from typing import Iterator
+
+from django.db.models import QuerySet
+
+from . import shards
+from .models import Reserva
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+# Nome da coluna -> caminho do campo a partir da reserva
+COLUNAS = {
+    'id': 'id',
+    'codigo': 'codigo',
+    'codigo_curto': 'codigo_curto',
+    'data_checkin': 'data_checkin',
+    'data_checkout': 'data_checkout',
+    'preco_total': 'preco_total',
+    'qtd_hospedes': 'qtd_hospedes',
+    'comentario': 'comentario',
+    'data_cadastro': 'data_cadastro',
+    'data_atualizacao': 'data_atualizacao',
+    'anuncio_id': 'anuncio',
+    'anuncio_plataforma': 'anuncio__plataforma',
+    'anuncio_taxa_plataforma': 'anuncio__taxa_plataforma',
+    'imovel_id': 'anuncio__imovel',
+    'imovel_codigo': 'anuncio__imovel__codigo',
+    'imovel_capacidade': 'anuncio__imovel__capacidade',
+    'imovel_banheiros': 'anuncio__imovel__banheiros',
+    'imovel_aceita_animais': 'anuncio__imovel__aceita_animais',
+    'imovel_taxa_limpeza': 'anuncio__imovel__taxa_limpeza',
+    'imovel_data_ativacao': 'anuncio__imovel__data_ativacao',
+}
+
+FORMATOS = ('parquet', 'arrow')
+
+TIPOS_CONTEUDO = {
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.file',
+}
+
+TAMANHO_LOTE_PADRAO = 16384
+
+
+def pyarrow_disponivel() -> bool:
+    return pyarrow is not None
+
+
+def _campo(caminho: str):
+    modelo = Reserva
+    for nome in caminho.split('__'):
+        campo = modelo._meta.get_field(nome)
+        modelo = campo.related_model
+    return campo
+
+
+def _tipo_arrow(campo):
+    tipo = campo.get_internal_type()
+    if tipo == 'DecimalField':
+        return pyarrow.decimal128(campo.max_digits, campo.decimal_places)
+    if tipo == 'DateTimeField':
+        return pyarrow.timestamp('us', tz='UTC')
+    if tipo == 'DateField':
+        return pyarrow.date32()
+    if tipo == 'BooleanField':
+        return pyarrow.bool_()
+    if tipo in ('SmallIntegerField', 'PositiveSmallIntegerField'):
+        return pyarrow.int16()
+    if tipo in ('IntegerField', 'PositiveIntegerField'):
+        return pyarrow.int32()
+    if tipo in ('AutoField', 'BigAutoField', 'BigIntegerField', 'ForeignKey'):
+        return pyarrow.int64()
+    return pyarrow.string()
+
+
+def esquema():
+    """Esquema Arrow das colunas exportadas"""
+    campos = []
+    for nome, caminho in COLUNAS.items():
+        campo = _campo(caminho)
+        campos.append(pyarrow.field(nome, _tipo_arrow(campo), nullable=campo.null))
+    return pyarrow.schema(campos)
+
+
+def lotes_reservas(queryset: QuerySet = None,
+                   tamanho_lote: int = TAMANHO_LOTE_PADRAO) -> Iterator:
+    """Lê as reservas do cursor e gera um `RecordBatch` a cada `tamanho_lote`
+    linhas. Sem queryset são exportadas as reservas de todos os shards,
+    intercaladas pelo id."""
+    esquema_lotes = esquema()
+    # UUIDs são exportados como texto
+    uuid = list(COLUNAS).index('codigo')
+    if queryset is not None:
+        linhas = _linhas(queryset, tamanho_lote)
+    elif shards.habilitado():
+        linhas = heapq.merge(
+            *(_linhas(Reserva.objects.using(alias), tamanho_lote) for alias in shards.shards()),
+            key=itemgetter(0))
+    else:
+        linhas = _linhas(Reserva.objects.all(), tamanho_lote)
+
+    lote = []
+    for linha in linhas:
+        lote.append(linha)
+        if len(lote) == tamanho_lote:
+            yield _record_batch(lote, esquema_lotes, uuid)
+            lote = []
+    if lote:
+        yield _record_batch(lote, esquema_lotes, uuid)
+
+
+def _linhas(queryset: QuerySet, tamanho_lote: int) -> Iterator:
+    """Linhas exportadas do queryset, ordenadas pelo id (a primeira coluna)"""
+    return queryset.order_by('id').values_list(*COLUNAS.values()).iterator(
+        chunk_size=tamanho_lote)
+
+
+def _record_batch(lote: list, esquema_lote, uuid: int):
+    colunas = list(zip(*lote))
+    colunas[uuid] = [str(valor) for valor in colunas[uuid]]
+    return pyarrow.RecordBatch.from_arrays(
+        [pyarrow.array(valores, type=campo.type) for valores, campo in zip(colunas, esquema_lote)],
+        schema=esquema_lote)
+
+
+def _escritor(destino, formato: str):
+    if formato == 'parquet':
+        return pyarrow.parquet.ParquetWriter(destino, esquema())
+    return pyarrow.ipc.new_file(destino, esquema())
+
+
+def exportar(destino, formato: str = 'parquet', queryset: QuerySet = None,
+             tamanho_lote: int = TAMANHO_LOTE_PADRAO) -> int:
+    """Exporta as reservas para um arquivo.
+
+    Args:
+        destino: Caminho ou objeto com o método `write`.
+        formato (str, optional): "parquet" ou "arrow" (Arrow IPC). Defaults to 'parquet'.
+        queryset (QuerySet, optional): Reservas exportadas. Defaults to todas.
+        tamanho_lote (int, optional): Linhas por record batch. Defaults to 16384.
+
+    Returns:
+        int: Quantidade de linhas exportadas.
+    """
+    total = 0
+    with _escritor(destino, formato) as escritor:
+        for lote in lotes_reservas(queryset, tamanho_lote):
+            escritor.write_batch(lote)
+            total += lote.num_rows
+    return total
+
+
+class _Buffer:
+    """Destino em memória esvaziado a cada lote escrito"""
+
+    def __init__(self):
+        self.blocos = []
+        self.posicao = 0
+        self.closed = False
+
+    def write(self, dados):
+        dados = bytes(dados)
+        self.blocos.append(dados)
+        self.posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self.posicao
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def esvaziar(self) -> bytes:
+        dados = b''.join(self.blocos)
+        self.blocos = []
+        return dados
+
+
+def exportar_streaming(formato: str = 'parquet', queryset: QuerySet = None,
+                       tamanho_lote: int = TAMANHO_LOTE_PADRAO) -> Iterator[bytes]:
+    """Gera o arquivo exportado em partes, uma por lote, para respostas em streaming"""
+    buffer = _Buffer()
+    escritor = _escritor(buffer, formato)
+    try:
+        for lote in lotes_reservas(queryset, tamanho_lote):
+            escritor.write_batch(lote)
+            dados = buffer.esvaziar()
+            if dados:
+                yield dados
+    finally:
+        escritor.close()
+    yield buffer.esvaziar()
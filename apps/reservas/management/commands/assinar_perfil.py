@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.reservas.perfilamento import MODOS, assinar
+
+
+class Command(BaseCommand):
+    help = ("Gera o token do cabeçalho `X-Perfil` que habilita o perfilamento de "
+            "uma requisição ao caminho informado.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('caminho', help="Caminho da requisição, ex: /api/reservas")
+        parser.add_argument('--modo', choices=MODOS, default='cprofile')
+
+    def handle(self, *args, **options):
+        if settings.PERFILAMENTO_CHAVE is None:
+            raise CommandError("O perfilamento está desabilitado (PERFILAMENTO_CHAVE = None).")
+        self.stdout.write(assinar(options['caminho'], options['modo']))
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import random
+import time
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework import serializers
+
+from apps.reservas.disponibilidade import MotorDisponibilidade
+from apps.reservas.models import Anuncio, Imovel, Reserva
+from apps.reservas.validators import ReservaDisponivelValidator
+from apps.reservas import validators
+
+
+class Command(BaseCommand):
+    help = ("Compara o tempo da checagem de conflitos de reservas via SQL e via "
+            "motor de disponibilidade em memória. Os dados de teste são criados "
+            "em uma transação revertida ao final.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--imoveis', type=int, default=50)
+        parser.add_argument('--reservas', type=int, default=200,
+                            help="Reservas por imóvel.")
+        parser.add_argument('--consultas', type=int, default=5000)
+        parser.add_argument('--semente', type=int, default=0)
+
+    def handle(self, *args, **options):
+        aleatorio = random.Random(options['semente'])
+
+        with transaction.atomic():
+            anuncios = self.criar_dados(options['imoveis'], options['reservas'], aleatorio)
+            consultas = []
+            for _ in range(options['consultas']):
+                anuncio = aleatorio.choice(anuncios)
+                checkin = date(2030, 1, 1) + timedelta(
+                    days=aleatorio.randrange(options['reservas'] * 7))
+                consultas.append({
+                    'anuncio': anuncio,
+                    'data_checkin': checkin,
+                    'data_checkout': checkin + timedelta(days=aleatorio.randint(1, 7))})
+
+            sql = self.medir(ReservaDisponivelValidator(usar_motor=False), consultas)
+
+            # Motor isolado, sem compartilhar agendas com o processo
+            validators.motor, original = MotorDisponibilidade(), validators.motor
+            try:
+                validador = ReservaDisponivelValidator(usar_motor=True)
+                # Aquecimento: carrega as agendas de todos os imóveis
+                self.medir(validador, consultas)
+                motor = self.medir(validador, consultas)
+            finally:
+                validators.motor = original
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"SQL:   {sql['us']:10.2f} µs/consulta ({sql['conflitos']} conflitos)")
+        self.stdout.write(f"Motor: {motor['us']:10.2f} µs/consulta ({motor['conflitos']} conflitos)")
+        self.stdout.write(f"Ganho: {sql['us'] / motor['us']:10.1f}x")
+
+        if sql['conflitos'] != motor['conflitos']:
+            self.stderr.write("Os resultados do SQL e do motor divergem.")
+
+    def criar_dados(self, qtd_imoveis, qtd_reservas, aleatorio):
+        anuncios = []
+        for i in range(qtd_imoveis):
+            imovel = Imovel.objects.create(
+                codigo=f'benchmark-disponibilidade-{i}', capacidade=4, banheiros=1)
+            anuncio = Anuncio.objects.create(imovel=imovel, plataforma='benchmark')
+            anuncios.append(anuncio)
+
+            checkin = date(2030, 1, 1)
+            reservas = []
+            for _ in range(qtd_reservas):
+                checkout = checkin + timedelta(days=2)
+                reservas.append(Reserva(
+                    anuncio=anuncio, data_checkin=checkin, data_checkout=checkout,
+                    preco_total=Decimal('100.00'), qtd_hospedes=1))
+                checkin = checkout + timedelta(days=aleatorio.randint(1, 10))
+            Reserva.objects.bulk_create(reservas)
+        return anuncios
+
+    def medir(self, validador, consultas) -> dict:
+        conflitos = 0
+        inicio = time.perf_counter()
+        for valores in consultas:
+            try:
+                validador(valores, None)
+            except serializers.ValidationError:
+                conflitos += 1
+        duracao = time.perf_counter() - inicio
+        return {'us': duracao / len(consultas) * 1e6, 'conflitos': conflitos}
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import os
+import random
+import resource
+import tempfile
+import time
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.reservas import exportacao
+from apps.reservas.models import Anuncio, Imovel, Reserva
+
+
+class Command(BaseCommand):
+    help = ("Mede o tempo da exportação colunar das reservas. Os dados de teste são "
+            "criados em uma transação revertida ao final.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reservas', type=int, default=1000000)
+        parser.add_argument('--imoveis', type=int, default=1000)
+        parser.add_argument('--formato', choices=exportacao.FORMATOS, default='parquet')
+        parser.add_argument(
+            '--tamanho-lote', type=int, dest='tamanho_lote',
+            default=exportacao.TAMANHO_LOTE_PADRAO)
+        parser.add_argument('--semente', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if not exportacao.pyarrow_disponivel():
+            raise CommandError("A exportação requer a biblioteca pyarrow.")
+
+        aleatorio = random.Random(options['semente'])
+
+        with transaction.atomic(), tempfile.TemporaryDirectory() as diretorio:
+            inicio = time.perf_counter()
+            self.criar_dados(options['imoveis'], options['reservas'], aleatorio)
+            self.stdout.write(f"Dados criados em {time.perf_counter() - inicio:.2f} s")
+
+            # A memória usada pela criação dos dados não entra na medição
+            memoria_inicial = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+            saida = os.path.join(diretorio, f"reservas.{options['formato']}")
+            inicio = time.perf_counter()
+            total = exportacao.exportar(
+                saida, options['formato'], tamanho_lote=options['tamanho_lote'])
+            duracao = time.perf_counter() - inicio
+            tamanho = os.path.getsize(saida)
+
+            memoria_final = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"{total} reservas exportadas em {duracao:.2f} s "
+            f"({total / duracao:.0f} linhas/s, {tamanho / 2 ** 20:.1f} MiB)")
+        self.stdout.write(
+            f"Aumento do pico de memória: {(memoria_final - memoria_inicial) / 1024:.0f} MiB")
+
+    def criar_dados(self, qtd_imoveis, qtd_reservas, aleatorio):
+        imoveis = Imovel.objects.bulk_create(
+            Imovel(codigo=f'benchmark-exportacao-{i}', capacidade=4, banheiros=1)
+            for i in range(qtd_imoveis))
+        anuncios = Anuncio.objects.bulk_create(
+            Anuncio(imovel=imovel, plataforma='benchmark', taxa_plataforma=Decimal('12.50'))
+            for imovel in imoveis)
+
+        bloco = []
+        for i in range(qtd_reservas):
+            checkin = date(2030, 1, 1) + timedelta(days=i // qtd_imoveis * 3)
+            bloco.append(Reserva(
+                anuncio=anuncios[i % qtd_imoveis], data_checkin=checkin,
+                data_checkout=checkin + timedelta(days=2),
+                preco_total=Decimal(aleatorio.randrange(100, 99999)) / 100,
+                qtd_hospedes=aleatorio.randint(1, 4)))
+            if len(bloco) == 10000:
+                Reserva.objects.bulk_create(bloco)
+                bloco = []
+        Reserva.objects.bulk_create(bloco)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory, override_settings
+from rest_framework.request import Request
+
+from apps.reservas.throttling import BaldeTokensThrottle
+from apps.reservas.views import ReservaAPIView
+
+
+class Command(BaseCommand):
+    help = ("Mede o custo por requisição do throttle de baldes de tokens, "
+            "alternando entre vários clientes para exercitar o dicionário de baldes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requisicoes', type=int, default=200000)
+        parser.add_argument('--clientes', type=int, default=1000)
+        parser.add_argument('--backend', choices=('local', 'cache'), default='local')
+        parser.add_argument(
+            '--maximo', type=float, default=None,
+            help="Falha caso o custo médio, em µs, ultrapasse este valor.")
+
+    def handle(self, *args, **options):
+        fabrica = RequestFactory()
+        view = ReservaAPIView()
+        requisicoes = []
+        for i in range(options['clientes']):
+            metodo = fabrica.get if i % 2 else fabrica.post
+            requisicao = Request(metodo('/api/reservas', REMOTE_ADDR=f'10.0.{i // 256}.{i % 256}'))
+            # Autenticação resolvida antecipadamente, como ocorre no DRF
+            # antes da checagem dos throttles
+            requisicao.user
+            requisicoes.append(requisicao)
+
+        taxas = {'leitura': '1000000/s', 'escrita': '1000000/s'}
+        with override_settings(THROTTLE_TAXAS=taxas, THROTTLE_BACKEND=options['backend']):
+            throttle = BaldeTokensThrottle()
+            total = options['requisicoes']
+            quantidade = len(requisicoes)
+
+            # Aquecimento: cria os baldes de todos os clientes
+            for requisicao in requisicoes:
+                throttle.allow_request(requisicao, view)
+
+            inicio = time.perf_counter()
+            for i in range(total):
+                throttle.allow_request(requisicoes[i % quantidade], view)
+            duracao = time.perf_counter() - inicio
+
+        custo = duracao / total * 1e6
+        self.stdout.write(f"Throttle ({options['backend']}): {custo:.2f} µs/requisição")
+
+        if options['maximo'] is not None and custo > options['maximo']:
+            raise CommandError(
+                f"Custo de {custo:.2f} µs acima do máximo de {options['maximo']:.2f} µs.")
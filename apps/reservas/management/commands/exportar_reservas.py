@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+import resource
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.reservas import exportacao
+
+
+class Command(BaseCommand):
+    help = ("Exporta as reservas, com os dados do anúncio e do imóvel, para um "
+            "arquivo Parquet ou Arrow IPC. Requer a biblioteca pyarrow.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('saida', help="Caminho do arquivo gerado.")
+        parser.add_argument('--formato', choices=exportacao.FORMATOS, default='parquet')
+        parser.add_argument(
+            '--tamanho-lote', type=int, dest='tamanho_lote',
+            default=exportacao.TAMANHO_LOTE_PADRAO,
+            help="Linhas lidas do cursor e escritas por record batch.")
+
+    def handle(self, *args, **options):
+        if not exportacao.pyarrow_disponivel():
+            raise CommandError("A exportação requer a biblioteca pyarrow.")
+
+        inicio = time.perf_counter()
+        total = exportacao.exportar(
+            options['saida'], options['formato'], tamanho_lote=options['tamanho_lote'])
+        duracao = time.perf_counter() - inicio
+
+        # ru_maxrss é informado em KiB no Linux
+        memoria = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(
+            f"{total} reservas exportadas em {duracao:.2f} s "
+            f"({total / duracao if duracao else 0:.0f} linhas/s, pico de memória {memoria:.0f} MiB)")
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Executado em um novo interpretador com `-X importtime`: inicializa o Django
+# como um worker WSGI e informa a memória e os módulos carregados. O
+# `-X importtime` não registra os módulos carregados com
+# `importlib.import_module` (apps, models e middlewares), então a lista de
+# módulos é obtida do `sys.modules`.
+SCRIPT_WORKER = """
+import json, resource, sys
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+# ru_maxrss é informado em bytes no macOS e em KiB nos demais sistemas
+print(json.dumps({
+    "rss": rss if sys.platform == "darwin" else rss * 1024,
+    "modulos": sorted(sys.modules)}))
+"""
+
+
+class Importacao(NamedTuple):
+    modulo: str
+    # Tempos em microssegundos
+    proprio: int
+    acumulado: int
+    nivel: int
+
+
+class Medicao(NamedTuple):
+    configuracoes: str
+    importacoes: list
+    duracao: float
+    rss: int
+    modulos: list
+
+    @property
+    def tempo_importacoes(self) -> int:
+        # Os tempos acumulados dos módulos de nível 0 somam todas as importações
+        return sum(item.acumulado for item in self.importacoes if item.nivel == 0)
+
+
+def interpretar_importtime(linhas) -> list:
+    """Converte a saída do `python -X importtime` em uma lista de `Importacao`.
+    Linhas que não pertencem ao relatório são ignoradas."""
+    importacoes = []
+    for linha in linhas:
+        if not linha.startswith('import time:'):
+            continue
+        proprio, acumulado, modulo = linha[len('import time:'):].split('|', 2)
+        if not proprio.strip().isdigit():
+            # Cabeçalho "self [us] | cumulative | imported package"
+            continue
+        nome = modulo.rstrip()
+        recuo = len(nome) - len(nome.lstrip())
+        importacoes.append(Importacao(
+            nome.strip(), int(proprio), int(acumulado), max(recuo - 1, 0) // 2))
+    return importacoes
+
+
+def medir(configuracoes: str) -> Medicao:
+    """Inicializa um worker com o módulo de settings informado em um novo
+    interpretador e mede as importações realizadas."""
+    ambiente = {**os.environ, 'DJANGO_SETTINGS_MODULE': configuracoes}
+    inicio = time.perf_counter()
+    processo = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', SCRIPT_WORKER],
+        cwd=settings.BASE_DIR, env=ambiente, capture_output=True, text=True)
+    duracao = time.perf_counter() - inicio
+
+    if processo.returncode != 0:
+        raise CommandError(
+            f"Falha ao inicializar o worker com {configuracoes}:\n"
+            + processo.stderr.strip().splitlines()[-1])
+
+    resumo = json.loads(processo.stdout.strip().splitlines()[-1])
+    return Medicao(
+        configuracoes, interpretar_importtime(processo.stderr.splitlines()),
+        duracao, resumo['rss'], resumo['modulos'])
+
+
+class Command(BaseCommand):
+    help = ("Mede a inicialização de um worker com cada módulo de settings, usando "
+            "`python -X importtime`, e lista as importações mais lentas.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--configuracoes', nargs='+', metavar='MODULO',
+            default=['seazonecodechallenge.settings', 'seazonecodechallenge.settings_api'],
+            help="Módulos de settings comparados. O primeiro é a referência.")
+        parser.add_argument(
+            '--limite', type=int, default=15,
+            help="Quantidade de importações listadas por módulo de settings.")
+        parser.add_argument(
+            '--ordem', choices=('proprio', 'acumulado'), default='proprio',
+            help="Ordena as importações pelo tempo próprio ou pelo acumulado.")
+        parser.add_argument(
+            '--repeticoes', type=int, default=3,
+            help="Inicializações por módulo de settings. A de tempo mediano é reportada.")
+
+    def handle(self, *args, **options):
+        medicoes = []
+        for configuracoes in options['configuracoes']:
+            execucoes = sorted(
+                (medir(configuracoes) for _ in range(max(options['repeticoes'], 1))),
+                key=lambda medicao: medicao.tempo_importacoes)
+            medicao = execucoes[len(execucoes) // 2]
+            medicao = medicao._replace(
+                duracao=statistics.median(execucao.duracao for execucao in execucoes))
+            medicoes.append(medicao)
+            self.reportar(medicao, options['limite'], options['ordem'])
+
+        if len(medicoes) > 1:
+            self.comparar(medicoes)
+
+    def reportar(self, medicao: Medicao, limite: int, ordem: str):
+        self.stdout.write(
+            f"\n{medicao.configuracoes}: {len(medicao.modulos)} módulos, importações "
+            f"{medicao.tempo_importacoes / 1000:.1f} ms, inicialização "
+            f"{medicao.duracao * 1000:.1f} ms, RSS {medicao.rss / 2 ** 20:.1f} MiB")
+
+        if limite <= 0:
+            return
+        self.stdout.write(f"  {'próprio':>10} {'acumulado':>10}  módulo")
+        for item in sorted(medicao.importacoes, key=lambda item: getattr(item, ordem),
+                           reverse=True)[:limite]:
+            self.stdout.write(
+                f"  {item.proprio / 1000:7.1f} ms {item.acumulado / 1000:7.1f} ms  {item.modulo}")
+
+    def comparar(self, medicoes: list):
+        referencia = medicoes[0]
+        self.stdout.write(f"\nEm relação a {referencia.configuracoes}:")
+        for medicao in medicoes[1:]:
+            removidos = set(referencia.modulos) - set(medicao.modulos)
+            self.stdout.write(
+                f"  {medicao.configuracoes}: "
+                f"importações {self.variacao(medicao.tempo_importacoes, referencia.tempo_importacoes)}, "
+                f"inicialização {self.variacao(medicao.duracao, referencia.duracao)}, "
+                f"RSS {self.variacao(medicao.rss, referencia.rss)}, "
+                f"{len(removidos)} módulos a menos")
+
+    @staticmethod
+    def variacao(valor, referencia) -> str:
+        return f"{(valor - referencia) / referencia * 100:+.1f}%" if referencia else "-"
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.reservas import shards
+
+
+class Command(BaseCommand):
+    help = ("Equilibra a carga dos shards movendo imóveis, com os seus anúncios e reservas, "
+            "do shard mais carregado para o menos carregado. A carga de um imóvel é 1 + a "
+            "quantidade de reservas. Também registra no diretório os imóveis sem registro.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--simular', action='store_true',
+            help="Apenas lista as movimentações planejadas.")
+        parser.add_argument(
+            '--tolerancia', type=float, default=0.1,
+            help="Diferença aceita entre o shard mais e o menos carregado, em fração da "
+                 "carga média. Padrão: 0.1.")
+        parser.add_argument('--maximo', type=int, help="Quantidade máxima de imóveis movidos.")
+        parser.add_argument(
+            '--imovel', type=int,
+            help="Move apenas o imóvel informado para o shard de --destino.")
+        parser.add_argument('--destino', help="Shard de destino do --imovel.")
+        parser.add_argument(
+            '--espera', type=float, default=shards.ESPERA_MIGRACAO,
+            help="Segundos aguardados, antes da cópia de cada imóvel, pelas escritas em "
+                 f"andamento. Padrão: {shards.ESPERA_MIGRACAO}.")
+
+    def handle(self, *args, **options):
+        if not shards.habilitado():
+            raise CommandError("O sharding não está habilitado (configure SHARDS).")
+        if (options['imovel'] is None) != (options['destino'] is None):
+            raise CommandError("Informe --imovel e --destino juntos.")
+        if options['destino'] is not None and options['destino'] not in shards.shards():
+            raise CommandError(f"Shard desconhecido: {options['destino']}.")
+
+        registro = shards.registrar_imoveis()
+        self.stdout.write(
+            f"{registro['registrados']} imóveis registrados no diretório, "
+            f"{registro['descartados']} cópias descartadas.")
+
+        pesos = shards.pesos_imoveis()
+        if options['imovel'] is not None:
+            origem = next((alias for alias, imoveis in pesos.items() if options['imovel'] in imoveis), None)
+            if origem is None:
+                raise CommandError(f"Imóvel não encontrado: {options['imovel']}.")
+            movimentos = [(options['imovel'], origem, options['destino'])]
+        else:
+            self.stdout.write("Carga por shard: " + ", ".join(
+                f"{alias}={sum(imoveis.values())}" for alias, imoveis in pesos.items()))
+            movimentos = shards.planejar(pesos, options['tolerancia'], options['maximo'])
+
+        if not movimentos:
+            self.stdout.write("Os shards já estão equilibrados.")
+            return
+
+        for imovel_id, origem, destino in movimentos:
+            if options['simular']:
+                self.stdout.write(f"Imóvel {imovel_id}: {origem} -> {destino} (simulação)")
+                continue
+            movidos = shards.mover_imovel(imovel_id, destino, espera=options['espera'])
+            self.stdout.write(
+                f"Imóvel {imovel_id}: {origem} -> {destino}, " + ", ".join(
+                    f"{quantidade} {model_name}" for model_name, quantidade in movidos.items()))
+
+        if not options['simular']:
+            self.stdout.write(self.style.SUCCESS(f"{len(movimentos)} imóveis movidos."))
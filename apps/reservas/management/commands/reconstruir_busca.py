@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from apps.reservas.busca import INDICES, reconstruir
+
+
+class Command(BaseCommand):
+    help = ("Recria as estruturas da busca textual (tabelas FTS5 e triggers no SQLite, "
+            "índices GIN no PostgreSQL) e reindexa os imóveis e as reservas.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modelo', choices=sorted(INDICES), action='append',
+            help="Modelo reindexado. Pode ser repetido. Por padrão todos são reindexados.")
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        for model_name in options['modelo'] or sorted(INDICES):
+            model = apps.get_model('reservas', model_name)
+            inicio = time.perf_counter()
+            reconstruir(model, using=options['database'])
+            self.stdout.write(
+                f"Índice de busca de {model_name} reconstruído em "
+                f"{time.perf_counter() - inicio:.2f} s.")
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.reservas.pre_reservas import TAMANHO_BLOCO_REMOCAO, remover_expiradas
+
+
+class Command(BaseCommand):
+    help = ("Remove as pré-reservas expiradas em blocos, cada um em sua própria transação. "
+            "Pode ser agendado periodicamente (ex: cron a cada minuto).")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tamanho-bloco', dest='tamanho_bloco', type=int, default=TAMANHO_BLOCO_REMOCAO,
+            help=f"Pré-reservas removidas por transação. Padrão: {TAMANHO_BLOCO_REMOCAO}.")
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        removidas = remover_expiradas(tamanho_bloco=options['tamanho_bloco'])
+        self.stdout.write(
+            f"{removidas} pré-reservas expiradas removidas em {time.perf_counter() - inicio:.2f} s.")
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from apps.reservas import carga
+
+
+class Command(BaseCommand):
+    help = ("Substitui o banco SQLite pelo snapshot gerado com "
+            "`carregar_dados --snapshot`.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('snapshot', help="Arquivo do snapshot.")
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        try:
+            carga.restaurar_snapshot(options['snapshot'], using=options['database'])
+        except FileNotFoundError:
+            raise CommandError(f"Snapshot não encontrado: {options['snapshot']}")
+        except carga.SnapshotIndisponivel as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"Banco restaurado a partir de {options['snapshot']}")
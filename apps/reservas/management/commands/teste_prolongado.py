@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+import json
+import random
+import time
+import tracemalloc
+import urllib.error
+import urllib.request
+
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+
+from apps.reservas.memoria import rss_atual
+from apps.reservas.models import Anuncio, Imovel, Reserva
+
+
+# Operação -> peso na carga mista
+CARGA = {
+    'listar_reservas': 4,
+    'detalhar_reserva': 3,
+    'listar_imoveis': 1,
+    'listar_anuncios': 1,
+    'buscar_lote': 1,
+    'buscar_janelas': 1,
+    'criar_e_remover_reserva': 1,
+}
+
+
+def crescimento_monotonico(valores: list, janelas: int, tolerancia: float = 0) -> bool:
+    """Indica se a memória cresce ao longo de toda a medição.
+
+    Os valores são divididos em `janelas` consecutivas e o mínimo de cada
+    janela, que descarta os picos entre as coletas de lixo, deve superar o
+    mínimo da janela anterior em mais de `tolerancia` (fração)."""
+    if janelas < 2 or len(valores) < janelas:
+        return False
+    tamanho = len(valores) / janelas
+    minimos = [
+        min(valores[int(indice * tamanho):int((indice + 1) * tamanho)])
+        for indice in range(janelas)]
+    return all(
+        atual > anterior * (1 + tolerancia) for anterior, atual in zip(minimos, minimos[1:]))
+
+
+class ClienteLocal:
+    """Executa as requisições no próprio processo e mede a sua memória"""
+
+    def __init__(self):
+        self.client = Client()
+
+    def requisitar(self, metodo: str, caminho: str, dados: dict = None):
+        corpo = {} if dados is None else {'data': dados, 'content_type': 'application/json'}
+        response = getattr(self.client, metodo.lower())(
+            caminho, headers={'Accept': 'application/json'}, **corpo)
+        conteudo = response.json() if response.status_code < 500 and response.content else None
+        return response.status_code, conteudo
+
+    def memoria(self) -> int:
+        return rss_atual()
+
+    def ids(self) -> dict:
+        return {
+            'imoveis': list(Imovel.objects.values_list('pk', flat=True)),
+            'anuncios': list(Anuncio.objects.values_list('pk', flat=True)),
+            'reservas': list(Reserva.objects.values_list('pk', flat=True)),
+        }
+
+
+class ClienteRemoto:
+    """Executa as requisições em um servidor e obtém a memória do processo
+    que as atende pelo endpoint de diagnóstico. Com vários workers a memória
+    informada é a do worker que atendeu a consulta."""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+
+    def requisitar(self, metodo: str, caminho: str, dados: dict = None):
+        requisicao = urllib.request.Request(
+            self.url + caminho, method=metodo,
+            data=json.dumps(dados).encode() if dados is not None else None,
+            headers={'Accept': 'application/json', 'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(requisicao) as response:
+                corpo = response.read()
+                return response.status, json.loads(corpo) if corpo else None
+        except urllib.error.HTTPError as erro:
+            return erro.code, None
+
+    def memoria(self) -> int:
+        status, relatorio = self.requisitar('GET', '/api/diagnosticos/memoria?top=0')
+        if status != 200:
+            raise CommandError(f"O endpoint de diagnóstico retornou {status}.")
+        return relatorio['processo']['rss']
+
+    def ids(self) -> dict:
+        return {
+            nome: [objeto['id'] for objeto in self.requisitar('GET', f'/api/{nome}')[1]]
+            for nome in ('imoveis', 'anuncios', 'reservas')}
+
+
+class Command(BaseCommand):
+    help = ("Executa uma carga mista de leituras e escritas contra a API por um longo "
+            "período, amostrando a memória do processo, e falha quando a memória cresce "
+            "de forma monotônica.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--duracao', type=float, default=3600,
+            help="Duração da carga, em segundos, após o aquecimento.")
+        parser.add_argument(
+            '--aquecimento', type=float, default=60,
+            help="Segundos iniciais de carga em que a memória não é amostrada.")
+        parser.add_argument(
+            '--intervalo', type=float, default=30,
+            help="Intervalo, em segundos, entre as amostras de memória.")
+        parser.add_argument(
+            '--janelas', type=int, default=6,
+            help="Quantidade de janelas comparadas na detecção de crescimento.")
+        parser.add_argument(
+            '--tolerancia', type=float, default=0.0,
+            help="Crescimento mínimo, em fração, entre janelas consecutivas.")
+        parser.add_argument(
+            '--url', default=None,
+            help="Endereço do servidor. Por padrão as requisições são executadas neste processo.")
+        parser.add_argument('--semente', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['url']:
+            self.executar(ClienteRemoto(options['url']), options)
+            return
+
+        # A carga local não é limitada pelo throttle
+        with override_settings(ALLOWED_HOSTS=['*'], THROTTLE_TAXAS={}):
+            self.executar(ClienteLocal(), options)
+
+    def executar(self, cliente, options):
+        self.cliente = cliente
+        self.aleatorio = random.Random(options['semente'])
+        self.ids = cliente.ids()
+        if not all(self.ids.values()):
+            raise CommandError("A carga requer imóveis, anúncios e reservas cadastrados.")
+
+        operacoes = list(CARGA)
+        pesos = list(CARGA.values())
+        requisicoes = erros = 0
+        amostras = []
+
+        inicio = time.monotonic()
+        fim_aquecimento = inicio + options['aquecimento']
+        fim = fim_aquecimento + options['duracao']
+        proxima_amostra = fim_aquecimento
+
+        while True:
+            agora = time.monotonic()
+            if agora >= proxima_amostra:
+                memoria = cliente.memoria()
+                amostras.append(memoria)
+                proxima_amostra = agora + options['intervalo']
+                self.stdout.write(
+                    f"{agora - inicio:8.0f} s  RSS {memoria / 2 ** 20:8.1f} MiB  "
+                    f"{requisicoes} requisições ({requisicoes / (agora - inicio or 1):.0f}/s), "
+                    f"{erros} erros")
+            if agora >= fim:
+                break
+
+            operacao = self.aleatorio.choices(operacoes, pesos)[0]
+            for status in getattr(self, operacao)():
+                requisicoes += 1
+                erros += status >= 500
+
+        if tracemalloc.is_tracing():
+            self.stdout.write(
+                f"Memória rastreada pelo tracemalloc: "
+                f"{tracemalloc.get_traced_memory()[0] / 2 ** 20:.1f} MiB")
+
+        if crescimento_monotonico(amostras, options['janelas'], options['tolerancia']):
+            raise CommandError(
+                f"Crescimento monotônico da memória: {amostras[0] / 2 ** 20:.1f} MiB "
+                f"-> {amostras[-1] / 2 ** 20:.1f} MiB em {len(amostras)} amostras.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Sem crescimento monotônico da memória em {len(amostras)} amostras."))
+
+    def escolher(self, nome: str) -> int:
+        return self.aleatorio.choice(self.ids[nome])
+
+    def listar_reservas(self):
+        yield self.cliente.requisitar('GET', '/api/reservas')[0]
+
+    def listar_imoveis(self):
+        yield self.cliente.requisitar('GET', '/api/imoveis')[0]
+
+    def listar_anuncios(self):
+        yield self.cliente.requisitar('GET', '/api/anuncios')[0]
+
+    def detalhar_reserva(self):
+        yield self.cliente.requisitar('GET', f"/api/reservas/{self.escolher('reservas')}")[0]
+
+    def buscar_lote(self):
+        ids = ','.join(str(self.escolher('reservas')) for _ in range(10))
+        yield self.cliente.requisitar('GET', f'/api/reservas?ids={ids}')[0]
+
+    def buscar_janelas(self):
+        yield self.cliente.requisitar(
+            'GET', f"/api/imoveis/{self.escolher('imoveis')}/janelas?noites=3")[0]
+
+    def criar_e_remover_reserva(self):
+        checkin = date(2100, 1, 1) + timedelta(days=self.aleatorio.randrange(3650))
+        status, reserva = self.cliente.requisitar('POST', '/api/reservas', {
+            'anuncio': self.escolher('anuncios'),
+            'data_checkin': checkin.isoformat(),
+            'data_checkout': (checkin + timedelta(days=2)).isoformat(),
+            'preco_total': '100.00',
+            'qtd_hospedes': 1})
+        yield status
+        if status == 201:
+            yield self.cliente.requisitar('DELETE', f"/api/reservas/{reserva['id']}")[0]
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""Acompanhamento do uso de memória dos workers.
+
+Com `MEMORIA_TAXA_AMOSTRAGEM` maior que zero o `MemoriaMiddleware` inicia
+o `tracemalloc` e, para cada endpoint (método e nome da url):
+
+* soma a memória retida pelas requisições, isto é, a diferença da memória
+  rastreada antes e depois de cada requisição;
+* em uma fração das requisições, igual à taxa, registra um snapshot do
+  `tracemalloc`. O primeiro snapshot do endpoint é a referência e a
+  comparação com o último aponta os locais de alocação que mais cresceram.
+
+O relatório é exposto em `GET /api/diagnosticos/memoria`. O `tracemalloc`
+torna as alocações mais lentas e os snapshots são custosos, então o
+acompanhamento deve ser habilitado apenas durante a investigação de
+vazamentos, com taxas baixas.
+"""
+import os
+import random
+import resource
+import threading
+import time
+import tracemalloc
+
+from collections import deque
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+
+# Alocações do próprio tracemalloc e do mecanismo de importação não
+# interessam à análise
+FILTROS_SNAPSHOT = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def rss_atual() -> int:
+    """Memória residente atual do processo, em bytes"""
+    try:
+        with open('/proc/self/statm') as arquivo:
+            return int(arquivo.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # Fora do Linux apenas o pico é conhecido (em bytes no macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Endpoint:
+    """Medições acumuladas de um endpoint"""
+
+    def __init__(self, historico: int):
+        self.requisicoes = 0
+        self.retido = 0
+        self.amostras = deque(maxlen=historico)
+        self.referencia = None
+        self.ultimo = None
+
+    def amostrar(self, snapshot):
+        if self.referencia is None:
+            self.referencia = snapshot
+        self.ultimo = snapshot
+        self.amostras.append({
+            'data': time.time(),
+            'rastreada': tracemalloc.get_traced_memory()[0],
+            'rss': rss_atual()})
+
+    def relatorio(self, top: int) -> dict:
+        crescimento = 0
+        alocacoes = []
+        if self.referencia is not None:
+            crescimento = self.amostras[-1]['rastreada'] - self.amostras[0]['rastreada']
+            for estatistica in self.ultimo.compare_to(self.referencia, 'lineno')[:top]:
+                quadro = estatistica.traceback[0]
+                alocacoes.append({
+                    'local': f'{quadro.filename}:{quadro.lineno}',
+                    'tamanho': estatistica.size,
+                    'diferenca': estatistica.size_diff,
+                    'quantidade': estatistica.count,
+                    'diferenca_quantidade': estatistica.count_diff})
+
+        return {
+            'requisicoes': self.requisicoes,
+            'retido': self.retido,
+            'crescimento': crescimento,
+            'amostras': list(self.amostras),
+            'alocacoes': alocacoes,
+        }
+
+
+class RastreadorMemoria:
+    """Medições de memória por endpoint do processo"""
+
+    def __init__(self):
+        self.endpoints = {}
+        self._lock = threading.Lock()
+
+    def iniciar(self, quadros: int):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(quadros)
+
+    @property
+    def ativo(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def endpoint(self, nome: str) -> Endpoint:
+        endpoint = self.endpoints.get(nome)
+        if endpoint is None:
+            with self._lock:
+                endpoint = self.endpoints.setdefault(nome, Endpoint(settings.MEMORIA_HISTORICO))
+        return endpoint
+
+    def registrar(self, nome: str, retido: int, amostrar: bool = False):
+        endpoint = self.endpoint(nome)
+        snapshot = tracemalloc.take_snapshot().filter_traces(FILTROS_SNAPSHOT) if amostrar else None
+        with self._lock:
+            endpoint.requisicoes += 1
+            endpoint.retido += retido
+            if snapshot is not None:
+                endpoint.amostrar(snapshot)
+
+    def relatorio(self, top: int = None) -> dict:
+        top = settings.MEMORIA_TOP if top is None else top
+        rastreada, pico = tracemalloc.get_traced_memory()
+        with self._lock:
+            endpoints = {
+                nome: endpoint.relatorio(top) for nome, endpoint in sorted(self.endpoints.items())}
+        return {
+            'ativo': self.ativo,
+            'taxa_amostragem': settings.MEMORIA_TAXA_AMOSTRAGEM,
+            'processo': {
+                'pid': os.getpid(),
+                'rss': rss_atual(),
+                'rastreada': rastreada,
+                'pico_rastreado': pico},
+            'endpoints': endpoints,
+        }
+
+    def limpar(self):
+        with self._lock:
+            self.endpoints.clear()
+
+
+rastreador = RastreadorMemoria()
+
+
+def nome_endpoint(request) -> str:
+    match = request.resolver_match
+    return f"{request.method} {match.view_name if match is not None else '-'}"
+
+
+class MemoriaMiddleware:
+    """Registra a memória retida por endpoint e amostra snapshots do
+    `tracemalloc`. Sem `MEMORIA_TAXA_AMOSTRAGEM` o middleware não é
+    carregado e não adiciona custo às requisições."""
+
+    def __init__(self, get_response):
+        if not settings.MEMORIA_TAXA_AMOSTRAGEM:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        rastreador.iniciar(settings.MEMORIA_QUADROS)
+
+    def __call__(self, request):
+        antes = tracemalloc.get_traced_memory()[0]
+        response = self.get_response(request)
+        retido = tracemalloc.get_traced_memory()[0] - antes
+
+        if tracemalloc.is_tracing():
+            rastreador.registrar(
+                nome_endpoint(request), retido,
+                amostrar=random.random() < settings.MEMORIA_TAXA_AMOSTRAGEM)
+        return response
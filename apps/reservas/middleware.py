@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""Compressão das respostas negociada pelo cabeçalho `Accept-Encoding`.
+
+O gzip está sempre disponível. O zstd e o brotli são utilizados quando as
+bibliotecas `zstandard` e `brotli` estiverem instaladas. Respostas menores
+que `COMPRESSAO_TAMANHO_MINIMO` são enviadas sem compressão, pois o ganho
+não compensa o custo, e respostas em streaming são comprimidas bloco a bloco.
+"""
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def _compressor_gzip():
+    # wbits=31 gera o formato gzip (cabeçalho e checksum)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return compressor.compress, compressor.flush
+
+
+def _compressor_brotli():
+    compressor = brotli.Compressor(quality=5)
+    return compressor.process, compressor.finish
+
+
+def _compressor_zstd():
+    compressor = zstandard.ZstdCompressor(level=3).compressobj()
+    return compressor.compress, compressor.flush
+
+
+# Codificação -> fábrica do compressor, em ordem de preferência
+COMPRESSORES = {}
+if zstandard is not None:
+    COMPRESSORES['zstd'] = _compressor_zstd
+if brotli is not None:
+    COMPRESSORES['br'] = _compressor_brotli
+COMPRESSORES['gzip'] = _compressor_gzip
+
+# Tipos de conteúdo que se beneficiam da compressão
+TIPOS_COMPRESSIVEIS = ('text/', 'application/json', 'application/vnd.', 'application/xml',
+                       'application/javascript')
+
+# Eventos SSE precisam chegar ao cliente assim que são gerados, o que o
+# acúmulo de dados do compressor impediria. Arquivos Parquet já são comprimidos
+TIPOS_IGNORADOS = ('text/event-stream', 'application/vnd.apache.parquet')
+
+
+def negociar_codificacao(aceitas: str) -> str:
+    """Escolhe a codificação a partir do cabeçalho `Accept-Encoding`,
+    respeitando os pesos (`q`) informados pelo cliente e, em caso de
+    empate, a ordem de preferência de `COMPRESSORES`.
+
+    Returns:
+        str: A codificação escolhida ou None.
+    """
+    pesos = {}
+    for item in aceitas.split(','):
+        codificacao, _, parametros = item.strip().partition(';')
+        codificacao = codificacao.strip().lower()
+        peso = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith('q='):
+            try:
+                peso = float(parametros[2:])
+            except ValueError:
+                continue
+        pesos[codificacao] = peso
+
+    escolhida, maior = None, 0
+    for codificacao in COMPRESSORES:
+        peso = pesos.get(codificacao, pesos.get('*', 0))
+        if peso > maior:
+            escolhida, maior = codificacao, peso
+    return escolhida
+
+
+class CompressaoMiddleware:
+    """Comprime as respostas com a melhor codificação aceita pelo cliente"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if response.has_header('Content-Encoding'):
+            return response
+
+        tipo = response.get('Content-Type', '')
+        if not tipo.startswith(TIPOS_COMPRESSIVEIS) or tipo.startswith(TIPOS_IGNORADOS):
+            return response
+
+        if not response.streaming and len(response.content) < settings.COMPRESSAO_TAMANHO_MINIMO:
+            return response
+
+        # A resposta varia conforme a codificação aceita, mesmo quando não comprimida
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        codificacao = negociar_codificacao(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if codificacao is None:
+            return response
+
+        comprimir, finalizar = COMPRESSORES[codificacao]()
+
+        if response.streaming:
+            comprimir_streaming = (
+                self.comprimir_streaming_async if response.is_async else self.comprimir_streaming)
+            response.streaming_content = comprimir_streaming(
+                response.streaming_content, comprimir, finalizar)
+            # O tamanho final não é conhecido antecipadamente
+            del response['Content-Length']
+        else:
+            comprimido = comprimir(response.content) + finalizar()
+            if len(comprimido) >= len(response.content):
+                return response
+            response.content = comprimido
+            response['Content-Length'] = str(len(comprimido))
+
+        # O conteúdo comprimido não é idêntico byte a byte ao original
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+
+        response['Content-Encoding'] = codificacao
+        return response
+
+    @staticmethod
+    def comprimir_streaming(conteudo, comprimir, finalizar):
+        for bloco in conteudo:
+            dados = comprimir(bloco)
+            if dados:
+                yield dados
+        yield finalizar()
+
+    @staticmethod
+    async def comprimir_streaming_async(conteudo, comprimir, finalizar):
+        async for bloco in conteudo:
+            dados = comprimir(bloco)
+            if dados:
+                yield dados
+        yield finalizar()
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.3 on 2026-10-19 13:17
+
+import django.core.serializers.json
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Mudanca',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=50, verbose_name='Modelo')),
+                ('objeto_id', models.BigIntegerField(verbose_name='Id do Objeto')),
+                ('operacao', models.CharField(choices=[('criacao', 'Criação'), ('atualizacao', 'Atualização'), ('remocao', 'Remoção')], max_length=20, verbose_name='Operação')),
+                ('dados', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, null=True, verbose_name='Dados')),
+                ('data', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Data')),
+            ],
+            options={
+                'verbose_name': 'Mudança',
+                'verbose_name_plural': 'Mudanças',
+                'indexes': [models.Index(fields=['modelo', 'id'], name='mudanca_modelo_seq_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.3 on 2026-10-19 13:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservas', '0002_mudanca'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='anuncio',
+            name='data_atualizacao',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Data de Atualização'),
+        ),
+        migrations.AlterField(
+            model_name='imovel',
+            name='data_atualizacao',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Data de Atualização'),
+        ),
+        migrations.AlterField(
+            model_name='reserva',
+            name='data_atualizacao',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Data de Atualização'),
+        ),
+        migrations.AddIndex(
+            model_name='mudanca',
+            index=models.Index(fields=['modelo', 'operacao', 'data'], name='mudanca_remocao_data_idx'),
+        ),
+    ]
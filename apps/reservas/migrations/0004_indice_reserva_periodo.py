@@ -0,0 +1,22 @@
+# Generated by Django 5.0.3 on 2026-10-19 13:24
+
+from django.db import migrations, models
+
+from apps.reservas.operacoes import AdicionarIndice
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY não pode ser executado em uma transação
+    atomic = False
+
+    dependencies = [
+        ('reservas', '0003_indices_sincronizacao'),
+    ]
+
+    operations = [
+        AdicionarIndice(
+            model_name='reserva',
+            index=models.Index(fields=['anuncio', 'data_checkout', 'data_checkin'], name='reserva_anuncio_periodo_idx'),
+        ),
+    ]
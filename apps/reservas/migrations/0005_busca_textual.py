@@ -0,0 +1,20 @@
+# Generated by Django 5.0.3 on 2026-10-19 16:02
+
+from django.db import migrations
+
+from apps.reservas.operacoes import CriarIndiceBusca
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY não pode ser executado em uma transação
+    atomic = False
+
+    dependencies = [
+        ('reservas', '0004_indice_reserva_periodo'),
+    ]
+
+    operations = [
+        CriarIndiceBusca(model_name='imovel'),
+        CriarIndiceBusca(model_name='reserva'),
+    ]
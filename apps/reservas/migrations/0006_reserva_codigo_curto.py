@@ -0,0 +1,53 @@
+# Generated by Django 5.0.3 on 2026-10-19 17:10
+
+from django.db import migrations, models
+
+from apps.reservas.codigos import gerar
+from apps.reservas.operacoes import AdicionarRestricaoUnica
+
+
+TAMANHO_BLOCO = 5000
+
+
+def preencher_codigos_curtos(apps, schema_editor):
+    """Preenche os códigos das reservas existentes em blocos, ordenados pelo
+    id, cada um em sua própria transação"""
+    Reserva = apps.get_model('reservas', 'Reserva')
+    banco = schema_editor.connection.alias
+    ultimo = 0
+    while True:
+        reservas = list(
+            Reserva.objects.using(banco).filter(pk__gt=ultimo, codigo_curto__isnull=True)
+            .order_by('pk').only('pk')[:TAMANHO_BLOCO])
+        if not reservas:
+            break
+        for reserva in reservas:
+            reserva.codigo_curto = gerar(reserva.pk)
+        Reserva.objects.using(banco).bulk_update(reservas, ['codigo_curto'])
+        ultimo = reservas[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    # CREATE UNIQUE INDEX CONCURRENTLY não pode ser executado em uma transação
+    atomic = False
+
+    dependencies = [
+        ('reservas', '0005_busca_textual'),
+    ]
+
+    operations = [
+        # Coluna nula e sem valor padrão: no SQLite é adicionada com ALTER
+        # TABLE, sem recriar a tabela (e os triggers da busca textual)
+        migrations.AddField(
+            model_name='reserva',
+            name='codigo_curto',
+            field=models.CharField(editable=False, max_length=9, null=True, verbose_name='Código curto da reserva'),
+        ),
+        migrations.RunPython(
+            preencher_codigos_curtos, migrations.RunPython.noop, hints={'model_name': 'reserva'}),
+        AdicionarRestricaoUnica(
+            model_name='reserva',
+            constraint=models.UniqueConstraint(condition=models.Q(('codigo_curto__isnull', False)), fields=('codigo_curto',), name='reserva_codigo_curto_unico'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.3 on 2026-10-19 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservas', '0006_reserva_codigo_curto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocalizacaoImovel',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='Id do Imóvel')),
+                ('shard', models.CharField(max_length=100, verbose_name='Shard')),
+                ('em_migracao', models.BooleanField(default=False, verbose_name='Em migração')),
+            ],
+            options={
+                'verbose_name': 'Localização do Imóvel',
+                'verbose_name_plural': 'Localizações dos Imóveis',
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.3 on 2026-10-19 18:41
+
+import django.core.validators
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservas', '0007_localizacao_imovel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PreReserva',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_cadastro', models.DateTimeField(auto_now_add=True, verbose_name='Data de Cadastro')),
+                ('data_atualizacao', models.DateTimeField(auto_now=True, db_index=True, verbose_name='Data de Atualização')),
+                ('codigo', models.UUIDField(default=uuid.uuid4, unique=True, verbose_name='Código da pré-reserva')),
+                ('data_checkin', models.DateField(verbose_name='Check-in')),
+                ('data_checkout', models.DateField(verbose_name='Check-out')),
+                ('preco_total', models.DecimalField(decimal_places=2, max_digits=5, validators=[django.core.validators.MinValueValidator(limit_value=0.01, message='O preço total não pode possuir um valor negativo.')], verbose_name='Preço Total')),
+                ('comentario', models.TextField(null=True, verbose_name='Comentário')),
+                ('qtd_hospedes', models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(limit_value=1, message='A reserva deve possuir ao menos um hóspede.')], verbose_name='Número de Hospedes')),
+                ('expira_em', models.DateTimeField(verbose_name='Expira em')),
+                ('anuncio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pre_reservas', to='reservas.anuncio', verbose_name='Anúncio')),
+            ],
+            options={
+                'verbose_name': 'Pré-reserva',
+                'verbose_name_plural': 'Pré-reservas',
+                'indexes': [models.Index(fields=['anuncio', 'data_checkout', 'data_checkin'], name='pre_reserva_periodo_idx'), models.Index(fields=['expira_em'], name='pre_reserva_expiracao_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='prereserva',
+            constraint=models.CheckConstraint(check=models.Q(('data_checkin__lte', models.F('data_checkout'))), name='pre_reserva_checkin_lte_checkout'),
+        ),
+        migrations.AddConstraint(
+            model_name='prereserva',
+            constraint=models.CheckConstraint(check=models.Q(('qtd_hospedes__gte', 1)), name='pre_reserva_qtd_hospedes_min_val'),
+        ),
+        migrations.AddConstraint(
+            model_name='prereserva',
+            constraint=models.CheckConstraint(check=models.Q(('preco_total__gte', 0.01)), name='pre_reserva_preco_total_min_val'),
+        ),
+    ]
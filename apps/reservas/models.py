@@ -2,8 +2,10 @@
 from decimal import Decimal
 
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, router, transaction
 from django.db.models import Q, F
+from django.utils import timezone
 from django.utils.translation import gettext as _
 
 from uuid import uuid4
@@ -23,14 +25,48 @@ class ModeloAuditavel(models.Model):
     a data e hora da criação e atualização nos modelos que herdam desta classe"""
     data_cadastro = models.DateTimeField(
         _("Data de Cadastro"), auto_now_add=True)
+    # Indexado para a sincronização incremental (`?atualizado_desde=`)
     data_atualizacao = models.DateTimeField(
-        _("Data de Atualização"), auto_now=True)
+        _("Data de Atualização"), auto_now=True, db_index=True)
     
     class Meta:
         abstract = True
 
 
-class Imovel(ModeloAuditavel):
+class QuerySetRoteado(models.QuerySet):
+    """QuerySet cujo `create`, sem um banco explícito (`using`), deixa o
+    roteador escolher o banco a partir do próprio objeto criado. O `create`
+    do Django consulta o roteador sem o objeto, o que impediria o sharding
+    de posicionar o objeto junto ao seu imóvel (ver `shards.py`)."""
+
+    def create(self, **kwargs):
+        if self._db is not None:
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True)
+        return obj
+
+
+class ModeloComHistorico(ModeloAuditavel):
+    """Modelo abstrato cujas criações, atualizações e remoções são registradas
+    no log de mudanças (`Mudanca`). O registro é feito pelos sinais definidos
+    em `signals.py` e o `save` é executado dentro de uma transação para que
+    a escrita do objeto e do log sejam confirmadas juntas."""
+    objects = QuerySetRoteado.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        # O banco é escolhido uma única vez, já que no sharding a escolha
+        # do shard de um novo imóvel não se repete
+        kwargs['using'] = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=kwargs['using']):
+            super().save(*args, **kwargs)
+
+
+class Imovel(ModeloComHistorico):
     """Modelo que armazena as informações dos imóveis"""
     # O tipo de valor do código do imóvel não foi especificado, sendo assim
     # estou assumindo que o código deve ser a descrição do imóvel, tendo em
@@ -66,7 +102,7 @@ class Imovel(ModeloAuditavel):
         return f'{self._meta.verbose_name}: {self.codigo}'
 
 
-class Anuncio(ModeloAuditavel):
+class Anuncio(ModeloComHistorico):
     """Modelo que armazena as informações de anúncios"""
     imovel = models.ForeignKey(Imovel, verbose_name=_(
         "Imóvel"), on_delete=models.CASCADE, related_name="anuncios")
@@ -84,7 +120,7 @@ class Anuncio(ModeloAuditavel):
         return f'{self._meta.verbose_name}: {self.plataforma} - {self.imovel_id}'
 
 
-class Reserva(ModeloAuditavel):
+class Reserva(ModeloComHistorico):
     """Modelo que armazena as informações de reservas"""
     anuncio = models.ForeignKey(Anuncio, verbose_name=_(
         "Anúncio"), on_delete=models.CASCADE, related_name="reservas")
@@ -108,6 +144,10 @@ class Reserva(ModeloAuditavel):
     # campo será apresentado para o usuário final.
     codigo = models.UUIDField(
         _("Código da reserva"), default=uuid4, null=False, blank=False, unique=True)
+    # Código derivado do id para ser informado por telefone (ver `codigos.py`).
+    # É preenchido logo após a inserção, por isso aceita nulo
+    codigo_curto = models.CharField(
+        _("Código curto da reserva"), max_length=9, null=True, editable=False)
     data_checkin = models.DateField(
         _("Check-in"), null=False, blank=False, db_index=True)
     data_checkout = models.DateField(
@@ -131,9 +171,124 @@ class Reserva(ModeloAuditavel):
             models.CheckConstraint(
                 check=Q(qtd_hospedes__gte=1), name="qtd_hospedes_min_val"),
             models.CheckConstraint(
-                check=Q(preco_total__gte=0.01), name="preco_total_min_val")
+                check=Q(preco_total__gte=0.01), name="preco_total_min_val"),
+            models.UniqueConstraint(
+                fields=['codigo_curto'], condition=Q(codigo_curto__isnull=False),
+                name='reserva_codigo_curto_unico'),
         )
+        indexes = (
+            # Checagem de conflitos e varredura de janelas livres: para cada
+            # anúncio do imóvel, busca por intervalo no check-out (apenas as
+            # reservas ainda não encerradas) com o check-in coberto pelo índice
+            models.Index(
+                fields=['anuncio', 'data_checkout', 'data_checkin'],
+                name='reserva_anuncio_periodo_idx'),)
 
     def __str__(self):
         return f'{self._meta.verbose_name}: {self.codigo}'
 
+
+
+class PreReserva(ModeloAuditavel):
+    """Pré-reserva: ocupa o período por alguns minutos, enquanto o hóspede
+    conclui o pagamento, sem criar uma `Reserva`. Até `expira_em` o período
+    fica indisponível para outras reservas e pré-reservas; a confirmação
+    converte a pré-reserva em uma reserva na mesma transação. As
+    pré-reservas expiradas são ignoradas e removidas em blocos por
+    `python manage.py remover_pre_reservas_expiradas`."""
+    objects = QuerySetRoteado.as_manager()
+
+    anuncio = models.ForeignKey(Anuncio, verbose_name=_(
+        "Anúncio"), on_delete=models.CASCADE, related_name="pre_reservas")
+    # Identifica a pré-reserva para o cliente que a criou, na confirmação e
+    # no cancelamento
+    codigo = models.UUIDField(
+        _("Código da pré-reserva"), default=uuid4, null=False, blank=False, unique=True)
+    data_checkin = models.DateField(_("Check-in"), null=False, blank=False)
+    data_checkout = models.DateField(_("Check-out"), null=False, blank=False)
+    preco_total = models.DecimalField(
+        _("Preço Total"), max_digits=5, decimal_places=2, validators=[
+            MinValueValidator(limit_value=0.01, message=VALIDADOR_PRECO_TOTAL)])
+    comentario = models.TextField(_("Comentário"), null=True)
+    qtd_hospedes = models.PositiveSmallIntegerField(
+        _("Número de Hospedes"), null=False, blank=False, validators=[
+            MinValueValidator(limit_value=1, message=VALIDADOR_HOSPEDES)])
+    expira_em = models.DateTimeField(_("Expira em"), null=False)
+
+    class Meta:
+        verbose_name = _("Pré-reserva")
+        verbose_name_plural = _("Pré-reservas")
+        constraints = (
+            models.CheckConstraint(
+                check=Q(data_checkin__lte=F('data_checkout')),
+                name="pre_reserva_checkin_lte_checkout"),
+            models.CheckConstraint(
+                check=Q(qtd_hospedes__gte=1), name="pre_reserva_qtd_hospedes_min_val"),
+            models.CheckConstraint(
+                check=Q(preco_total__gte=0.01), name="pre_reserva_preco_total_min_val"),
+        )
+        indexes = (
+            # Checagem de conflitos, como em `reserva_anuncio_periodo_idx`
+            models.Index(
+                fields=['anuncio', 'data_checkout', 'data_checkin'],
+                name='pre_reserva_periodo_idx'),
+            # Remoção das expiradas em ordem de expiração, sem varrer a tabela
+            models.Index(fields=['expira_em'], name='pre_reserva_expiracao_idx'),
+        )
+
+    def __str__(self):
+        return f'{self._meta.verbose_name}: {self.codigo}'
+
+    @property
+    def expirada(self) -> bool:
+        return self.expira_em <= timezone.now()
+
+
+class Mudanca(models.Model):
+    """Log append-only das mudanças em imóveis, anúncios e reservas. O id
+    funciona como sequência, permitindo que consumidores leiam apenas o que
+    mudou desde a última sequência recebida (ver `MudancaAPIView` sobre a
+    ordem das confirmações)."""
+
+    class Operacao(models.TextChoices):
+        CRIACAO = 'criacao', _('Criação')
+        ATUALIZACAO = 'atualizacao', _('Atualização')
+        REMOCAO = 'remocao', _('Remoção')
+
+    modelo = models.CharField(_("Modelo"), max_length=50)
+    objeto_id = models.BigIntegerField(_("Id do Objeto"))
+    operacao = models.CharField(
+        _("Operação"), max_length=20, choices=Operacao.choices)
+    # Representação do objeto após a mudança. Nulo nas remoções
+    dados = models.JSONField(_("Dados"), null=True, encoder=DjangoJSONEncoder)
+    data = models.DateTimeField(_("Data"), default=timezone.now)
+
+    class Meta:
+        verbose_name = _("Mudança")
+        verbose_name_plural = _("Mudanças")
+        indexes = (
+            # Leitura ordenada das mudanças de um único modelo
+            models.Index(fields=['modelo', 'id'], name='mudanca_modelo_seq_idx'),
+            # Busca das remoções na sincronização incremental
+            models.Index(
+                fields=['modelo', 'operacao', 'data'], name='mudanca_remocao_data_idx'),)
+
+    def __str__(self):
+        return f'{self._meta.verbose_name}: {self.id} {self.modelo} {self.objeto_id}'
+
+
+class LocalizacaoImovel(models.Model):
+    """Diretório do sharding: o shard em que cada imóvel está armazenado,
+    junto com os seus anúncios e reservas (ver `shards.py`). Fica no banco
+    `SHARDS_CATALOGO`."""
+    id = models.BigIntegerField(_("Id do Imóvel"), primary_key=True)
+    shard = models.CharField(_("Shard"), max_length=100)
+    # Enquanto o imóvel é movido para outro shard as escritas são recusadas
+    em_migracao = models.BooleanField(_("Em migração"), default=False)
+
+    class Meta:
+        verbose_name = _("Localização do Imóvel")
+        verbose_name_plural = _("Localizações dos Imóveis")
+
+    def __str__(self):
+        return f'{self._meta.verbose_name}: {self.id} {self.shard}'
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Operações de migração que não bloqueiam as tabelas em produção.
+
+No PostgreSQL os índices são criados e removidos com `CONCURRENTLY`, o que
+evita bloquear as escritas em tabelas grandes durante a migração. Nos demais
+bancos as operações se comportam como `AddIndex`/`RemoveIndex`. Migrações
+que utilizam estas operações precisam declarar `atomic = False`, já que
+`CONCURRENTLY` não pode ser executado dentro de uma transação.
+"""
+from django.db import migrations
+
+from .busca import sql_criar, sql_remover
+
+
+def _concorrente(schema_editor) -> bool:
+    return schema_editor.connection.vendor == 'postgresql'
+
+
+class AdicionarIndice(migrations.AddIndex):
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if _concorrente(schema_editor):
+            schema_editor.add_index(model, self.index, concurrently=True)
+        else:
+            schema_editor.add_index(model, self.index)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if _concorrente(schema_editor):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+        else:
+            schema_editor.remove_index(model, self.index)
+
+
+class AdicionarRestricaoUnica(migrations.AddConstraint):
+    """`AddConstraint` de uma `UniqueConstraint` condicional, que é criada
+    como um índice único (com `CONCURRENTLY` no PostgreSQL). No SQLite as
+    restrições condicionais também não exigem recriar a tabela."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        sql = str(self.constraint.create_sql(model, schema_editor))
+        if _concorrente(schema_editor):
+            sql = sql.replace('CREATE UNIQUE INDEX', 'CREATE UNIQUE INDEX CONCURRENTLY', 1)
+        schema_editor.execute(sql, params=None)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        sql = str(self.constraint.remove_sql(model, schema_editor))
+        if _concorrente(schema_editor):
+            sql = sql.replace('DROP INDEX', 'DROP INDEX CONCURRENTLY', 1)
+        schema_editor.execute(sql, params=None)
+
+
+class CriarIndiceBusca(migrations.operations.base.Operation):
+    """Cria as estruturas da busca textual do campo configurado em
+    `apps.reservas.busca.INDICES` para o modelo, conforme o banco de dados.
+    No PostgreSQL o índice é criado com `CONCURRENTLY`."""
+    reduces_to_sql = True
+    reversible = True
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    def deconstruct(self):
+        return self.__class__.__qualname__, [], {'model_name': self.model_name}
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def _executar(self, app_label, schema_editor, state, comandos):
+        model = state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        for comando in comandos(schema_editor.connection.vendor, self.model_name):
+            schema_editor.execute(comando, params=None)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        self._executar(app_label, schema_editor, to_state, sql_criar)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        self._executar(app_label, schema_editor, from_state, sql_remover)
+
+    def describe(self):
+        return f'Cria o índice de busca textual de {self.model_name}'
+
+    @property
+    def migration_name_fragment(self):
+        return f'{self.model_name}_busca'
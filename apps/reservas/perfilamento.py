@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""Perfilamento de requisições sob demanda.
+
+Uma requisição é perfilada quando envia o cabeçalho `X-Perfil` (ou o
+parâmetro `?perfil=`) com um token assinado com `PERFILAMENTO_CHAVE`. O
+token indica o modo e o caminho da requisição e expira após
+`PERFILAMENTO_VALIDADE` segundos, então só pode ser gerado por quem possui
+a chave (ver o comando `assinar_perfil`)::
+
+    curl -H "X-Perfil: $(python manage.py assinar_perfil /api/reservas)" .../api/reservas
+
+Os modos disponíveis são:
+
+* `cprofile`: executa a requisição sob o `cProfile` e grava as estatísticas
+  em `<id>.pstats`, que podem ser lidas com o módulo `pstats`;
+* `amostragem`: amostra a pilha da thread da requisição a cada
+  `PERFILAMENTO_INTERVALO_AMOSTRAGEM` segundos e grava as pilhas em
+  `<id>.collapsed`, no formato aceito pelo `flamegraph.pl` e pelo speedscope.
+
+Nos dois modos as consultas SQL e as suas durações são gravadas em
+`<id>.json`, em `PERFILAMENTO_DIRETORIO`. O id do perfil é retornado no
+cabeçalho `X-Perfil-Id` e os tempos no cabeçalho `Server-Timing`.
+
+Com `PERFILAMENTO_CHAVE = None` o perfilamento fica desabilitado e as
+requisições não passam por nenhuma checagem adicional.
+"""
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+
+from collections import Counter
+from contextlib import ExitStack
+from uuid import uuid4
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+
+from .permissions import endereco_autorizado
+
+
+MODOS = ('cprofile', 'amostragem')
+
+CABECALHO = 'HTTP_X_PERFIL'
+PARAMETRO = 'perfil'
+
+SALT = 'apps.reservas.perfilamento'
+
+
+def assinador() -> signing.TimestampSigner:
+    return signing.TimestampSigner(key=settings.PERFILAMENTO_CHAVE, salt=SALT)
+
+
+def assinar(caminho: str, modo: str = 'cprofile') -> str:
+    """Gera o token que habilita o perfilamento de uma requisição"""
+    if modo not in MODOS:
+        raise ValueError(f'Modo de perfilamento inválido: {modo}')
+    return assinador().sign(f'{modo}|{caminho}')
+
+
+def modo_autorizado(request, token: str):
+    """Verifica o token e o cliente da requisição.
+
+    Returns:
+        str: O modo de perfilamento ou None quando a requisição não está
+        autorizada.
+    """
+    try:
+        valor = assinador().unsign(token, max_age=settings.PERFILAMENTO_VALIDADE)
+    except signing.BadSignature:
+        return None
+
+    modo, _, caminho = valor.partition('|')
+    if modo not in MODOS or caminho != request.path:
+        return None
+
+    clientes = settings.PERFILAMENTO_CLIENTES
+    if clientes and not endereco_autorizado(request.META.get('REMOTE_ADDR', ''), clientes):
+        return None
+    return modo
+
+
+def token_requisicao(request):
+    """Token de perfilamento enviado no cabeçalho ou no parâmetro da url"""
+    token = request.META.get(CABECALHO)
+    if token is None and f'{PARAMETRO}=' in request.META.get('QUERY_STRING', ''):
+        token = request.GET.get(PARAMETRO)
+    return token
+
+
+class Amostrador:
+    """Amostra periodicamente a pilha de uma thread, em uma thread separada,
+    contando as pilhas no formato "collapsed" (frames separados por `;`,
+    da raiz para a folha)."""
+
+    def __init__(self, intervalo: float, thread_id: int = None):
+        self.intervalo = intervalo
+        self.thread_id = thread_id or threading.get_ident()
+        self.pilhas = Counter()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._amostrar, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._parar.set()
+        self._thread.join()
+
+    def _amostrar(self):
+        while not self._parar.wait(self.intervalo):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            frames = []
+            while frame is not None:
+                codigo = frame.f_code
+                frames.append(
+                    f"{frame.f_globals.get('__name__', '?')}."
+                    f"{getattr(codigo, 'co_qualname', codigo.co_name)}")
+                frame = frame.f_back
+            self.pilhas[';'.join(reversed(frames))] += 1
+
+    def collapsed(self) -> str:
+        return ''.join(f'{pilha} {quantidade}\n' for pilha, quantidade in self.pilhas.most_common())
+
+
+class RegistroConsultas:
+    """`execute_wrapper` que registra as consultas SQL e as suas durações"""
+
+    def __init__(self):
+        self.consultas = []
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas.append({
+                'banco': context['connection'].alias,
+                'sql': sql,
+                'duracao': time.perf_counter() - inicio})
+
+    @property
+    def duracao(self) -> float:
+        return sum(consulta['duracao'] for consulta in self.consultas)
+
+
+def perfilar(request, modo: str, executar):
+    """Executa `executar` (o dispatch da view) perfilando conforme o modo e
+    grava os artefatos em `PERFILAMENTO_DIRETORIO`."""
+    identificador = uuid4().hex
+    diretorio = settings.PERFILAMENTO_DIRETORIO
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = os.path.join(diretorio, identificador)
+
+    registro = RegistroConsultas()
+    with ExitStack() as pilha:
+        for conexao in connections.all():
+            pilha.enter_context(conexao.execute_wrapper(registro))
+
+        inicio = time.perf_counter()
+        if modo == 'cprofile':
+            perfil = cProfile.Profile()
+            response = perfil.runcall(executar)
+            duracao = time.perf_counter() - inicio
+            perfil.dump_stats(f'{caminho}.pstats')
+        else:
+            with Amostrador(settings.PERFILAMENTO_INTERVALO_AMOSTRAGEM) as amostrador:
+                response = executar()
+            duracao = time.perf_counter() - inicio
+            with open(f'{caminho}.collapsed', 'w', encoding='utf-8') as arquivo:
+                arquivo.write(amostrador.collapsed())
+
+    with open(f'{caminho}.json', 'w', encoding='utf-8') as arquivo:
+        json.dump({
+            'id': identificador,
+            'modo': modo,
+            'metodo': request.method,
+            'caminho': request.get_full_path(),
+            'status': response.status_code,
+            'duracao': duracao,
+            'duracao_sql': registro.duracao,
+            'consultas': registro.consultas,
+        }, arquivo, indent=2)
+
+    response['X-Perfil-Id'] = identificador
+    response['Server-Timing'] = (
+        f'total;dur={duracao * 1000:.2f}, '
+        f'sql;dur={registro.duracao * 1000:.2f};desc="{len(registro.consultas)} consultas"')
+    return response
+
+
+class PerfilamentoMixin:
+    """Permite perfilar as requisições da view sob demanda"""
+
+    def dispatch(self, request, *args, **kwargs):
+        if settings.PERFILAMENTO_CHAVE is None:
+            return super().dispatch(request, *args, **kwargs)
+
+        token = token_requisicao(request)
+        modo = token and modo_autorizado(request, token)
+        if not modo:
+            return super().dispatch(request, *args, **kwargs)
+
+        dispatch = super().dispatch
+        return perfilar(request, modo, lambda: dispatch(request, *args, **kwargs))
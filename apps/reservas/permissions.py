@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import ipaddress
+
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+
+def endereco_autorizado(endereco: str, redes) -> bool:
+    """Indica se o endereço IP pertence a um dos endereços ou redes
+    informados (ex: "10.0.0.0/8")"""
+    try:
+        endereco = ipaddress.ip_address(endereco)
+    except ValueError:
+        return False
+    return any(endereco in ipaddress.ip_network(rede) for rede in redes)
+
+
+class ClientesDiagnosticoPermission(BasePermission):
+    """Restringe os endpoints de diagnóstico aos clientes de
+    `DIAGNOSTICOS_CLIENTES`. O endereço considerado é o `REMOTE_ADDR`, e não
+    o `X-Forwarded-For`, que pode ser informado pelo próprio cliente."""
+
+    def has_permission(self, request, view) -> bool:
+        return endereco_autorizado(
+            request.META.get('REMOTE_ADDR', ''), settings.DIAGNOSTICOS_CLIENTES)
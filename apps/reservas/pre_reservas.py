@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Pré-reservas: períodos ocupados por alguns minutos enquanto o hóspede
+conclui o pagamento.
+
+* a pré-reserva é validada como uma reserva e, até expirar, ocupa o período
+  nas validações de reservas e de outras pré-reservas
+  (`ReservaDisponivelValidator`). Diferente de criar e remover uma
+  `Reserva`, não gera registros no log de mudanças, não invalida as agendas
+  do motor de disponibilidade nem o índice de busca;
+* a criação e a confirmação bloqueiam a linha do imóvel durante a
+  transação (`disponibilidade.bloquear_imovel`), assim como a criação e a
+  remarcação de reservas, de modo que duas escritas que ocupam períodos do
+  mesmo imóvel não validam o período ao mesmo tempo. O SQLite ignora o
+  bloqueio;
+* a confirmação cria a reserva e remove a pré-reserva na mesma transação;
+* as pré-reservas expiradas são ignoradas nas validações e removidas em
+  blocos, pela ordem de expiração, por `remover_expiradas`.
+"""
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from . import shards
+from .constants import PRE_RESERVA_EXPIRADA
+from .models import PreReserva
+
+
+# Quantidade de pré-reservas removidas por transação
+TAMANHO_BLOCO_REMOCAO = 500
+
+
+class PreReservaExpirada(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = PRE_RESERVA_EXPIRADA
+    default_code = 'pre_reserva_expirada'
+
+
+def expiracao() -> datetime:
+    """Data de expiração de uma pré-reserva criada agora"""
+    return timezone.now() + timedelta(seconds=settings.PRE_RESERVA_DURACAO)
+
+
+def remover_expiradas(tamanho_bloco: int = TAMANHO_BLOCO_REMOCAO, agora: datetime = None) -> int:
+    """Remove as pré-reservas expiradas de todos os shards, em blocos de
+    `tamanho_bloco`, cada um em sua própria transação. Os blocos são lidos
+    pelo índice da expiração (`pre_reserva_expiracao_idx`), sem percorrer
+    as pré-reservas ainda válidas.
+
+    Returns:
+        int: Quantidade de pré-reservas removidas.
+    """
+    agora = agora or timezone.now()
+    aliases = shards.shards() if shards.habilitado() else [PreReserva.objects.db]
+    removidas = 0
+
+    for alias in aliases:
+        expiradas = PreReserva.objects.using(alias).filter(expira_em__lte=agora)
+        while True:
+            with transaction.atomic(using=alias):
+                bloco = list(expiradas.order_by('expira_em').values_list('pk', flat=True)[:tamanho_bloco])
+                if bloco:
+                    PreReserva.objects.using(alias).filter(pk__in=bloco).delete()
+            removidas += len(bloco)
+            if len(bloco) < tamanho_bloco:
+                break
+
+    return removidas
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Permite que a negociação de conteúdo aceite `text/event-stream`.
+    As views que o utilizam retornam respostas em streaming, portanto o
+    renderer nunca precisa serializar dados."""
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+
+class JSONColunarRenderer(JSONRenderer):
+    """Representação compacta das listagens: os nomes dos campos são enviados
+    uma única vez em `campos` e cada objeto vira uma lista de valores em
+    `linhas`, na mesma ordem dos campos::
+
+        {"campos": ["id", "codigo"], "linhas": [[1, "A1"], [2, "B2"]]}
+
+    Listas de objetos dentro de um dicionário (ex: `resultados` da sincronização
+    incremental) são convertidas da mesma forma. Os demais dados, como objetos
+    individuais e erros, são renderizados como no JSON padrão."""
+    media_type = 'application/vnd.colunar+json'
+    format = 'colunar'
+
+    @staticmethod
+    def colunar(dados):
+        if not dados or not isinstance(dados, list) or not isinstance(dados[0], dict):
+            return dados
+        campos = list(dados[0])
+        return {
+            'campos': campos,
+            'linhas': [[objeto.get(campo) for campo in campos] for objeto in dados]
+        }
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = {chave: self.colunar(valor) for chave, valor in data.items()}
+        else:
+            data = self.colunar(data)
+        return super().render(data, accepted_media_type, renderer_context)
@@ -1,40 +1,232 @@
 # -*- coding: utf-8 -*-
+import copy
+
+from collections.abc import Mapping
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
 
+from . import pre_reservas, shards
+from .busca import TAMANHO_MINIMO_TERMO, termos
+from .constants import ANUNCIO_SHARD_DIFERENTE, BUSCA_TERMO_INVALIDO, VALIDADOR_JANELA_HORIZONTE
+
 from .models import (
     Imovel,
     Anuncio,
-    Reserva
+    Reserva,
+    PreReserva,
+    Mudanca
 )
 
-from .validators import (
-    DataCheckInValidator,
-    ReservaDisponivelValidator,
-    AcomodacoesDisponiveisValidator
-)
+from .validators import DataCheckInValidator, ValidacaoReserva
+
+
+class CamposEmCacheMixin:
+    """Mantém, por classe, os campos gerados pelo `ModelSerializer`.
+
+    O DRF gera os campos a cada instância do serializer, inspecionando o
+    modelo. Os campos em cache são gerados uma única vez e cada instância
+    recebe uma cópia, como o DRF já faz com os campos declarados. O cache
+    pode ser preenchido antes do fork dos workers com `aquecer_campos`."""
+
+    @classmethod
+    def aquecer_campos(cls) -> dict:
+        # Procurado em `__dict__` para que as subclasses não herdem o cache
+        campos = cls.__dict__.get('_campos_em_cache')
+        if campos is None:
+            campos = super(CamposEmCacheMixin, cls()).get_fields()
+            cls._campos_em_cache = campos
+        return campos
+
+    @classmethod
+    def limpar_cache_campos(cls):
+        if '_campos_em_cache' in cls.__dict__:
+            del cls._campos_em_cache
+
+    def get_fields(self):
+        return copy.deepcopy(self.aquecer_campos())
+
+
+class RelacionadoShardField(serializers.PrimaryKeyRelatedField):
+    """Campo de relação que procura o objeto no shard em que ele está (ver
+    `shards.py`). Sem sharding se comporta como o `PrimaryKeyRelatedField`."""
 
+    def to_internal_value(self, data):
+        if not shards.habilitado():
+            return super().to_internal_value(data)
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        try:
+            if isinstance(data, bool):
+                raise TypeError
+            objeto = shards.obter(self.get_queryset(), data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if objeto is None:
+            self.fail('does_not_exist', pk_value=data)
+        return objeto
 
-class ImovelSerializer(serializers.ModelSerializer):
+
+class ImovelSerializer(CamposEmCacheMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Imovel
         fields = '__all__'
 
 
-class AnuncioSerializer(serializers.ModelSerializer):
+class AnuncioSerializer(CamposEmCacheMixin, serializers.ModelSerializer):
+    serializer_related_field = RelacionadoShardField
 
     class Meta:
         model = Anuncio
         fields = '__all__'
 
+    def validate_imovel(self, imovel):
+        # As reservas do anúncio permanecem no shard do imóvel atual
+        if (self.instance is not None and shards.habilitado()
+                and imovel._state.db != self.instance._state.db):
+            raise serializers.ValidationError(ANUNCIO_SHARD_DIFERENTE)
+        return imovel
+
+
+class AnuncioPendenteField(serializers.PrimaryKeyRelatedField):
+    """Campo do anúncio que valida apenas o tipo do id, sem consultar o banco.
+    O anúncio é carregado pela `ValidacaoReserva`."""
 
-class ReservaSerializer(serializers.ModelSerializer):
+    def to_internal_value(self, data):
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        try:
+            if isinstance(data, bool):
+                raise TypeError
+            # Mesma conversão feita pelo `queryset.get(pk=data)` do DRF
+            return self.get_queryset().model._meta.pk.get_prep_value(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class ReservaSerializer(CamposEmCacheMixin, serializers.ModelSerializer):
     codigo = serializers.CharField(read_only=True)
+    serializer_related_field = AnuncioPendenteField
+    # Substitui os validadores `DataCheckInValidator`,
+    # `AcomodacoesDisponiveisValidator` e `ReservaDisponivelValidator`,
+    # executando-os com uma única consulta
+    validacao = ValidacaoReserva()
 
     class Meta:
         model = Reserva
         fields = '__all__'
-        validators = [
-            DataCheckInValidator(),
-            AcomodacoesDisponiveisValidator(),
-            ReservaDisponivelValidator()]
+
+    def to_internal_value(self, data):
+        try:
+            return super().to_internal_value(data)
+        except serializers.ValidationError as exc:
+            raise serializers.ValidationError(self.erros_com_anuncio(data, exc.detail))
+
+    def erros_com_anuncio(self, data, erros: dict) -> dict:
+        """Quando outros campos são inválidos a `validacao` não é executada.
+        Nesse caso a existência do anúncio é checada aqui, para que os erros
+        sejam os mesmos do `PrimaryKeyRelatedField`."""
+        campo = self.fields['anuncio']
+        if 'anuncio' in erros or not isinstance(data, Mapping):
+            return erros
+        try:
+            anuncio_id = campo.run_validation(campo.get_value(data))
+        except serializers.ValidationError:
+            return erros
+        if any(Anuncio.objects.using(alias).filter(pk=anuncio_id).exists()
+               for alias in shards.candidatos(Anuncio, anuncio_id)):
+            return erros
+
+        try:
+            campo.fail('does_not_exist', pk_value=campo.get_value(data))
+        except serializers.ValidationError as exc:
+            erros = {**erros, 'anuncio': exc.detail}
+        # Mesma ordem dos campos usada pelo DRF
+        return {nome: erros[nome] for nome in self.fields if nome in erros}
+
+    def validate(self, attrs):
+        return self.validacao(attrs, self)
+
+
+class PreReservaSerializer(ReservaSerializer):
+    """Pré-reserva, com os mesmos campos e validações da reserva. A expiração
+    é definida na criação, `PRE_RESERVA_DURACAO` segundos depois."""
+
+    class Meta:
+        model = PreReserva
+        fields = '__all__'
+        read_only_fields = ('expira_em',)
+
+    def create(self, validated_data):
+        return super().create({**validated_data, 'expira_em': pre_reservas.expiracao()})
+
+    def dados_reserva(self) -> dict:
+        """Dados da reserva resultante da confirmação"""
+        return {
+            campo: self.data[campo] for campo in (
+                'anuncio', 'data_checkin', 'data_checkout', 'preco_total',
+                'comentario', 'qtd_hospedes')}
+
+
+class RemarcacaoSerializer(serializers.Serializer):
+    """Novo período de uma reserva remarcada"""
+    data_checkin = serializers.DateField()
+    data_checkout = serializers.DateField()
+
+    def validate(self, attrs):
+        DataCheckInValidator()(attrs)
+        return attrs
+
+
+class MudancaSerializer(CamposEmCacheMixin, serializers.ModelSerializer):
+    seq = serializers.IntegerField(source='id', read_only=True)
+
+    class Meta:
+        model = Mudanca
+        fields = ('seq', 'modelo', 'objeto_id', 'operacao', 'dados', 'data')
+
+
+class ConsultaJanelasSerializer(serializers.Serializer):
+    """Parâmetros da busca por janelas livres de um imóvel"""
+    noites = serializers.IntegerField(min_value=1, max_value=365)
+    hospedes = serializers.IntegerField(min_value=1, default=1)
+    inicio = serializers.DateField(required=False)
+    fim = serializers.DateField(required=False)
+    limite = serializers.IntegerField(min_value=1, max_value=50, default=5)
+
+    def validate(self, attrs):
+        attrs.setdefault('inicio', timezone.localdate())
+        attrs.setdefault('fim', attrs['inicio'] + timedelta(days=settings.JANELAS_HORIZONTE_PADRAO))
+
+        if attrs['fim'] <= attrs['inicio']:
+            raise serializers.ValidationError({'fim': VALIDADOR_JANELA_HORIZONTE})
+        return attrs
+
+
+class ConsultaListagemSerializer(serializers.Serializer):
+    """Paginação da listagem pelo id: a próxima página começa após o último
+    id recebido (`apos`)"""
+    apos = serializers.IntegerField(min_value=0, required=False)
+    limite = serializers.IntegerField(min_value=1, max_value=1000, required=False)
+
+
+class ConsultaBuscaSerializer(serializers.Serializer):
+    """Parâmetros da busca textual"""
+    q = serializers.CharField(max_length=200)
+    pagina = serializers.IntegerField(min_value=1, default=1)
+    limite = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+    def validate_q(self, valor):
+        if not termos(valor):
+            raise serializers.ValidationError(
+                BUSCA_TERMO_INVALIDO % {'tamanho': TAMANHO_MINIMO_TERMO})
+        return valor
+
+
+class JanelaSerializer(serializers.Serializer):
+    data_checkin = serializers.DateField()
+    data_checkout = serializers.DateField()
+    checkout_maximo = serializers.DateField()
@@ -0,0 +1,537 @@
+# -*- coding: utf-8 -*-
+"""Sharding horizontal dos imóveis, anúncios e reservas pelo id do imóvel.
+
+Cada imóvel é armazenado em um único shard (um alias de `DATABASES` listado
+em `SHARDS`), junto com os seus anúncios, as suas reservas e pré-reservas e o
+log de mudanças dessas escritas. Assim a validação de uma reserva e a transação de
+uma escrita nunca envolvem mais de um banco:
+
+* o diretório (`LocalizacaoImovel`), no banco `SHARDS_CATALOGO`, registra o
+  shard de cada imóvel. Os novos imóveis são distribuídos em rodízio e os
+  imóveis sem registro (anteriores ao sharding) estão no primeiro shard;
+* os ids são alocados da sequência do próprio shard, que usa uma faixa
+  exclusiva (`indice << BITS_FAIXA`). Os ids continuam únicos entre os
+  shards mesmo depois que um imóvel é movido e indicam onde o objeto foi
+  criado, o primeiro shard consultado nas buscas pelo id;
+* o `RoteadorShards` direciona as leituras e escritas de um objeto para o
+  shard do seu imóvel. Consultas sem um objeto de referência (listagens,
+  busca textual, lotes) são executadas em todos os shards e os resultados
+  intercalados (scatter-gather), em paralelo quando fora de transações;
+* `python manage.py rebalancear_shards` move imóveis, com os anúncios e as
+  reservas, entre os shards. Durante a cópia as escritas no imóvel são
+  recusadas com 503.
+
+Com um único shard (o padrão) o roteador não interfere e as consultas vão
+direto para o banco, como antes do sharding. Para experimentar localmente,
+defina a variável de ambiente `SHARDS=default,shard_1,shard_2`, que declara
+os shards como arquivos SQLite locais.
+
+Limitações: a unicidade do código do imóvel é garantida por shard; as
+operações em lote não são atômicas entre os shards; o feed de mudanças
+(`/api/mudancas`) não suporta sharding, já que as sequências dos logs são
+independentes em cada shard e os registros não acompanham os imóveis
+movidos. Com mais de um shard o feed precisa ser desligado
+(`MUDANCAS_FEED = False`), caso contrário a aplicação não inicia
+(`verificar_configuracao`). A sincronização incremental lê o log de cada
+shard e continua disponível.
+"""
+import heapq
+import itertools
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import connections, transaction
+from django.db.models import Count, Max
+from django.http import Http404
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .busca import buscar
+from .codigos import BITS as BITS_CODIGO
+from .constants import IMOVEL_EM_MIGRACAO
+from .models import Anuncio, Imovel, LocalizacaoImovel, PreReserva, Reserva
+
+
+# Bits da faixa de ids de cada shard. Os códigos curtos das reservas
+# comportam ids de até 40 bits, o que limita o sharding a 16 shards
+BITS_FAIXA = 36
+MAXIMO_SHARDS = 1 << (BITS_CODIGO - BITS_FAIXA)
+
+# Modelos posicionados pelo imóvel
+MODELOS = (Imovel, Anuncio, Reserva, PreReserva)
+
+# Retry-After, em segundos, das escritas recusadas durante uma movimentação.
+# Também é o tempo aguardado, antes da cópia, pelas escritas em andamento
+ESPERA_MIGRACAO = 5
+
+
+class ImovelEmMigracao(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = IMOVEL_EM_MIGRACAO
+    default_code = 'imovel_em_migracao'
+
+    def __init__(self, detail=None, code=None):
+        super().__init__(detail, code)
+        # O DRF envia `wait` no cabeçalho Retry-After
+        self.wait = ESPERA_MIGRACAO
+
+
+def shards() -> list:
+    return settings.SHARDS
+
+
+def catalogo() -> str:
+    return settings.SHARDS_CATALOGO
+
+
+def habilitado() -> bool:
+    return len(settings.SHARDS) > 1
+
+
+def verificar_configuracao():
+    """Recusa o feed de mudanças com mais de um shard: o feed lê o log de um
+    único banco e os consumidores perderiam as mudanças dos demais shards.
+    Executada na inicialização da aplicação."""
+    if habilitado() and settings.MUDANCAS_FEED:
+        raise ImproperlyConfigured(
+            'O feed de mudanças não suporta sharding. Com mais de um shard em SHARDS '
+            'defina MUDANCAS_FEED = False.')
+
+
+def faixa(alias: str) -> range:
+    """Faixa dos ids alocados pelo shard"""
+    indice = shards().index(alias)
+    if indice >= MAXIMO_SHARDS:
+        raise ImproperlyConfigured(f'São permitidos no máximo {MAXIMO_SHARDS} shards.')
+    return range(indice << BITS_FAIXA, (indice + 1) << BITS_FAIXA)
+
+
+def shard_de_origem(pk: int) -> str:
+    """Shard em que o objeto foi criado, pela faixa do id"""
+    indice = pk >> BITS_FAIXA
+    return shards()[indice] if 0 <= indice < len(shards()) else shards()[0]
+
+
+def ajustar_sequencias(alias: str):
+    """Posiciona as sequências dos ids do shard após o maior id da sua faixa.
+    Os ids de outras faixas, dos objetos movidos para o shard, não são
+    considerados."""
+    ids = faixa(alias)
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        for model in MODELOS:
+            maior = model.objects.using(alias).filter(
+                pk__gt=ids.start, pk__lt=ids.stop).aggregate(maior=Max('pk'))['maior'] or ids.start
+            tabela = model._meta.db_table
+            if connection.vendor == 'sqlite':
+                cursor.execute("DELETE FROM sqlite_sequence WHERE name = %s", [tabela])
+                cursor.execute(
+                    "INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [tabela, maior])
+            elif connection.vendor == 'postgresql':
+                cursor.execute(
+                    "SELECT setval(pg_get_serial_sequence(%s, 'id'), %s, %s)",
+                    [tabela, max(maior, 1), maior > 0])
+
+
+def _incrementar_sequencia(connection, tabela: str) -> Optional[int]:
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            # O UPDATE bloqueia o banco para escrita até o fim da transação,
+            # então duas conexões nunca leem o mesmo valor
+            cursor.execute("UPDATE sqlite_sequence SET seq = seq + 1 WHERE name = %s", [tabela])
+            cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [tabela])
+        else:
+            cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id'))", [tabela])
+        linha = cursor.fetchone()
+    return linha[0] if linha else None
+
+
+def proximo_id(model, alias: str) -> Optional[int]:
+    """Aloca o próximo id do modelo na faixa do shard. Deve ser chamada na
+    transação da inserção.
+
+    Os ids são explícitos porque o SQLite, mesmo com AUTOINCREMENT, continua
+    a partir do maior id da tabela, que pode ser o de um objeto movido de
+    outra faixa.
+
+    Returns:
+        int: O id ou None nos bancos que usam apenas a sequência padrão.
+    """
+    connection = connections[alias]
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        return None
+
+    ids = faixa(alias)
+    for _ in range(2):
+        valor = _incrementar_sequencia(connection, model._meta.db_table)
+        if valor is not None and ids.start < valor < ids.stop:
+            return valor
+        # Sequência ainda não posicionada na faixa do shard
+        ajustar_sequencias(alias)
+    raise RuntimeError(f'A faixa de ids do shard "{alias}" está esgotada.')
+
+
+def _chave_cache(imovel_id: int) -> str:
+    return f'shards:imovel:{imovel_id}'
+
+
+def shard_do_imovel(imovel_id: int, escrita: bool = False) -> str:
+    """Shard do imóvel segundo o diretório. As leituras usam o cache; nas
+    escritas o diretório é sempre consultado e os imóveis em migração são
+    recusados.
+
+    Raises:
+        ImovelEmMigracao: Na escrita em um imóvel que está sendo movido.
+    """
+    if not habilitado():
+        return Imovel.objects.db
+    if not escrita:
+        alias = cache.get(_chave_cache(imovel_id))
+        if alias is not None:
+            return alias
+
+    localizacao = LocalizacaoImovel.objects.using(catalogo()).filter(
+        pk=imovel_id).values_list('shard', 'em_migracao').first()
+    if localizacao is None:
+        return shards()[0]
+
+    alias, em_migracao = localizacao
+    if escrita and em_migracao:
+        raise ImovelEmMigracao()
+    cache.set(_chave_cache(imovel_id), alias, None)
+    return alias
+
+
+def registrar_imovel(imovel_id: int, alias: str):
+    """Registra o shard de um novo imóvel no diretório"""
+    LocalizacaoImovel.objects.using(catalogo()).update_or_create(
+        pk=imovel_id, defaults={'shard': alias, 'em_migracao': False})
+    cache.set(_chave_cache(imovel_id), alias, None)
+
+
+def remover_registro(imovel_id: int):
+    LocalizacaoImovel.objects.using(catalogo()).filter(pk=imovel_id).delete()
+    cache.delete(_chave_cache(imovel_id))
+
+
+_rodizio = itertools.count()
+
+
+def escolher_shard() -> str:
+    """Shard de um novo imóvel, em rodízio"""
+    return shards()[next(_rodizio) % len(shards())]
+
+
+def shard_da_instancia(instance, escrita: bool = False) -> str:
+    """Shard do imóvel ao qual o objeto pertence"""
+    if not escrita and instance._state.db is not None:
+        return instance._state.db
+
+    if isinstance(instance, Imovel):
+        if instance.pk is None:
+            return escolher_shard() if escrita else shards()[0]
+        return shard_do_imovel(instance.pk, escrita)
+
+    if isinstance(instance, Anuncio):
+        return shard_do_imovel(instance.imovel_id, escrita)
+
+    # Reservas e pré-reservas
+    if type(instance).anuncio.is_cached(instance):
+        anuncio = instance.anuncio
+    elif instance.anuncio_id is not None:
+        anuncio = obter(Anuncio.objects.only('imovel_id'), instance.anuncio_id)
+    else:
+        anuncio = None
+    return shards()[0] if anuncio is None else shard_do_imovel(anuncio.imovel_id, escrita)
+
+
+def candidatos(model, pk) -> list:
+    """Shards em que o objeto pode estar, começando pelo mais provável"""
+    if not habilitado():
+        return [model.objects.db]
+    pk = int(pk)
+    primeiro = shard_do_imovel(pk) if model is Imovel else shard_de_origem(pk)
+    return [primeiro, *(alias for alias in shards() if alias != primeiro)]
+
+
+def procurar(queryset, aliases: Iterable[str], **filtros):
+    """Primeiro objeto do queryset com os filtros, procurado nos shards na
+    ordem informada"""
+    for alias in aliases:
+        objeto = next(iter(queryset.using(alias).filter(**filtros)[:1]), None)
+        if objeto is not None:
+            return objeto
+    return None
+
+
+def obter(queryset, pk):
+    """Objeto do queryset com o id ou None. O shard de origem do id (ou do
+    imóvel) é consultado primeiro e os demais apenas se o objeto foi movido."""
+    return procurar(queryset, candidatos(queryset.model, pk), pk=pk)
+
+
+def em_todos(funcao: Callable[[str], object], aliases: Iterable[str] = None) -> list:
+    """Executa `funcao(alias)` em cada shard e retorna os resultados na ordem
+    dos shards.
+
+    As chamadas são feitas em paralelo, uma thread por shard, exceto dentro
+    de transações, pois as conexões das outras threads não veriam as
+    escritas ainda não confirmadas."""
+    aliases = list(shards() if aliases is None else aliases)
+    if (len(aliases) < 2 or not settings.SHARDS_PARALELO
+            or any(connections[alias].in_atomic_block for alias in aliases)):
+        return [funcao(alias) for alias in aliases]
+
+    def executar(alias):
+        try:
+            return funcao(alias)
+        finally:
+            # As conexões abertas pela thread não são reaproveitadas
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=len(aliases)) as executor:
+        return list(executor.map(executar, aliases))
+
+
+def intercalar(listas: Iterable[Iterable], chave: Callable, limite: int = None) -> list:
+    """Intercala os resultados de cada shard, já ordenados pela `chave`,
+    mantendo a ordem"""
+    return list(itertools.islice(heapq.merge(*listas, key=chave), limite))
+
+
+def buscar_em_shards(model, texto: str, limite: int, deslocamento: int = 0) -> list:
+    """`busca.buscar` em todos os shards. Cada shard retorna os seus
+    `deslocamento + limite` resultados mais relevantes e eles são
+    intercalados pela relevância, então o custo cresce com a página. As
+    relevâncias são calculadas por shard, portanto a ordem entre resultados
+    de shards diferentes é aproximada.
+
+    Returns:
+        list: Tuplas (id, relevância, shard).
+    """
+    if not habilitado():
+        alias = model.objects.db
+        return [
+            (pk, relevancia, alias)
+            for pk, relevancia in buscar(model, texto, limite, deslocamento, using=alias)]
+
+    def buscar_no_shard(alias):
+        return [
+            (pk, relevancia, alias)
+            for pk, relevancia in buscar(model, texto, deslocamento + limite, using=alias)]
+
+    resultados = intercalar(
+        em_todos(buscar_no_shard), chave=lambda resultado: (-resultado[1], resultado[0]),
+        limite=deslocamento + limite)
+    return resultados[deslocamento:]
+
+
+class RoteadorShards:
+    """Roteador de bancos do sharding (`DATABASE_ROUTERS`). Com um único
+    shard apenas o diretório é roteado."""
+
+    def db_for_read(self, model, **hints):
+        return self._rotear(model, hints.get('instance'), escrita=False)
+
+    def db_for_write(self, model, **hints):
+        return self._rotear(model, hints.get('instance'), escrita=True)
+
+    def _rotear(self, model, instance, escrita: bool) -> Optional[str]:
+        if model is LocalizacaoImovel:
+            return catalogo()
+        if not habilitado() or model not in MODELOS or not isinstance(instance, MODELOS):
+            return None
+        return shard_da_instancia(instance, escrita)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label != 'reservas' or model_name is None:
+            return None
+        if model_name == LocalizacaoImovel._meta.model_name:
+            return db == catalogo()
+        # O catálogo recebe as tabelas dos shards apenas quando também é um
+        # shard. Os demais bancos são shards em potencial (ex: shards locais)
+        return db in shards() or db != catalogo()
+
+
+class ShardMixin:
+    """Recupera o objeto da view (`get_object`) no shard em que ele está"""
+
+    def get_object(self):
+        if not habilitado():
+            return super().get_object()
+
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            instance = obter(queryset, self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except (TypeError, ValueError, ValidationError):
+            instance = None
+        if instance is None:
+            raise Http404
+        self.check_object_permissions(self.request, instance)
+        return instance
+
+
+def remover_do_shard(imovel_id: int, alias: str):
+    """Remove o imóvel, os seus anúncios, reservas e pré-reservas do shard sem
+    disparar os sinais: os objetos apenas mudaram de shard, então o log de
+    mudanças não registra remoções"""
+    for queryset in (PreReserva.objects.filter(anuncio__imovel=imovel_id),
+                     Reserva.objects.filter(anuncio__imovel=imovel_id),
+                     Anuncio.objects.filter(imovel=imovel_id),
+                     Imovel.objects.filter(pk=imovel_id)):
+        queryset.using(alias)._raw_delete(alias)
+
+
+def mover_imovel(imovel_id: int, destino: str, espera: float = ESPERA_MIGRACAO) -> dict:
+    """Move o imóvel, com os seus anúncios e reservas, para o shard `destino`:
+
+    1. o imóvel é marcado como em migração e as novas escritas passam a ser
+       recusadas. Após `espera` segundos as escritas que já haviam passado
+       pela checagem terminaram;
+    2. os objetos são copiados em uma transação no destino, com os mesmos
+       ids e datas;
+    3. o diretório passa a apontar para o destino;
+    4. os objetos são removidos da origem.
+
+    Uma movimentação interrompida pode ser repetida; as cópias que restarem
+    são descartadas por `registrar_imoveis`. Desabilita temporariamente as
+    datas automáticas dos modelos, portanto deve ser executada fora dos
+    processos que atendem requisições (ver `rebalancear_shards`).
+
+    Returns:
+        dict: Quantidade de objetos movidos por modelo.
+    """
+    # Importado aqui pois a carga depende do motor de disponibilidade, que
+    # depende deste módulo
+    from .carga import datas_automaticas_desabilitadas
+
+    diretorio = LocalizacaoImovel.objects.using(catalogo())
+    localizacao, _ = diretorio.get_or_create(pk=imovel_id, defaults={'shard': shards()[0]})
+    origem = localizacao.shard
+    if origem == destino:
+        return {}
+
+    diretorio.filter(pk=imovel_id).update(em_migracao=True)
+    cache.delete(_chave_cache(imovel_id))
+    try:
+        time.sleep(espera)
+        objetos = {
+            Imovel: [Imovel.objects.using(origem).get(pk=imovel_id)],
+            Anuncio: list(Anuncio.objects.using(origem).filter(imovel=imovel_id).order_by('pk')),
+            Reserva: list(Reserva.objects.using(origem).filter(
+                anuncio__imovel=imovel_id).order_by('pk')),
+            PreReserva: list(PreReserva.objects.using(origem).filter(
+                anuncio__imovel=imovel_id, expira_em__gt=timezone.now()).order_by('pk')),
+        }
+        with transaction.atomic(using=destino), datas_automaticas_desabilitadas():
+            remover_do_shard(imovel_id, destino)
+            for model, instancias in objetos.items():
+                model.objects.using(destino).bulk_create(instancias)
+            ajustar_sequencias(destino)
+    except BaseException:
+        diretorio.filter(pk=imovel_id).update(em_migracao=False)
+        raise
+
+    diretorio.filter(pk=imovel_id).update(shard=destino, em_migracao=False)
+    cache.delete(_chave_cache(imovel_id))
+    with transaction.atomic(using=origem):
+        remover_do_shard(imovel_id, origem)
+
+    return {model._meta.model_name: len(instancias) for model, instancias in objetos.items()}
+
+
+def registrar_imoveis() -> dict:
+    """Registra no diretório os imóveis sem registro (como os anteriores ao
+    sharding), libera os imóveis marcados por movimentações interrompidas e
+    descarta as cópias que elas deixaram fora do shard registrado.
+
+    Returns:
+        dict: Quantidade de imóveis registrados e de cópias descartadas.
+    """
+    diretorio = LocalizacaoImovel.objects.using(catalogo())
+    diretorio.filter(em_migracao=True).update(em_migracao=False)
+    registrados = dict(diretorio.values_list('pk', 'shard'))
+    presentes = dict(zip(shards(), em_todos(
+        lambda alias: set(Imovel.objects.using(alias).values_list('pk', flat=True)))))
+
+    novos = []
+    descartados = 0
+    for alias, imoveis in presentes.items():
+        for imovel_id in sorted(imoveis):
+            registrado = registrados.get(imovel_id)
+            if registrado is None:
+                registrados[imovel_id] = alias
+                novos.append(LocalizacaoImovel(pk=imovel_id, shard=alias))
+            elif registrado != alias and imovel_id in presentes.get(registrado, ()):
+                with transaction.atomic(using=alias):
+                    remover_do_shard(imovel_id, alias)
+                descartados += 1
+
+    diretorio.bulk_create(novos, batch_size=1000)
+    return {'registrados': len(novos), 'descartados': descartados}
+
+
+def pesos_imoveis() -> dict:
+    """Peso de cada imóvel, por shard: 1 + a quantidade de reservas.
+
+    Returns:
+        dict: Shard -> {id do imóvel: peso}.
+    """
+    def pesos(alias):
+        reservas = dict(
+            Reserva.objects.using(alias).order_by().values('anuncio__imovel')
+            .annotate(total=Count('pk')).values_list('anuncio__imovel', 'total'))
+        return {
+            imovel_id: 1 + reservas.get(imovel_id, 0)
+            for imovel_id in Imovel.objects.using(alias).values_list('pk', flat=True)}
+
+    return dict(zip(shards(), em_todos(pesos)))
+
+
+def planejar(pesos: dict, tolerancia: float = 0.1, maximo: int = None) -> list:
+    """Movimentações que equilibram a carga dos shards. A cada passo um
+    imóvel do shard mais carregado é movido para o menos carregado,
+    escolhendo o que deixa os dois mais próximos, até que a diferença entre
+    eles seja de no máximo `tolerancia` da carga média.
+
+    Args:
+        pesos (dict): Shard -> {id do imóvel: peso}, ver `pesos_imoveis`.
+        tolerancia (float, optional): Defaults to 0.1.
+        maximo (int, optional): Quantidade máxima de movimentações.
+
+    Returns:
+        list: Tuplas (id do imóvel, origem, destino).
+    """
+    pesos = {alias: dict(imoveis) for alias, imoveis in pesos.items()}
+    cargas = {alias: sum(imoveis.values()) for alias, imoveis in pesos.items()}
+    media = sum(cargas.values()) / len(cargas)
+    movimentos = []
+
+    while maximo is None or len(movimentos) < maximo:
+        origem = max(cargas, key=cargas.get)
+        destino = min(cargas, key=cargas.get)
+        diferenca = cargas[origem] - cargas[destino]
+        if diferenca <= tolerancia * media:
+            break
+
+        # Mover um imóvel de peso p deixa os dois shards a |diferenca - 2p|
+        # um do outro; pesos menores que a diferença sempre a reduzem
+        opcoes = [
+            (abs(diferenca - 2 * peso), imovel_id)
+            for imovel_id, peso in pesos[origem].items() if peso < diferenca]
+        if not opcoes:
+            break
+        _, imovel_id = min(opcoes)
+
+        peso = pesos[destino][imovel_id] = pesos[origem].pop(imovel_id)
+        cargas[origem] -= peso
+        cargas[destino] += peso
+        movimentos.append((imovel_id, origem, destino))
+
+    return movimentos
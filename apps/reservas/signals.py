@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import shards
+from .codigos import gerar as gerar_codigo_curto
+from .disponibilidade import invalidar_agenda, invalidar_agendas
+
+from .models import (
+    Imovel,
+    Anuncio,
+    Reserva,
+    PreReserva,
+    Mudanca
+)
+
+
+
+def serializer_historico(model):
+    """Serializer utilizado para gerar a representação registrada no log.
+
+    Os serializers são importados no primeiro registro, e não junto com os
+    sinais, para que processos que não gravam mudanças (como o worker da
+    fila de tarefas e os comandos de gerenciamento) não importem o DRF ao
+    inicializar o app."""
+    from .serializers import AnuncioSerializer, ImovelSerializer, ReservaSerializer
+
+    return {
+        Imovel: ImovelSerializer,
+        Anuncio: AnuncioSerializer,
+        Reserva: ReservaSerializer,
+    }[model]
+
+
+def nome_modelo(model) -> str:
+    """Nome usado para identificar o modelo no log de mudanças"""
+    return model._meta.model_name
+
+
+def registrar_atualizacoes(model, queryset, using: str = None) -> list:
+    """Registra no log as atualizações feitas com `QuerySet.update`, que não
+    disparam os sinais de `save`. Deve ser chamada na mesma transação da
+    atualização.
+
+    Returns:
+        list: Ids dos objetos registrados.
+    """
+    serializer_class = serializer_historico(model)
+    mudancas = [
+        Mudanca(
+            modelo=nome_modelo(model),
+            objeto_id=instance.pk,
+            operacao=Mudanca.Operacao.ATUALIZACAO,
+            dados=serializer_class(instance).data)
+        for instance in queryset]
+
+    Mudanca.objects.using(using or queryset.db).bulk_create(mudancas)
+
+    if model in (Anuncio, Reserva):
+        # Atualizações em lote não identificam os imóveis afetados
+        transaction.on_commit(invalidar_agendas, using=using or queryset.db)
+
+    return [mudanca.objeto_id for mudanca in mudancas]
+
+
+@receiver(pre_save, sender=Reserva)
+def preparar_codigo_curto(sender, instance, **kwargs):
+    # O código deriva do id: com o id já definido (ex: fixtures) ele é
+    # gravado na própria inserção. Cópias (`pk = None`) não mantêm o código
+    # da reserva original
+    if instance.pk is None:
+        instance.codigo_curto = None
+    elif instance._state.adding and instance.codigo_curto is None:
+        instance.codigo_curto = gerar_codigo_curto(instance.pk)
+
+
+@receiver(pre_save, sender=Imovel)
+@receiver(pre_save, sender=Anuncio)
+@receiver(pre_save, sender=Reserva)
+@receiver(pre_save, sender=PreReserva)
+def alocar_id_shard(sender, instance, raw=False, using=None, **kwargs):
+    # Com sharding os ids são alocados da faixa do shard (ver `shards.py`).
+    # Conectado após `preparar_codigo_curto`, que descarta o código das cópias
+    if instance.pk is None and not raw and shards.habilitado():
+        instance.pk = shards.proximo_id(sender, using)
+
+
+@receiver(post_save, sender=Imovel)
+def registrar_localizacao(sender, instance, created, raw=False, using=None, **kwargs):
+    if created and not raw and shards.habilitado():
+        shards.registrar_imovel(instance.pk, using)
+
+
+@receiver(post_delete, sender=Imovel)
+def remover_localizacao(sender, instance, using=None, **kwargs):
+    if shards.habilitado():
+        transaction.on_commit(
+            lambda imovel_id=instance.pk: shards.remover_registro(imovel_id), using=using)
+
+
+@receiver(post_save, sender=Reserva)
+def atribuir_codigo_curto(sender, instance, created, using=None, **kwargs):
+    """Preenche o código curto das reservas inseridas sem id, logo após a
+    inserção. É conectado antes de `registrar_salvamento` para que o log de
+    mudanças já registre o código."""
+    if instance.codigo_curto is None:
+        instance.codigo_curto = gerar_codigo_curto(instance.pk)
+        Reserva.objects.using(using).filter(pk=instance.pk).update(
+            codigo_curto=instance.codigo_curto)
+
+
+@receiver(post_save, sender=Imovel)
+@receiver(post_save, sender=Anuncio)
+@receiver(post_save, sender=Reserva)
+def registrar_salvamento(sender, instance, created, raw=False, using=None, **kwargs):
+    # Fixtures carregadas via loaddata não geram mudanças
+    if raw:
+        return
+
+    Mudanca.objects.using(using).create(
+        modelo=nome_modelo(sender),
+        objeto_id=instance.pk,
+        operacao=Mudanca.Operacao.CRIACAO if created else Mudanca.Operacao.ATUALIZACAO,
+        dados=serializer_historico(sender)(instance).data)
+
+
+@receiver(post_delete, sender=Imovel)
+@receiver(post_delete, sender=Anuncio)
+@receiver(post_delete, sender=Reserva)
+def registrar_remocao(sender, instance, using=None, **kwargs):
+    # Remoções em cascata também disparam este sinal, dentro da
+    # transação aberta pelo Collector
+    Mudanca.objects.using(using).create(
+        modelo=nome_modelo(sender),
+        objeto_id=instance.pk,
+        operacao=Mudanca.Operacao.REMOCAO)
+
+
+def _invalidar_apos_commit(imovel_ids, using):
+    for imovel_id in set(imovel_ids):
+        if imovel_id is not None:
+            transaction.on_commit(
+                lambda imovel_id=imovel_id: invalidar_agenda(imovel_id), using=using)
+
+
+@receiver(post_save, sender=Reserva)
+@receiver(post_delete, sender=Reserva)
+def invalidar_agenda_reserva(sender, instance, using=None, **kwargs):
+    # As agendas do motor de disponibilidade são invalidadas somente após
+    # o commit, para que nenhum processo recarregue dados não confirmados
+    if Reserva.anuncio.is_cached(instance):
+        _invalidar_apos_commit([instance.anuncio.imovel_id], using)
+        return
+
+    def invalidar(anuncio_id=instance.anuncio_id):
+        # Nas remoções em cascata o anúncio pode não existir mais, neste caso
+        # a agenda já foi invalidada pela remoção do próprio anúncio
+        imovel_id = Anuncio.objects.using(using).filter(
+            pk=anuncio_id).values_list('imovel_id', flat=True).first()
+        if imovel_id is not None:
+            invalidar_agenda(imovel_id)
+
+    transaction.on_commit(invalidar, using=using)
+
+
+@receiver(pre_save, sender=Anuncio)
+def guardar_imovel_anterior(sender, instance, raw=False, using=None, **kwargs):
+    instance._imovel_anterior_id = None
+    if instance.pk and not raw:
+        instance._imovel_anterior_id = Anuncio.objects.using(using).filter(
+            pk=instance.pk).values_list('imovel_id', flat=True).first()
+
+
+@receiver(post_save, sender=Anuncio)
+def invalidar_agenda_anuncio(sender, instance, created, using=None, **kwargs):
+    # Ao trocar o imóvel do anúncio, as reservas mudam de agenda
+    anterior = getattr(instance, '_imovel_anterior_id', None)
+    if anterior is not None and anterior != instance.imovel_id:
+        _invalidar_apos_commit([anterior, instance.imovel_id], using)
+
+
+@receiver(post_delete, sender=Anuncio)
+def invalidar_agenda_anuncio_removido(sender, instance, using=None, **kwargs):
+    _invalidar_apos_commit([instance.imovel_id], using)
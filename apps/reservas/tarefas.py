@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Tarefas executadas em segundo plano pelo comando `worker`"""
+from django.apps import apps
+from django.db import transaction
+
+from apps.tarefas.fila import tarefa
+
+from . import shards
+
+
+# Quantidade de objetos removidos por transação
+TAMANHO_BLOCO_REMOCAO = 500
+
+
+def selecao_lote(queryset, ids: list = None, filtro: dict = None):
+    """Aplica a seleção das operações em lote: os `ids` e o `filtro` por campo,
+    em que listas de valores são tratadas como `__in`"""
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    for campo, valor in (filtro or {}).items():
+        lookup = f'{campo}__in' if isinstance(valor, list) else campo
+        queryset = queryset.filter(**{lookup: valor})
+    return queryset
+
+
+@tarefa
+def remover_em_lote(tarefa, modelo: str, ids: list = None, filtro: dict = None) -> dict:
+    """Remove os objetos selecionados em blocos, cada um em sua própria
+    transação, para não manter bloqueios longos. A seleção (já validada pela
+    view) é resolvida na execução, bloco a bloco, sem carregar todos os ids.
+    Caso a tarefa seja interrompida, a próxima tentativa remove apenas os
+    objetos restantes.
+
+    Args:
+        modelo (str): Label do modelo, ex: "reservas.imovel".
+        ids (list, optional): Ids dos objetos a serem removidos.
+        filtro (dict, optional): Filtro por campo dos objetos a serem removidos.
+
+    Returns:
+        dict: Quantidade de objetos removidos por modelo, incluindo a cascata.
+    """
+    model = apps.get_model(modelo)
+    selecao = selecao_lote(model.objects.all(), ids, filtro)
+    removidos = {}
+
+    # Com sharding os objetos são procurados em todos os shards
+    aliases = shards.shards() if shards.habilitado() else [model.objects.db]
+    tarefa.atualizar_progresso(0, total=sum(selecao.using(alias).count() for alias in aliases))
+
+    for alias in aliases:
+        while True:
+            with transaction.atomic(using=alias):
+                bloco = list(selecao.using(alias).order_by('pk').values_list(
+                    'pk', flat=True)[:TAMANHO_BLOCO_REMOCAO])
+                if bloco:
+                    _, removidos_bloco = model.objects.using(alias).filter(pk__in=bloco).delete()
+                    for label, quantidade in removidos_bloco.items():
+                        removidos[label] = removidos.get(label, 0) + quantidade
+
+            tarefa.incrementar_progresso(len(bloco))
+            if len(bloco) < TAMANHO_BLOCO_REMOCAO:
+                break
+
+    return removidos
@@ -8,6 +8,8 @@ from json import JSONDecodeError
 
 from rest_framework.serializers import ModelSerializer
 
+from apps.reservas.carga import carregar_fixture
+
 from typing import Type, Union
 
 
@@ -29,7 +31,9 @@ class BaseApiTestCase(TestCase):
     Possui funcionalidades úteis para teste de requisições à API
     e senilização.
     """
-    fixtures = ["test_db_backup.json"]
+    # Fixtures adicionais carregadas com a carga rápida (`apps.reservas.carga`).
+    # As fixtures de `TESTES_FIXTURES` já estão no banco de testes
+    fixtures_carga = []
     # Nome da URL do endpoint da API a ser testada
     url_name: str = None
     # Serializer utilizada no endpoint da API
@@ -47,6 +51,9 @@ class BaseApiTestCase(TestCase):
         # Certifica que a classe herdeira implementou as variáveis necessárias
         assert cls.url_name, "A classe herdeira não implementou a variável 'url_name'"
         assert cls.serializer_class, "A classe herdeira não implementou a variável 'serializer_class'"
+
+        for fixture in cls.fixtures_carga:
+            carregar_fixture(fixture)
     
 
     def get_url(self, pk=None) -> str:
@@ -0,0 +1,180 @@
+import threading
+import time
+
+from unittest import mock
+
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.response import Response
+
+from apps.reservas.admissao import ControleAdmissao, controle_admissao
+from apps.reservas.views import ReservaAPIView
+
+from .test_api_reserva import CREATE_RESERVA_DATA
+
+
+def aguardar(condicao, limite: float = 5):
+    fim = time.monotonic() + limite
+    while not condicao():
+        if time.monotonic() > fim:
+            raise AssertionError("Tempo esgotado aguardando as requisições")
+        time.sleep(0.005)
+
+
+def criar_controle(**kwargs) -> ControleAdmissao:
+    parametros = dict(limite=2, minimo=1, maximo=10, fila=2, espera=5, tolerancia=3)
+    parametros.update(kwargs)
+    return ControleAdmissao(**parametros)
+
+
+class ControleAdmissaoTestCase(SimpleTestCase):
+
+    def test_admite_ate_o_limite(self):
+        controle = criar_controle(fila=0)
+        self.assertIsNone(controle.admitir())
+        self.assertIsNone(controle.admitir())
+        # Sem fila a terceira é recusada imediatamente
+        self.assertEqual(controle.admitir(), 1)
+
+        controle.liberar(0.1)
+        self.assertIsNone(controle.admitir())
+
+    def test_fila_em_ordem_de_chegada(self):
+        controle = criar_controle(limite=1, maximo=1)
+        self.assertIsNone(controle.admitir())
+        admitidas = []
+
+        def requisicao(nome):
+            if controle.admitir() is None:
+                admitidas.append(nome)
+
+        threads = []
+        for nome in ("primeira", "segunda"):
+            threads.append(threading.Thread(target=requisicao, args=(nome,)))
+            threads[-1].start()
+            aguardar(lambda: len(controle.fila) == len(threads))
+
+        # A fila está cheia
+        self.assertIsNotNone(controle.admitir())
+
+        controle.liberar(0.01)
+        aguardar(lambda: admitidas == ["primeira"])
+        controle.liberar(0.01)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(admitidas, ["primeira", "segunda"])
+        self.assertEqual(controle.em_execucao, 1)
+
+    def test_recusa_quando_a_espera_estimada_excede_o_prazo(self):
+        controle = criar_controle(limite=1, maximo=1, fila=10, espera=1)
+        controle.admitir()
+        controle.liberar(0.6)
+        controle.admitir()
+
+        # Latência média de 0.6 s: a primeira da fila aguardaria 0.6 s e a
+        # segunda 1.2 s
+        self.assertAlmostEqual(controle.estimar_espera(2), 1.2)
+        thread = threading.Thread(target=controle.admitir)
+        thread.start()
+        aguardar(lambda: len(controle.fila) == 1)
+        inicio = time.monotonic()
+        self.assertEqual(controle.admitir(), 2)
+        self.assertLess(time.monotonic() - inicio, 0.5)
+        controle.liberar(0.6)
+        thread.join()
+
+    def test_prazo_da_fila(self):
+        controle = criar_controle(limite=1, espera=0.05)
+        controle.admitir()
+        self.assertEqual(controle.admitir(), 1)
+        self.assertFalse(controle.fila)
+        self.assertEqual(controle.em_execucao, 1)
+
+    def test_limite_adaptativo(self):
+        relogio = mock.Mock(return_value=0)
+        controle = criar_controle(limite=4, fila=0, relogio=relogio)
+
+        # Escritas rápidas e saturadas aumentam o limite
+        for _ in range(4):
+            controle.admitir()
+        for _ in range(5):
+            controle.liberar(0.01)
+            controle.admitir()
+        self.assertGreater(controle.limite, 4)
+        self.assertEqual(controle.vagas, 5)
+
+        # Escritas lentas reduzem o limite uma vez por ciclo
+        controle.liberar(0.5)
+        self.assertEqual(controle.vagas, 2)
+        controle.liberar(0.5)
+        self.assertEqual(controle.vagas, 2)
+        relogio.return_value = 10
+        controle.liberar(0.5, sucesso=False)
+        self.assertEqual(controle.vagas, 1)
+
+        # Nunca abaixo do mínimo
+        relogio.return_value = 20
+        controle.liberar(0.5)
+        self.assertEqual(controle.vagas, 1)
+
+
+@override_settings(
+    ADMISSAO_LIMITE_INICIAL=1, ADMISSAO_LIMITE_MINIMO=1, ADMISSAO_FILA=0, THROTTLE_TAXAS={})
+class AdmissaoViewTestCase(TestCase):
+    url = reverse("reserva_api_view")
+
+    def test_escrita_recusada_com_retry_after(self):
+        liberar = threading.Event()
+        executando = threading.Event()
+
+        def create(view, request, *args, **kwargs):
+            executando.set()
+            liberar.wait(5)
+            return Response(status=status.HTTP_201_CREATED)
+
+        respostas = []
+        with mock.patch.object(ReservaAPIView, "create", create):
+            thread = threading.Thread(target=lambda: respostas.append(
+                Client().post(self.url, CREATE_RESERVA_DATA, content_type="application/json")))
+            thread.start()
+            executando.wait(5)
+
+            response = self.client.post(
+                self.url, CREATE_RESERVA_DATA, content_type="application/json",
+                headers={"Accept": "application/json"})
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response["Retry-After"], "1")
+            self.assertEqual(response.json()["detail"],
+                             "O servidor está sobrecarregado. Tente novamente em instantes.")
+
+            # As leituras não passam pelo controle de admissão
+            response = self.client.get(self.url, headers={"Accept": "application/json"})
+            self.assertEqual(response.status_code, 200)
+
+            liberar.set()
+            thread.join()
+
+        self.assertEqual(respostas[0].status_code, 201)
+        self.assertEqual(controle_admissao("ReservaAPIView").em_execucao, 0)
+
+    def test_vaga_liberada_apos_excecao(self):
+        def create(view, request, *args, **kwargs):
+            raise RuntimeError
+
+        with mock.patch.object(ReservaAPIView, "create", create):
+            with self.assertRaises(RuntimeError):
+                self.client.post(self.url, CREATE_RESERVA_DATA, content_type="application/json")
+
+        controle = controle_admissao("ReservaAPIView")
+        self.assertEqual(controle.em_execucao, 0)
+        response = self.client.post(
+            self.url, CREATE_RESERVA_DATA, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+
+    @override_settings(ADMISSAO_ESCRITAS=False)
+    def test_desabilitado(self):
+        response = self.client.post(
+            self.url, CREATE_RESERVA_DATA, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(controle_admissao("ReservaAPIView").em_execucao, 0)
@@ -0,0 +1,59 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from apps.reservas.disponibilidade import motor
+from apps.reservas.models import Reserva
+
+
+class JanelasApiTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        motor.limpar()
+
+    def buscar(self, pk=1, expected_status_code=200, **params):
+        response = self.client.get(
+            reverse("imovel_janelas_api_view", kwargs={"pk": pk}),
+            {"inicio": "2024-03-01", "fim": "2024-06-30", **params},
+            headers={"Accept": "application/json"})
+        self.assertEqual(response.status_code, expected_status_code, response.content)
+        return response.json()
+
+    def test_janelas(self):
+        dados = self.buscar(noites=3, limite=3)
+        self.assertEqual(dados['janelas'], [
+            {'data_checkin': '2024-03-01', 'data_checkout': '2024-03-04', 'checkout_maximo': '2024-03-05'},
+            {'data_checkin': '2024-03-16', 'data_checkout': '2024-03-19', 'checkout_maximo': '2024-05-13'},
+            {'data_checkin': '2024-05-20', 'data_checkout': '2024-05-23', 'checkout_maximo': '2024-06-30'},
+        ])
+        self.assertEqual(dados['noites'], 3)
+
+    @override_settings(DISPONIBILIDADE_MOTOR=True)
+    def test_janelas_com_motor(self):
+        with override_settings(DISPONIBILIDADE_MOTOR=False):
+            esperado = self.buscar(noites=2, limite=10)['janelas']
+        cache.clear()
+        self.assertEqual(self.buscar(noites=2, limite=10)['janelas'], esperado)
+
+    def test_capacidade(self):
+        self.assertEqual(self.buscar(noites=3, hospedes=3)['janelas'], [])
+
+    def test_cache_por_versao(self):
+        self.buscar(noites=3, limite=1)
+
+        with self.assertNumQueries(1):
+            # Apenas a consulta do imóvel, as janelas vêm do cache
+            self.buscar(noites=3, limite=1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Reserva.objects.create(
+                anuncio_id=2, data_checkin="2024-03-01", data_checkout="2024-03-02",
+                preco_total="10.00", qtd_hospedes=1)
+
+        self.assertEqual(self.buscar(noites=3, limite=1)['janelas'][0]['data_checkin'], '2024-03-16')
+
+    def test_parametros(self):
+        self.assertIn('noites', self.buscar(expected_status_code=400))
+        self.assertIn('fim', self.buscar(noites=1, fim="2024-02-01", expected_status_code=400))
+        self.buscar(pk=999, noites=1, expected_status_code=404)
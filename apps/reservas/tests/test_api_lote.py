@@ -0,0 +1,173 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.test import override_settings
+from django.urls import reverse
+
+from apps.reservas.models import Anuncio, Imovel, Mudanca, Reserva
+from apps.reservas.serializers import AnuncioSerializer, ReservaSerializer
+from apps.tarefas.fila import executar_tarefa, reservar_tarefa
+from apps.tarefas.models import Tarefa
+from .base import *
+
+
+class BuscaLoteApiTestCase(BaseApiTestCase):
+    url_name = "reserva_api_view"
+    serializer_class = ReservaSerializer
+
+    def test_busca_por_query_string(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                self.get_url(), {"ids": "3,1,999,3"}, headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.content)
+
+        dados = response.json()
+        self.assertEqual([obj['id'] for obj in dados['resultados']], [3, 1])
+        self.assertEqual(dados['nao_encontrados'], [999])
+
+        for obj in dados['resultados']:
+            self.check_serialization(obj)
+
+    def test_busca_por_post(self):
+        url = reverse("anuncio_lote_api_view")
+        response = self.client.post(
+            url, data=json.dumps({"ids": [2, 1]}),
+            content_type="application/json", headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([obj['id'] for obj in response.json()['resultados']], [2, 1])
+
+        # Uma lista sem o envelope também é aceita
+        response = self.client.post(
+            url, data=json.dumps([1]), content_type="application/json", headers=self.headers)
+        self.assertEqual([obj['id'] for obj in response.json()['resultados']], [1])
+
+    def test_ids_invalidos(self):
+        for ids in ("a,b", ","):
+            response = self.client.get(self.get_url(), {"ids": ids}, headers=self.headers)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('ids', response.json())
+
+        response = self.client.post(
+            reverse("reserva_lote_api_view"), data=json.dumps({"ids": 1}),
+            content_type="application/json", headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(LOTE_LIMITE=2)
+    def test_limite(self):
+        response = self.client.get(self.get_url(), {"ids": "1,2,3"}, headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+
+class OperacoesLoteApiTestCase(BaseApiTestCase):
+    url_name = "anuncio_api_view"
+    serializer_class = AnuncioSerializer
+
+    def enviar(self, metodo, dados, url_name=None, expected_status_code=200):
+        url = reverse(url_name or self.url_name)
+        response = getattr(self.client, metodo)(
+            url, data=json.dumps(dados), content_type="application/json",
+            headers=self.headers)
+        self.assertEqual(response.status_code, expected_status_code, response.content)
+        return response.json()
+
+    def test_atualizacao_por_filtro(self):
+        plataforma = Anuncio.objects.values_list('plataforma', flat=True).first()
+        esperados = set(Anuncio.objects.filter(
+            plataforma=plataforma).values_list('id', flat=True))
+
+        dados = self.enviar('patch', {
+            "filtro": {"plataforma": plataforma},
+            "valores": {"taxa_plataforma": "12.50"}})
+
+        self.assertEqual({r['id'] for r in dados['resultados']}, esperados)
+        self.assertEqual(
+            set(Anuncio.objects.filter(taxa_plataforma=Decimal('12.50')).values_list('id', flat=True)),
+            esperados)
+
+        # As atualizações são registradas no feed de mudanças
+        self.assertEqual(
+            set(Mudanca.objects.filter(modelo='anuncio', operacao='atualizacao')
+                .values_list('objeto_id', flat=True)),
+            esperados)
+
+    def test_atualizacao_por_ids(self):
+        dados = self.enviar('patch', {"ids": [1, 2, 999], "valores": {"plataforma": "Booking"}})
+        self.assertEqual(dados['resultados'], [
+            {'id': 1, 'status': 'atualizado'}, {'id': 2, 'status': 'atualizado'}])
+        self.assertEqual(dados['nao_encontrados'], [999])
+        self.assertEqual(Anuncio.objects.filter(plataforma="Booking").count(), 2)
+
+    def test_validacao_dos_valores(self):
+        dados = self.enviar('patch', {
+            "ids": [1], "valores": {"taxa_plataforma": "-1.00"}}, expected_status_code=400)
+        self.assertIn('taxa_plataforma', dados)
+        self.assertNotEqual(Anuncio.objects.get(pk=1).taxa_plataforma, Decimal('-1.00'))
+
+        # Seleção obrigatória e campos não permitidos
+        self.enviar('patch', {"valores": {"plataforma": "X"}}, expected_status_code=400)
+        self.enviar('patch', {"ids": [1], "valores": {"id": 5}}, expected_status_code=400)
+        self.enviar('patch', {"filtro": {"taxa_plataforma": 1}, "valores": {"plataforma": "X"}},
+                    expected_status_code=400)
+        self.enviar('patch', {"filtro": {"imovel": "abc"}, "valores": {"plataforma": "X"}},
+                    expected_status_code=400)
+        # Campos únicos não podem receber o mesmo valor em vários objetos
+        self.enviar('patch', {"ids": [1, 2], "valores": {"codigo": "X"}},
+                    url_name="imovel_api_view", expected_status_code=400)
+
+    def test_atualizacao_parcial(self):
+        response = self.client.patch(
+            reverse(self.url_name, kwargs={"pk": 1}), data=json.dumps({"plataforma": "Vrbo"}),
+            content_type="application/json", headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(Anuncio.objects.get(pk=1).plataforma, "Vrbo")
+
+    def test_remocao(self):
+        ids = list(Reserva.objects.filter(anuncio__imovel=1).values_list('id', flat=True))
+        dados = self.enviar('delete', {"filtro": {"anuncio__imovel": 1}},
+                            url_name="reserva_api_view")
+        self.assertEqual([r['id'] for r in dados['resultados']], ids)
+        self.assertFalse(Reserva.objects.filter(id__in=ids).exists())
+
+        # A remoção de imóveis remove anúncios e reservas em cascata
+        dados = self.enviar('delete', {"ids": [2]}, url_name="imovel_api_view")
+        self.assertEqual(dados['resultados'], [{'id': 2, 'status': 'removido'}])
+        self.assertIn('reservas.Anuncio', dados['removidos'])
+        self.assertFalse(Anuncio.objects.filter(imovel=2).exists())
+
+        # Anúncios não podem ser removidos
+        self.enviar('delete', {"ids": [1]}, expected_status_code=405)
+        self.enviar('delete', {}, url_name="reserva_api_view", expected_status_code=400)
+
+    @override_settings(LOTE_REMOCAO_SINCRONA=1)
+    def test_remocao_assincrona(self):
+        dados = self.enviar('delete', {"ids": [1, 2]}, url_name="imovel_api_view",
+                            expected_status_code=202)
+        tarefa = Tarefa.objects.get(pk=dados['tarefa'])
+        self.assertTrue(Imovel.objects.filter(pk__in=[1, 2]).exists())
+
+        executar_tarefa(reservar_tarefa().pk)
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, Tarefa.Status.CONCLUIDA)
+        self.assertEqual(tarefa.resultado['reservas.Imovel'], 2)
+        self.assertFalse(Imovel.objects.filter(pk__in=[1, 2]).exists())
+
+    @override_settings(LOTE_REMOCAO_SINCRONA=1)
+    def test_remocao_assincrona_por_filtro(self):
+        selecionadas = list(Reserva.objects.filter(anuncio__imovel=1).values_list('pk', flat=True))
+        self.assertGreater(len(selecionadas), 1)
+        dados = self.enviar('delete', {"filtro": {"anuncio__imovel": 1}}, url_name="reserva_api_view",
+                            expected_status_code=202)
+
+        # A tarefa recebe a seleção, e não os ids selecionados
+        tarefa = Tarefa.objects.get(pk=dados['tarefa'])
+        self.assertEqual(tarefa.argumentos, {
+            'modelo': 'reservas.reserva', 'ids': None, 'filtro': {"anuncio__imovel": 1}})
+
+        with mock.patch("apps.reservas.tarefas.TAMANHO_BLOCO_REMOCAO", 2):
+            executar_tarefa(reservar_tarefa().pk)
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, Tarefa.Status.CONCLUIDA)
+        self.assertEqual(tarefa.resultado, {'reservas.Reserva': len(selecionadas)})
+        self.assertEqual(tarefa.progresso_atual, len(selecionadas))
+        self.assertFalse(Reserva.objects.filter(anuncio__imovel=1).exists())
+        self.assertTrue(Reserva.objects.exists())
@@ -0,0 +1,136 @@
+import json
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.reservas.models import Imovel, Mudanca
+
+
+CREATE_IMOVEL_DATA = {
+    "codigo": "Casa Teste Mudança",
+    "capacidade": 3,
+    "banheiros": 1,
+    "aceita_animais": True,
+    "taxa_limpeza": "150.00",
+    "data_ativacao": "2024-03-05"
+}
+
+
+class MudancaApiTestCase(TestCase):
+
+    @property
+    def headers(self):
+        return {
+            "Accept": "application/json"
+        }
+
+    def get_mudancas(self, **params):
+        response = self.client.get(
+            reverse("mudanca_api_view"), params, headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_fixtures_nao_geram_mudancas(self):
+        self.assertFalse(Mudanca.objects.exists())
+
+    def test_registro_das_mudancas(self):
+        response = self.client.post(
+            reverse("imovel_api_view"), data=json.dumps(CREATE_IMOVEL_DATA),
+            content_type="application/json", headers=self.headers)
+        pk = response.json()['id']
+
+        response = self.client.put(
+            reverse("imovel_api_view", kwargs={"pk": pk}),
+            data=json.dumps({**CREATE_IMOVEL_DATA, "capacidade": 4}),
+            content_type="application/json", headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+
+        dados = self.get_mudancas()
+        self.assertEqual(
+            [(m['modelo'], m['objeto_id'], m['operacao']) for m in dados['mudancas']],
+            [('imovel', pk, 'criacao'), ('imovel', pk, 'atualizacao')])
+        self.assertEqual(dados['mudancas'][1]['dados']['capacidade'], 4)
+        self.assertEqual(dados['proximo'], dados['mudancas'][-1]['seq'])
+
+        # Apenas as mudanças posteriores à sequência informada são retornadas
+        dados = self.get_mudancas(desde=dados['mudancas'][0]['seq'])
+        self.assertEqual(len(dados['mudancas']), 1)
+
+        vazio = self.get_mudancas(desde=dados['proximo'])
+        self.assertEqual(vazio, {'mudancas': [], 'proximo': dados['proximo']})
+
+    def test_remocao_em_cascata(self):
+        imovel = Imovel.objects.get(pk=1)
+        anuncios = set(imovel.anuncios.values_list('id', flat=True))
+        self.assertTrue(anuncios)
+        imovel.delete()
+
+        dados = self.get_mudancas(modelo='anuncio')
+        self.assertEqual(
+            {m['objeto_id'] for m in dados['mudancas'] if m['operacao'] == 'remocao'},
+            anuncios)
+        self.assertTrue(Mudanca.objects.filter(
+            modelo='imovel', objeto_id=1, operacao='remocao').exists())
+
+    def test_mudanca_revertida_com_transacao(self):
+        try:
+            with transaction.atomic():
+                Imovel.objects.create(**CREATE_IMOVEL_DATA)
+                raise RuntimeError()
+        except RuntimeError:
+            pass
+        self.assertFalse(Mudanca.objects.exists())
+
+    def test_parametros_invalidos(self):
+        response = self.client.get(
+            reverse("mudanca_api_view"), {"desde": "abc"}, headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('desde', response.json())
+
+        response = self.client.get(
+            reverse("mudanca_api_view"), headers={**self.headers, "Last-Event-ID": "abc"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Last-Event-ID', response.json())
+
+    @override_settings(MUDANCAS_FEED=False)
+    def test_feed_desligado(self):
+        response = self.client.get(reverse("mudanca_api_view"), headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(MUDANCAS_MARGEM=60)
+    def test_margem_de_visibilidade(self):
+        antigo, recente, seguinte = [
+            Imovel.objects.create(**{**CREATE_IMOVEL_DATA, "codigo": f"Casa {i}"}) for i in range(3)]
+        Mudanca.objects.update(data=timezone.now() - timedelta(minutes=5))
+        Mudanca.objects.filter(objeto_id=recente.pk).update(data=timezone.now())
+
+        # A leitura para na primeira mudança recente, mesmo que as seguintes
+        # sejam mais antigas, e o consumidor não avança sobre ela
+        dados = self.get_mudancas()
+        self.assertEqual([m['objeto_id'] for m in dados['mudancas']], [antigo.pk])
+
+        Mudanca.objects.update(data=timezone.now() - timedelta(minutes=5))
+        dados = self.get_mudancas(desde=dados['proximo'])
+        self.assertEqual([m['objeto_id'] for m in dados['mudancas']], [recente.pk, seguinte.pk])
+
+    @override_settings(MUDANCAS_ESPERA_MAXIMA=0)
+    def test_event_stream(self):
+        Imovel.objects.create(**CREATE_IMOVEL_DATA)
+        seq = Mudanca.objects.get().id
+
+        response = self.client.get(
+            reverse("mudanca_api_view"), headers={"Accept": "text/event-stream"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        conteudo = b''.join(response.streaming_content).decode()
+        self.assertIn(f'id: {seq}\nevent: mudanca\n', conteudo)
+
+        response = self.client.get(
+            reverse("mudanca_api_view"),
+            headers={"Accept": "text/event-stream", "Last-Event-ID": str(seq)})
+        self.assertNotIn('event: mudanca', b''.join(response.streaming_content).decode())
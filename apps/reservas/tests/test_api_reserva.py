@@ -1,3 +1,14 @@
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+
+from apps.reservas import views
+from apps.reservas.disponibilidade import motor
+from apps.reservas.models import Reserva
 from apps.reservas.serializers import ReservaSerializer
 from .base import *
 
@@ -62,6 +73,35 @@ class ReservaApiTestCase(BaseApiTestCase):
         # Verifica se o objeto foi criado
         self.assertObjectPresent(pk)
 
+    def test_create_bloqueia_imovel(self):
+        # O imóvel é bloqueado dentro da transação que valida e grava a
+        # reserva, antes da validação
+        bloqueios = []
+        savepoints = len(connection.savepoint_ids)
+
+        def bloquear_imovel(imovel_id, using):
+            bloqueios.append((imovel_id, using, len(connection.savepoint_ids) > savepoints,
+                              Reserva.objects.count()))
+
+        total = Reserva.objects.count()
+        with mock.patch.object(views, "bloquear_imovel", side_effect=bloquear_imovel):
+            self.check_api_view_create(CREATE_RESERVA_DATA)
+        self.assertEqual(bloqueios, [(2, "default", True, total)])
+
+    @override_settings(DISPONIBILIDADE_MOTOR=True)
+    def test_create_valida_no_banco_com_motor(self):
+        cache.clear()
+        motor.limpar()
+        # A agenda do motor, carregada antes da reserva concorrente, não a
+        # contém: com o imóvel bloqueado a criação é validada no banco
+        motor.agenda(2)
+        Reserva.objects.create(
+            anuncio_id=5, data_checkin=date(2024, 5, 8), data_checkout=date(2024, 5, 9),
+            preco_total=Decimal("100.00"), qtd_hospedes=2)
+        total = Reserva.objects.count()
+        self.check_api_view_create(CREATE_RESERVA_DATA, expected_status_code=400)
+        self.assertEqual(Reserva.objects.count(), total)
+
     def test_validations(self):
         # Verifica se os erros de validação estão sendo acionados
         self.assertValidationError({}, 'data_checkin', 'required')
@@ -0,0 +1,51 @@
+from django.urls import reverse
+from django.utils.dateparse import parse_datetime
+
+from apps.reservas.models import Imovel
+from apps.reservas.serializers import ImovelSerializer
+from .base import *
+
+
+class SincronizacaoApiTestCase(BaseApiTestCase):
+    url_name = "imovel_api_view"
+    serializer_class = ImovelSerializer
+
+    def sincronizar(self, desde, expected_status_code=200):
+        response = self.client.get(
+            self.get_url(), {"atualizado_desde": desde}, headers=self.headers)
+        self.assertEqual(response.status_code, expected_status_code, response.content)
+        return response.json()
+
+    def test_apenas_alterados(self):
+        dados = self.sincronizar("2024-03-06T11:00:00Z")
+        self.assertEqual([obj['id'] for obj in dados['resultados']], [5, 6])
+        self.assertEqual(dados['removidos'], [])
+
+        for obj in dados['resultados']:
+            self.check_serialization(obj)
+
+        # Datas sem fuso são interpretadas no fuso do servidor
+        self.assertEqual(len(self.sincronizar("2024-03-06T11:00:00")['resultados']), 2)
+
+    def test_marca_dagua(self):
+        marca_dagua = self.sincronizar("2024-03-06T11:00:00Z")['marca_dagua']
+        self.assertIsNotNone(parse_datetime(marca_dagua))
+
+        imovel = Imovel.objects.get(pk=2)
+        imovel.capacidade = 5
+        imovel.save()
+        self.check_api_view_delete(3)
+
+        dados = self.sincronizar(marca_dagua)
+        self.assertEqual([obj['id'] for obj in dados['resultados']], [2])
+        self.assertEqual(dados['removidos'], [3])
+
+    def test_data_invalida(self):
+        dados = self.sincronizar("ontem", expected_status_code=400)
+        self.assertIn('atualizado_desde', dados)
+
+    def test_outros_recursos(self):
+        dados = self.client.get(
+            reverse("anuncio_api_view"), {"atualizado_desde": "2030-01-01T00:00:00Z"},
+            headers=self.headers).json()
+        self.assertEqual(dados['resultados'], [])
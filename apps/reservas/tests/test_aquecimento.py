@@ -0,0 +1,75 @@
+import gc
+import time
+
+from unittest import mock
+
+from django.apps import apps
+from django.test import TestCase
+from django.urls import clear_url_caches, get_resolver, reverse
+from rest_framework.utils import model_meta
+
+from apps.reservas.serializers import (
+    AnuncioSerializer,
+    ImovelSerializer,
+    MudancaSerializer,
+    ReservaSerializer
+)
+from seazonecodechallenge.aquecimento import aquecer
+
+
+SERIALIZERS = (ImovelSerializer, AnuncioSerializer, ReservaSerializer, MudancaSerializer)
+
+
+class AquecimentoTestCase(TestCase):
+
+    def esfriar(self):
+        """Descarta os caches preenchidos pelo aquecimento, simulando um worker novo"""
+        clear_url_caches()
+        for serializer_class in SERIALIZERS:
+            serializer_class.limpar_cache_campos()
+        for model in apps.get_models():
+            model._meta._expire_cache()
+
+    def primeira_requisicao(self, aquecido: bool) -> float:
+        url = reverse("reserva_api_view", kwargs={"pk": 1})
+        self.esfriar()
+        if aquecido:
+            # A conexão do TestCase está dentro de uma transação e não pode ser fechada
+            aquecer(banco=False, congelar_gc=False)
+
+        inicio = time.perf_counter()
+        response = self.client.get(url, headers={"Accept": "application/json"})
+        duracao = time.perf_counter() - inicio
+        self.assertEqual(response.status_code, 200)
+        return duracao
+
+    def test_primeira_requisicao(self):
+        frio = min(self.primeira_requisicao(aquecido=False) for _ in range(5))
+        aquecido = min(self.primeira_requisicao(aquecido=True) for _ in range(5))
+        self.assertLess(aquecido, frio)
+
+    def test_caches_preenchidos(self):
+        self.esfriar()
+        aquecer(banco=False, congelar_gc=False)
+        self.assertTrue(get_resolver()._populated)
+
+        # A primeira requisição não inspeciona os modelos para gerar os campos
+        with mock.patch.object(model_meta, "get_field_info", wraps=model_meta.get_field_info) as espiao:
+            response = self.client.get(
+                reverse("reserva_api_view", kwargs={"pk": 1}), headers={"Accept": "application/json"})
+        self.assertEqual(response.status_code, 200)
+        espiao.assert_not_called()
+
+    def test_campos_copiados(self):
+        campos = ReservaSerializer().fields
+        self.assertIsNot(campos["codigo"], ReservaSerializer().fields["codigo"])
+        self.assertIs(campos["codigo"].parent.__class__, ReservaSerializer)
+        # Cada classe possui o próprio cache
+        self.assertNotIn("qtd_hospedes", ImovelSerializer().fields)
+
+    def test_congelar_gc(self):
+        try:
+            aquecer(banco=False)
+            self.assertGreater(gc.get_freeze_count(), 0)
+        finally:
+            gc.unfreeze()
@@ -0,0 +1,119 @@
+from io import StringIO
+from uuid import uuid4
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from apps.reservas.busca import buscar, termos
+from apps.reservas.models import Imovel, Reserva
+
+
+class BuscaTestCase(TestCase):
+
+    def setUp(self):
+        self.comentarios = {
+            1: "Hóspede pediu berço e cadeira de alimentação",
+            2: "Chegada tardia, deixar a chave na portaria",
+            3: "Chave extra solicitada. Chave reserva na portaria",
+            4: None,
+        }
+        for pk, comentario in self.comentarios.items():
+            reserva = Reserva.objects.get(pk=pk)
+            reserva.comentario = comentario
+            reserva.save()
+
+    def buscar(self, nome: str, q: str, **parametros):
+        return self.client.get(
+            reverse(nome), {"q": q, **parametros}, headers={"Accept": "application/json"})
+
+    def ids(self, response) -> list:
+        return [resultado["id"] for resultado in response.json()["resultados"]]
+
+    def test_termos(self):
+        self.assertEqual(termos("Chave na portaria"), ["Chave", "portaria"])
+        self.assertEqual(termos("a b"), [])
+
+    def test_busca_reservas_por_trecho(self):
+        response = self.buscar("reserva_busca_api_view", "ortar")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(self.ids(response)), [2, 3])
+
+        # A reserva com mais ocorrências é a mais relevante
+        response = self.buscar("reserva_busca_api_view", "have")
+        self.assertEqual(self.ids(response), [3, 2])
+
+        # Todos os termos devem estar presentes, sem diferenciar maiúsculas
+        self.assertEqual(self.ids(self.buscar("reserva_busca_api_view", "CHAVE tardia")), [2])
+        self.assertEqual(self.ids(self.buscar("reserva_busca_api_view", "berço")), [1])
+        self.assertEqual(self.ids(self.buscar("reserva_busca_api_view", "inexistente")), [])
+
+        resultado = response.json()["resultados"][0]
+        self.assertEqual(resultado["comentario"], self.comentarios[3])
+        self.assertGreater(resultado["relevancia"], response.json()["resultados"][1]["relevancia"])
+
+    def test_busca_imoveis(self):
+        Imovel.objects.filter(pk=2).update(codigo="Apartamento Beira-Mar 202")
+        response = self.buscar("imovel_busca_api_view", "beira mar")
+        self.assertEqual(self.ids(response), [2])
+        self.assertEqual(response.json()["resultados"][0]["codigo"], "Apartamento Beira-Mar 202")
+
+    def test_paginacao(self):
+        primeira = self.buscar("imovel_busca_api_view", "Casa", limite=2).json()
+        self.assertEqual(len(primeira["resultados"]), 2)
+        self.assertEqual(primeira["pagina"], 1)
+        self.assertEqual(primeira["proxima_pagina"], 2)
+
+        vistos = [resultado["id"] for resultado in primeira["resultados"]]
+        pagina = primeira
+        while pagina["proxima_pagina"]:
+            pagina = self.buscar(
+                "imovel_busca_api_view", "Casa", limite=2, pagina=pagina["proxima_pagina"]).json()
+            vistos.extend(resultado["id"] for resultado in pagina["resultados"])
+        self.assertEqual(sorted(vistos), list(Imovel.objects.order_by("pk").values_list("pk", flat=True)))
+
+    def test_indice_sincronizado(self):
+        # Atualizações em lote e remoções também atualizam o índice (triggers)
+        Reserva.objects.filter(pk=1).update(comentario="Solicitou transfer do aeroporto")
+        self.assertEqual([pk for pk, _ in buscar(Reserva, "berço", 10)], [])
+        self.assertEqual([pk for pk, _ in buscar(Reserva, "aeroporto", 10)], [1])
+
+        Reserva.objects.filter(pk=3).delete()
+        self.assertEqual([pk for pk, _ in buscar(Reserva, "portaria", 10)], [2])
+
+        reserva = Reserva.objects.get(pk=2)
+        reserva.pk = None
+        reserva.codigo = uuid4()
+        reserva.comentario = "Animal de estimação"
+        reserva.save(force_insert=True)
+        self.assertEqual([pk for pk, _ in buscar(Reserva, "estimação", 10)], [reserva.pk])
+
+    def test_duas_consultas(self):
+        with self.assertNumQueries(2):
+            self.buscar("reserva_busca_api_view", "chave")
+
+    def test_termo_invalido(self):
+        for q in ("", "ab", "a b c", "!!!"):
+            with self.subTest(q=q):
+                response = self.buscar("reserva_busca_api_view", q)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("q", response.json())
+
+        response = self.buscar("reserva_busca_api_view", "chave", limite=0)
+        self.assertEqual(response.status_code, 400)
+
+    def test_reconstruir(self):
+        # Sem os triggers o índice fica desatualizado
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER reservas_reserva_busca_au")
+        Reserva.objects.filter(pk=1).update(comentario="Solicitou transfer do aeroporto")
+        self.assertEqual(buscar(Reserva, "aeroporto", 10), [])
+
+        saida = StringIO()
+        call_command("reconstruir_busca", modelo=["reserva"], stdout=saida)
+        self.assertIn("reserva", saida.getvalue())
+        self.assertEqual([pk for pk, _ in buscar(Reserva, "aeroporto", 10)], [1])
+
+        Reserva.objects.filter(pk=1).update(comentario="Chegada antecipada")
+        self.assertEqual([pk for pk, _ in buscar(Reserva, "antecipada", 10)], [1])
@@ -0,0 +1,102 @@
+import io
+import json
+import os
+import tempfile
+
+from datetime import datetime, timezone
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.serializers.base import DeserializationError
+from django.db import IntegrityError
+from django.test import TestCase, TransactionTestCase
+
+from apps.reservas import carga
+from apps.reservas.models import Anuncio, Imovel, Mudanca, Reserva
+
+
+def objetos_fixture() -> list:
+    with open(carga.localizar_fixture("test_db_backup.json"), encoding="utf-8") as arquivo:
+        return json.load(arquivo)
+
+
+def remover_dados():
+    # O banco de testes já contém as fixtures de `TESTES_FIXTURES`
+    for modelo in (Reserva, Anuncio, Imovel):
+        modelo.objects.all().delete()
+
+
+class CargaFixtureTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        remover_dados()
+
+    def test_equivalente_ao_loaddata(self):
+        mudancas = Mudanca.objects.count()
+        totais = carga.carregar_fixture("test_db_backup.json", tamanho_bloco=3)
+        carregados = {
+            modelo: list(modelo.objects.order_by('pk').values())
+            for modelo in (Imovel, Anuncio, Reserva)}
+
+        self.assertEqual(totais, {
+            'reservas.Imovel': Imovel.objects.count(),
+            'reservas.Anuncio': Anuncio.objects.count(),
+            'reservas.Reserva': Reserva.objects.count()})
+
+        # As datas de cadastro e atualização da fixture são preservadas
+        imovel = Imovel.objects.get(pk=1)
+        self.assertEqual(
+            imovel.data_atualizacao, datetime(2024, 3, 5, 2, 58, 30, 30000, tzinfo=timezone.utc))
+        self.assertEqual(Mudanca.objects.count(), mudancas)
+
+        remover_dados()
+        call_command("loaddata", "test_db_backup.json", verbosity=0)
+
+        for modelo, valores in carregados.items():
+            self.assertEqual(list(modelo.objects.order_by('pk').values()), valores)
+
+    def test_leitura_em_streaming(self):
+        objetos = objetos_fixture()
+        conteudo = json.dumps(objetos, indent=2)
+
+        # Leituras menores que um objeto forçam a concatenação do buffer
+        with mock.patch.object(carga, "TAMANHO_LEITURA", 7):
+            self.assertEqual(list(carga.ler_json(io.StringIO(conteudo))), objetos)
+
+        ndjson = '\n'.join(json.dumps(objeto) for objeto in objetos) + '\n\n'
+        self.assertEqual(list(carga.ler_ndjson(io.StringIO(ndjson))), objetos)
+
+        with self.assertRaises(DeserializationError):
+            list(carga.ler_json(io.StringIO(conteudo[:-20])))
+
+    def test_chave_estrangeira_invalida(self):
+        reserva = next(
+            objeto for objeto in objetos_fixture() if objeto["model"] == "reservas.reserva")
+        with self.assertRaises(IntegrityError):
+            carga.carregar_objetos([reserva])
+        self.assertFalse(Reserva.objects.exists())
+
+    def test_modelo_nao_suportado(self):
+        with self.assertRaises(DeserializationError):
+            carga.carregar_objetos([{"model": "reservas.mudanca", "pk": 1, "fields": {
+                "modelo": "imovel", "objeto_id": 1, "operacao": "criacao"}}])
+
+
+class SnapshotTestCase(TransactionTestCase):
+
+    def test_salvar_e_restaurar(self):
+        remover_dados()
+        with tempfile.TemporaryDirectory() as diretorio:
+            fixture = os.path.join(diretorio, "dados.ndjson")
+            with open(fixture, "w", encoding="utf-8") as arquivo:
+                arquivo.writelines(json.dumps(objeto) + "\n" for objeto in objetos_fixture())
+
+            snapshot = os.path.join(diretorio, "snapshot.sqlite3")
+            call_command("carregar_dados", fixture, snapshot=snapshot, stdout=io.StringIO())
+            reservas = Reserva.objects.count()
+            self.assertGreater(reservas, 0)
+
+            Reserva.objects.all().delete()
+            call_command("restaurar_snapshot", snapshot, stdout=io.StringIO())
+            self.assertEqual(Reserva.objects.count(), reservas)
@@ -0,0 +1,240 @@
+import asyncio
+import threading
+import time
+
+from unittest import mock
+
+from django.core.handlers.asgi import ASGIHandler
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.response import Response
+
+from apps.reservas.coalescencia import Coalescedor, chave_requisicao, coalescedor
+from apps.reservas.views import ReservaAPIView
+
+
+def aguardar(condicao, limite: float = 5):
+    fim = time.monotonic() + limite
+    while not condicao():
+        if time.monotonic() > fim:
+            raise AssertionError("Tempo esgotado aguardando as requisições")
+        time.sleep(0.005)
+
+
+class CoalescedorTestCase(SimpleTestCase):
+
+    def executar_simultaneas(self, coalescedor, funcao, quantidade: int = 5):
+        """Inicia a líder, aguarda as demais entrarem na espera e libera a líder"""
+        liberar = threading.Event()
+        resultados = []
+
+        def lider():
+            liberar.wait()
+            return funcao()
+
+        def requisicao(funcao):
+            try:
+                resultados.append(coalescedor.executar("chave", funcao, 5))
+            except Exception as erro:
+                resultados.append(erro)
+
+        threads = [threading.Thread(target=requisicao, args=(lider,))]
+        threads[0].start()
+        aguardar(lambda: coalescedor.em_andamento("chave") is not None)
+        for _ in range(quantidade - 1):
+            threads.append(threading.Thread(target=requisicao, args=(funcao,)))
+            threads[-1].start()
+        aguardar(lambda: coalescedor.em_andamento("chave") == quantidade - 1)
+
+        liberar.set()
+        for thread in threads:
+            thread.join()
+        self.assertIsNone(coalescedor.em_andamento("chave"))
+        return resultados
+
+    def test_uma_execucao(self):
+        execucoes = []
+
+        def funcao():
+            execucoes.append(1)
+            return object()
+
+        resultados = self.executar_simultaneas(Coalescedor(), funcao)
+        self.assertEqual(len(execucoes), 1)
+        self.assertEqual(len(resultados), 5)
+        self.assertEqual(len(set(map(id, resultados))), 1)
+
+    def test_erro_repassado(self):
+        def funcao():
+            raise ValueError("falhou")
+
+        resultados = self.executar_simultaneas(Coalescedor(), funcao)
+        self.assertEqual(len(resultados), 5)
+        self.assertTrue(all(isinstance(erro, ValueError) for erro in resultados))
+
+    def test_execucoes_sequenciais_nao_compartilham(self):
+        coalescedor = Coalescedor()
+        self.assertEqual(coalescedor.executar("chave", lambda: 1), 1)
+        self.assertEqual(coalescedor.executar("chave", lambda: 2), 2)
+
+    def test_espera_esgotada(self):
+        coalescedor = Coalescedor()
+        liberar = threading.Event()
+        lider = threading.Thread(
+            target=coalescedor.executar, args=("chave", lambda: liberar.wait(5)))
+        lider.start()
+        aguardar(lambda: coalescedor.em_andamento("chave") is not None)
+
+        self.assertEqual(coalescedor.executar("chave", lambda: "propria", espera=0.01), "propria")
+        liberar.set()
+        lider.join()
+
+
+class CoalescenciaViewTestCase(TestCase):
+    url = reverse("reserva_api_view")
+
+    def test_requisicoes_simultaneas(self):
+        """A líder executa no thread do teste (que possui a transação com os
+        dados), inicia as demais e só prossegue quando elas estão aguardando"""
+        chamadas = []
+        listar = ReservaAPIView.list
+
+        def list(view, *args, **kwargs):
+            chamadas.append(view)
+            for thread in seguidoras:
+                thread.start()
+            chave = chave_requisicao(view.request)
+            aguardar(lambda: coalescedor.em_andamento(chave) == 4)
+            return listar(view, *args, **kwargs)
+
+        respostas = []
+
+        def requisitar():
+            respostas.append(Client().get(self.url, headers={"Accept": "application/json"}))
+
+        with mock.patch.object(ReservaAPIView, "list", list):
+            seguidoras = [threading.Thread(target=requisitar) for _ in range(4)]
+            requisitar()
+            for thread in seguidoras:
+                thread.join()
+
+        self.assertEqual(len(chamadas), 1)
+        self.assertEqual(len(respostas), 5)
+        esperado = self.client.get(self.url, headers={"Accept": "application/json"})
+        for response in respostas:
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, esperado.content)
+            self.assertEqual(response["Content-Type"], "application/json")
+            self.assertIn("Accept", response["Vary"])
+
+    def test_sessoes_diferentes_nao_compartilham(self):
+        """Com cookies de sessão diferentes cada requisição executa a view e
+        recebe a sua própria resposta, mesmo durante a execução da outra"""
+        chamadas = []
+
+        def list(view, *args, **kwargs):
+            chamadas.append(view.request.COOKIES['sessionid'])
+            if len(chamadas) == 1:
+                # A segunda sessão é atendida enquanto a primeira executa
+                segunda.start()
+                segunda.join(5)
+                self.assertFalse(segunda.is_alive())
+            return Response({"sessao": view.request.COOKIES['sessionid']})
+
+        respostas = {}
+
+        def requisitar(sessao):
+            cliente = Client()
+            cliente.cookies['sessionid'] = sessao
+            respostas[sessao] = cliente.get(self.url, headers={"Accept": "application/json"})
+
+        with mock.patch.object(ReservaAPIView, "list", list), \
+                mock.patch.object(coalescedor, "executar", wraps=coalescedor.executar) as executar:
+            segunda = threading.Thread(target=requisitar, args=("sessao-b",))
+            requisitar("sessao-a")
+
+        self.assertEqual(chamadas, ["sessao-a", "sessao-b"])
+        for sessao, response in respostas.items():
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), {"sessao": sessao})
+        executar.assert_not_called()
+
+        # Requisições com Authorization também não são coalescidas
+        with mock.patch.object(coalescedor, "executar") as executar:
+            self.client.get(self.url, headers={"Accept": "application/json", "Authorization": "Basic eDp5"})
+        executar.assert_not_called()
+
+    def test_cabecalhos_na_chave(self):
+        cliente = Client()
+        json = cliente.get(self.url, headers={"Accept": "application/json"}).wsgi_request
+        colunar = cliente.get(
+            self.url, headers={"Accept": "application/vnd.colunar+json"}).wsgi_request
+        self.assertNotEqual(chave_requisicao(json), chave_requisicao(colunar))
+        pagina = cliente.get(self.url + "?ids=1", headers={"Accept": "application/json"})
+        self.assertNotEqual(chave_requisicao(pagina.wsgi_request), chave_requisicao(json))
+
+    def test_erros_compartilhados(self):
+        response = self.client.get(
+            reverse("reserva_api_view", kwargs={"pk": 99999}), headers={"Accept": "application/json"})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(self.url + "?ids=abc", headers={"Accept": "application/json"})
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(COALESCENCIA_REQUISICOES=False)
+    def test_desabilitada(self):
+        with mock.patch.object(coalescedor, "executar") as executar:
+            response = self.client.get(self.url, headers={"Accept": "application/json"})
+        self.assertEqual(response.status_code, 200)
+        executar.assert_not_called()
+
+
+class CoalescenciaASGITestCase(SimpleTestCase):
+    """No ASGI cada requisição executa a view síncrona em um thread próprio"""
+
+    async def requisitar(self, aplicacao, caminho: str) -> bytes:
+        escopo = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": caminho, "query_string": b"",
+            "headers": [(b"host", b"testserver"), (b"accept", b"application/json")],
+            "server": ("testserver", 80), "client": ("127.0.0.1", 50000),
+        }
+        recebido = False
+        desconectar = asyncio.Event()
+        mensagens = []
+
+        async def receive():
+            nonlocal recebido
+            if not recebido:
+                recebido = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await desconectar.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(mensagem):
+            mensagens.append(mensagem)
+
+        await aplicacao(escopo, receive, send)
+        desconectar.set()
+        self.assertEqual(mensagens[0]["status"], 200)
+        return b"".join(mensagem.get("body", b"") for mensagem in mensagens[1:])
+
+    def test_requisicoes_simultaneas(self):
+        chamadas = []
+
+        def list(view, *args, **kwargs):
+            chamadas.append(threading.get_ident())
+            chave = chave_requisicao(view.request)
+            aguardar(lambda: coalescedor.em_andamento(chave) == 4)
+            return Response({"chamada": len(chamadas)})
+
+        async def executar():
+            aplicacao = ASGIHandler()
+            return await asyncio.gather(*(
+                self.requisitar(aplicacao, reverse("reserva_api_view")) for _ in range(5)))
+
+        with mock.patch.object(ReservaAPIView, "list", list), \
+                override_settings(THROTTLE_TAXAS={}):
+            corpos = asyncio.run(executar())
+
+        self.assertEqual(len(chamadas), 1)
+        self.assertEqual(corpos, [b'{"chamada":1}'] * 5)
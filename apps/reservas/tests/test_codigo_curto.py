@@ -0,0 +1,120 @@
+from importlib import import_module
+from types import SimpleNamespace
+
+from django.apps import apps
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from apps.reservas import codigos
+from apps.reservas.models import Mudanca, Reserva
+
+from .test_api_reserva import CREATE_RESERVA_DATA
+
+
+class CodigosTestCase(SimpleTestCase):
+
+    def test_gerar_e_ler(self):
+        self.assertEqual(codigos.gerar(1), "KRVQKEBZS")
+        for numero in (1, 2, 1000, 123456789, 2 ** 40 - 1):
+            codigo = codigos.gerar(numero)
+            self.assertEqual(len(codigo), codigos.TAMANHO)
+            self.assertEqual(codigos.normalizar(codigo), codigo)
+            self.assertEqual(codigos.numero(codigo), numero)
+
+        for numero in (0, -1, 2 ** 40):
+            with self.assertRaises(ValueError):
+                codigos.gerar(numero)
+
+    def test_sem_colisoes(self):
+        gerados = {codigos.gerar(numero) for numero in range(1, 20001)}
+        self.assertEqual(len(gerados), 20000)
+
+    def test_normalizar(self):
+        self.assertEqual(codigos.formatar("KRVQKEBZS"), "KRVQ-KEBZ-S")
+        self.assertEqual(codigos.normalizar("krvq-kebz-s"), "KRVQKEBZS")
+        self.assertEqual(codigos.normalizar(" KRVQ KEBZ S "), "KRVQKEBZS")
+        self.assertEqual(codigos.normalizar(codigos.gerar(1000).replace("0", "O")), codigos.gerar(1000))
+        for invalido in ("", "KRVQKEBZ", "KRVQKEBZSS", "KRVQKEBZ!", "KRVQKEBZU"):
+            self.assertIsNone(codigos.normalizar(invalido), invalido)
+
+    def test_digito_verificador(self):
+        codigo = codigos.gerar(987654)
+        for posicao in range(codigos.TAMANHO):
+            for caractere in codigos.ALFABETO:
+                if caractere != codigo[posicao]:
+                    errado = codigo[:posicao] + caractere + codigo[posicao + 1:]
+                    self.assertIsNone(codigos.normalizar(errado), errado)
+
+
+class CodigoCurtoTestCase(TestCase):
+
+    def buscar(self, codigo):
+        return self.client.get(
+            reverse("reserva_codigo_api_view", kwargs={"codigo": codigo}),
+            headers={"Accept": "application/json"})
+
+    def test_fixtures_com_codigo(self):
+        for pk, codigo_curto in Reserva.objects.values_list("pk", "codigo_curto"):
+            self.assertEqual(codigo_curto, codigos.gerar(pk))
+
+    def test_criacao(self):
+        response = self.client.post(
+            reverse("reserva_api_view"), CREATE_RESERVA_DATA, content_type="application/json",
+            headers={"Accept": "application/json"})
+        self.assertEqual(response.status_code, 201)
+        reserva = response.json()
+        self.assertEqual(reserva["codigo_curto"], codigos.gerar(reserva["id"]))
+        self.assertEqual(
+            Reserva.objects.values_list("codigo_curto", flat=True).get(pk=reserva["id"]),
+            reserva["codigo_curto"])
+
+        # O log de mudanças já registra o código
+        mudanca = Mudanca.objects.filter(modelo="reserva", objeto_id=reserva["id"]).get()
+        self.assertEqual(mudanca.dados["codigo_curto"], reserva["codigo_curto"])
+
+        # O código não pode ser alterado pelo cliente
+        response = self.client.post(
+            reverse("reserva_api_view"),
+            {**CREATE_RESERVA_DATA, "data_checkin": "2100-01-01", "data_checkout": "2100-01-02",
+             "codigo_curto": "KRVQKEBZS"},
+            content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["codigo_curto"], codigos.gerar(response.json()["id"]))
+
+    def test_copia_recebe_novo_codigo(self):
+        reserva = Reserva.objects.get(pk=1)
+        reserva.pk = None
+        reserva.codigo = Reserva._meta.get_field("codigo").get_default()
+        reserva.save()
+        reserva.refresh_from_db()
+        self.assertEqual(reserva.codigo_curto, codigos.gerar(reserva.pk))
+
+    def test_busca_pelo_codigo(self):
+        reserva = Reserva.objects.get(pk=2)
+        for codigo in (reserva.codigo_curto, codigos.formatar(reserva.codigo_curto).lower(),
+                       str(reserva.codigo)):
+            with self.subTest(codigo=codigo):
+                response = self.buscar(codigo)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()["id"], 2)
+
+        # Código válido sem reserva
+        self.assertEqual(self.buscar(codigos.gerar(10 ** 9)).status_code, 404)
+
+    def test_digito_verificador_invalido_sem_consulta(self):
+        codigo = Reserva.objects.values_list("codigo_curto", flat=True).get(pk=2)
+        errado = codigo[:-1] + ("0" if codigo[-1] != "0" else "1")
+        with self.assertNumQueries(0):
+            response = self.buscar(errado)
+        self.assertEqual(response.status_code, 404)
+
+    def test_preenchimento_das_reservas_existentes(self):
+        migracao = import_module("apps.reservas.migrations.0006_reserva_codigo_curto")
+        Reserva.objects.update(codigo_curto=None)
+
+        # A função utiliza apenas a conexão do schema editor
+        migracao.preencher_codigos_curtos(apps, SimpleNamespace(connection=connection))
+
+        for pk, codigo_curto in Reserva.objects.values_list("pk", "codigo_curto"):
+            self.assertEqual(codigo_curto, codigos.gerar(pk))
@@ -0,0 +1,99 @@
+import gzip
+import json
+import unittest
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from apps.reservas import middleware
+from apps.reservas.middleware import CompressaoMiddleware, negociar_codificacao
+
+
+class CompressaoMiddlewareTestCase(SimpleTestCase):
+
+    def processar(self, response, aceitas='gzip'):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=aceitas)
+        return CompressaoMiddleware(lambda request: response)(request)
+
+    def test_negociacao(self):
+        self.assertEqual(negociar_codificacao('gzip, deflate'), 'gzip')
+        self.assertEqual(negociar_codificacao('GZIP;q=0.5'), 'gzip')
+        self.assertEqual(negociar_codificacao('*'), next(iter(middleware.COMPRESSORES)))
+        self.assertIsNone(negociar_codificacao('gzip;q=0'))
+        self.assertIsNone(negociar_codificacao('identity'))
+        self.assertIsNone(negociar_codificacao(''))
+
+    @unittest.skipUnless(middleware.brotli or middleware.zstandard,
+                         "brotli e zstandard não instalados")
+    def test_preferencia_pelos_pesos(self):
+        alternativa = 'zstd' if middleware.zstandard else 'br'
+        self.assertEqual(negociar_codificacao(f'gzip, {alternativa}'), alternativa)
+        self.assertEqual(negociar_codificacao(f'gzip, {alternativa};q=0.5'), 'gzip')
+
+    def test_tamanho_minimo(self):
+        conteudo = b'{"campo": "valor"}' * 100
+
+        with override_settings(COMPRESSAO_TAMANHO_MINIMO=len(conteudo) + 1):
+            response = self.processar(HttpResponse(conteudo, content_type='application/json'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        with override_settings(COMPRESSAO_TAMANHO_MINIMO=len(conteudo)):
+            response = self.processar(HttpResponse(conteudo, content_type='application/json'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(response.content), conteudo)
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+
+    def test_tipos_ignorados(self):
+        conteudo = b'\x00' * 4096
+        response = self.processar(HttpResponse(conteudo, content_type='image/png'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        response = self.processar(StreamingHttpResponse(
+            iter([b'data: 1\n\n']), content_type='text/event-stream'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streaming(self):
+        blocos = [b'%d,2024-01-01,100.00\n' % i for i in range(1000)]
+        response = self.processar(StreamingHttpResponse(iter(blocos), content_type='text/csv'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b''.join(blocos))
+
+    def test_etag_enfraquecida(self):
+        response = HttpResponse(b'a' * 4096, content_type='text/plain')
+        response['ETag'] = '"123"'
+        self.assertEqual(self.processar(response)['ETag'], 'W/"123"')
+
+
+class RespostaColunarTestCase(TestCase):
+
+    def test_listagem_colunar(self):
+        url = reverse("reserva_api_view")
+        padrao = self.client.get(url, headers={"Accept": "application/json"}).json()
+        response = self.client.get(url, headers={"Accept": "application/vnd.colunar+json"})
+
+        self.assertEqual(response["Content-Type"], "application/vnd.colunar+json")
+        colunar = response.json()
+        self.assertEqual(colunar["campos"], list(padrao[0]))
+        self.assertEqual(
+            [dict(zip(colunar["campos"], linha)) for linha in colunar["linhas"]], padrao)
+
+    def test_objeto_e_lote(self):
+        cabecalhos = {"Accept": "application/vnd.colunar+json"}
+        url = reverse("reserva_api_view", kwargs={"pk": 1})
+        self.assertEqual(
+            self.client.get(url, headers=cabecalhos).json(),
+            self.client.get(url, headers={"Accept": "application/json"}).json())
+
+        lote = self.client.get(reverse("reserva_api_view"), {"ids": "1,2,999"}, headers=cabecalhos).json()
+        self.assertEqual([linha[0] for linha in lote["resultados"]["linhas"]], [1, 2])
+        self.assertEqual(lote["nao_encontrados"], [999])
+
+    def test_listagem_comprimida(self):
+        response = self.client.get(
+            reverse("reserva_api_view"),
+            headers={"Accept": "application/json", "Accept-Encoding": "gzip"})
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIsInstance(json.loads(gzip.decompress(response.content)), list)
@@ -0,0 +1,123 @@
+import random
+
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from apps.reservas.disponibilidade import AgendaImovel, janelas_livres, motor
+from apps.reservas.models import Reserva
+from apps.reservas.serializers import ReservaSerializer
+
+
+def sobrepoe(intervalo, inicio, fim, inclusivo):
+    checkin, checkout, _ = intervalo
+    if inclusivo:
+        return checkout >= inicio and checkin <= fim
+    return checkout > inicio and checkin < fim
+
+
+class AgendaImovelTestCase(SimpleTestCase):
+
+    def test_conflitos_aleatorios(self):
+        """Compara a busca binária com a checagem de todos os intervalos,
+        incluindo intervalos sobrepostos"""
+        aleatorio = random.Random(42)
+        base = date(2030, 1, 1)
+        intervalos = []
+        for pk in range(200):
+            checkin = base + timedelta(days=aleatorio.randrange(600))
+            intervalos.append(
+                (checkin, checkin + timedelta(days=aleatorio.randint(0, 15)), pk))
+        intervalos.sort()
+        agenda = AgendaImovel(0, intervalos)
+
+        for _ in range(2000):
+            inicio = base + timedelta(days=aleatorio.randrange(-10, 620))
+            fim = inicio + timedelta(days=aleatorio.randint(0, 10))
+            ignorar = aleatorio.randrange(200)
+            for inclusivo in (True, False):
+                esperado = any(
+                    sobrepoe(i, inicio, fim, inclusivo)
+                    for i in intervalos if i[2] != ignorar)
+                conflito = agenda.conflito(inicio, fim, inclusivo=inclusivo, ignorar=ignorar)
+                self.assertEqual(conflito is not None, esperado, (inicio, fim, inclusivo))
+
+    def test_janelas_livres(self):
+        intervalos = [
+            (date(2030, 1, 3), date(2030, 1, 5)),
+            (date(2030, 1, 8), date(2030, 1, 20)),
+            (date(2030, 1, 10), date(2030, 1, 12)),
+        ]
+        janelas = janelas_livres(
+            intervalos, date(2030, 1, 1), date(2030, 2, 1), noites=2, limite=5)
+        # Não há espaço entre 06/01 e 07/01 para duas noites
+        self.assertEqual(janelas, [
+            {'data_checkin': date(2030, 1, 21), 'data_checkout': date(2030, 1, 23),
+             'checkout_maximo': date(2030, 2, 1)}])
+
+        janelas = janelas_livres(
+            intervalos, date(2030, 1, 1), date(2030, 2, 1), noites=1, limite=2)
+        self.assertEqual([j['data_checkin'] for j in janelas],
+                         [date(2030, 1, 1), date(2030, 1, 6)])
+
+        # Com o check-out disponível as datas de check-out podem ser reaproveitadas
+        janelas = janelas_livres(
+            intervalos, date(2030, 1, 1), date(2030, 2, 1), noites=3,
+            limite=2, inclusivo=False)
+        self.assertEqual([(j['data_checkin'], j['checkout_maximo']) for j in janelas],
+                         [(date(2030, 1, 5), date(2030, 1, 8)),
+                          (date(2030, 1, 20), date(2030, 2, 1))])
+
+        agenda = AgendaImovel(0, [(*i, pk) for pk, i in enumerate(intervalos)])
+        self.assertEqual(
+            agenda.janelas_livres(date(2030, 1, 13), date(2030, 2, 1), noites=2),
+            janelas_livres(intervalos, date(2030, 1, 13), date(2030, 2, 1), noites=2))
+
+
+@override_settings(DISPONIBILIDADE_MOTOR=True)
+class MotorDisponibilidadeTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        motor.limpar()
+
+    def criar_serializer(self, **dados):
+        return ReservaSerializer(data={
+            "data_checkin": "2030-05-08",
+            "data_checkout": "2030-05-10",
+            "preco_total": "100.00",
+            "qtd_hospedes": 1,
+            "anuncio": 5,
+            **dados})
+
+    def test_validacao_com_motor(self):
+        reserva = Reserva.objects.select_related('anuncio').first()
+        serializer = self.criar_serializer(
+            anuncio=reserva.anuncio_id,
+            data_checkin=str(reserva.data_checkin),
+            data_checkout=str(reserva.data_checkout))
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors['non_field_errors'][0].code, 'conflict')
+
+        # A própria reserva é desconsiderada na atualização
+        serializer = ReservaSerializer(instance=reserva, data={
+            **serializer.initial_data, "qtd_hospedes": 1})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+    def test_coerencia_apos_escrita(self):
+        serializer = self.criar_serializer()
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        imovel_id = serializer.validated_data['anuncio'].imovel_id
+        versao = motor.agenda(imovel_id).versao
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reserva = serializer.save()
+
+        self.assertNotEqual(motor.agenda(imovel_id).versao, versao)
+        serializer = self.criar_serializer()
+        self.assertFalse(serializer.is_valid())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reserva.delete()
+        self.assertTrue(self.criar_serializer().is_valid())
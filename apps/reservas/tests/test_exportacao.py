@@ -0,0 +1,74 @@
+import io
+import unittest
+
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+from apps.reservas import exportacao
+from apps.reservas.models import Reserva
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+@unittest.skipIf(pyarrow is None, "pyarrow não instalado")
+class ExportacaoTestCase(TestCase):
+
+    def test_tipos_e_valores(self):
+        destino = io.BytesIO()
+        self.assertEqual(exportacao.exportar(destino, tamanho_lote=3), Reserva.objects.count())
+
+        destino.seek(0)
+        tabela = pyarrow.parquet.read_table(destino)
+        self.assertEqual(tabela.schema.field('preco_total').type, pyarrow.decimal128(5, 2))
+        self.assertEqual(tabela.schema.field('data_checkin').type, pyarrow.date32())
+        self.assertEqual(tabela.schema.field('imovel_aceita_animais').type, pyarrow.bool_())
+
+        reserva = Reserva.objects.select_related('anuncio__imovel').order_by('id').first()
+        linha = tabela.slice(0, 1).to_pylist()[0]
+        self.assertEqual(linha['id'], reserva.pk)
+        self.assertEqual(linha['codigo'], str(reserva.codigo))
+        self.assertEqual(linha['data_checkin'], reserva.data_checkin)
+        self.assertEqual(linha['preco_total'], reserva.preco_total)
+        self.assertIsInstance(linha['preco_total'], Decimal)
+        self.assertEqual(linha['imovel_codigo'], reserva.anuncio.imovel.codigo)
+
+    def test_lotes_limitados(self):
+        lotes = list(exportacao.lotes_reservas(tamanho_lote=3))
+        self.assertTrue(all(lote.num_rows <= 3 for lote in lotes))
+        self.assertEqual(sum(lote.num_rows for lote in lotes), Reserva.objects.count())
+
+    def test_endpoint(self):
+        url = reverse("reserva_exportacao_api_view")
+
+        response = self.client.get(url)
+        self.assertEqual(response["Content-Type"], "application/vnd.apache.parquet")
+        conteudo = b''.join(response.streaming_content)
+        tabela = pyarrow.parquet.read_table(pyarrow.BufferReader(conteudo))
+        self.assertEqual(tabela.num_rows, Reserva.objects.count())
+
+        response = self.client.get(url, {"formato": "arrow"}, headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response["Content-Type"], "application/vnd.apache.arrow.file")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+    def test_formato_invalido(self):
+        response = self.client.get(
+            reverse("reserva_exportacao_api_view"), {"formato": "csv"},
+            headers={"Accept": "application/json"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("formato", response.json())
+
+
+class ExportacaoIndisponivelTestCase(TestCase):
+
+    def test_sem_pyarrow(self):
+        with mock.patch.object(exportacao, "pyarrow", None):
+            response = self.client.get(
+                reverse("reserva_exportacao_api_view"), headers={"Accept": "application/json"})
+        self.assertEqual(response.status_code, 501)
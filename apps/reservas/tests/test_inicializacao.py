@@ -0,0 +1,36 @@
+from django.test import SimpleTestCase
+
+from apps.reservas.management.commands.perfil_importacao import (
+    Importacao,
+    interpretar_importtime,
+    medir
+)
+
+
+class PerfilImportacaoTestCase(SimpleTestCase):
+
+    def test_interpretar_importtime(self):
+        saida = [
+            "import time: self [us] | cumulative | imported package",
+            "import time:       120 |        120 |     _json",
+            "import time:       800 |        920 |   json.decoder",
+            "import time:      1500 |       2420 | json",
+            "Traceback (most recent call last):",
+        ]
+        self.assertEqual(interpretar_importtime(saida), [
+            Importacao('_json', 120, 120, 2),
+            Importacao('json.decoder', 800, 920, 1),
+            Importacao('json', 1500, 2420, 0),
+        ])
+
+    def test_perfil_api(self):
+        medicao = medir('seazonecodechallenge.settings_api')
+        modulos = set(medicao.modulos)
+
+        self.assertIn('apps.reservas.middleware', modulos)
+        self.assertGreater(medicao.tempo_importacoes, 0)
+        self.assertGreater(medicao.rss, 0)
+        # Apps removidos e componentes do DRF carregados apenas na primeira requisição
+        for modulo in ('django.contrib.admin', 'django.contrib.sessions', 'django.contrib.auth',
+                       'rest_framework.serializers', 'pyarrow'):
+            self.assertNotIn(modulo, modulos)
@@ -0,0 +1,91 @@
+import io
+import tracemalloc
+
+from itertools import count
+from unittest import mock
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from apps.reservas.management.commands import teste_prolongado
+from apps.reservas.management.commands.teste_prolongado import crescimento_monotonico
+from apps.reservas.memoria import MemoriaMiddleware, rastreador
+
+
+class CrescimentoMonotonicoTestCase(SimpleTestCase):
+
+    def test_deteccao(self):
+        self.assertTrue(crescimento_monotonico([10, 12, 11, 13, 12, 15], janelas=3))
+        # Os picos entre as coletas de lixo não contam como crescimento
+        self.assertFalse(crescimento_monotonico([10, 30, 10, 40, 10, 50], janelas=3))
+        self.assertFalse(crescimento_monotonico([10, 11, 12, 13], janelas=2, tolerancia=0.5))
+        self.assertFalse(crescimento_monotonico([10, 11], janelas=3))
+
+
+class MemoriaMiddlewareTestCase(TestCase):
+
+    def tearDown(self):
+        # O tracemalloc deixaria os demais testes mais lentos
+        tracemalloc.stop()
+        rastreador.limpar()
+
+    def test_desabilitado(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            MemoriaMiddleware(lambda request: None)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    @override_settings(MEMORIA_TAXA_AMOSTRAGEM=1)
+    def test_relatorio_por_endpoint(self):
+        for _ in range(3):
+            self.client.get(reverse("reserva_api_view"), headers={"Accept": "application/json"})
+        self.client.get(reverse("imovel_api_view", kwargs={"pk": 1}), headers={"Accept": "application/json"})
+
+        relatorio = self.client.get(
+            reverse("diagnostico_memoria_api_view"), {"top": 5},
+            headers={"Accept": "application/json"}).json()
+
+        self.assertTrue(relatorio["ativo"])
+        self.assertGreater(relatorio["processo"]["rss"], 0)
+        reservas = relatorio["endpoints"]["GET reserva_api_view"]
+        self.assertEqual(reservas["requisicoes"], 3)
+        self.assertEqual(len(reservas["amostras"]), 3)
+        self.assertLessEqual(len(reservas["alocacoes"]), 5)
+        for alocacao in reservas["alocacoes"]:
+            self.assertRegex(alocacao["local"], r":\d+$")
+        self.assertEqual(relatorio["endpoints"]["GET imovel_api_view"]["requisicoes"], 1)
+
+        response = self.client.delete(reverse("diagnostico_memoria_api_view"))
+        self.assertEqual(response.status_code, 204)
+        # Apenas a própria requisição de limpeza é registrada em seguida
+        self.assertEqual(
+            list(rastreador.relatorio()["endpoints"]), ["DELETE diagnostico_memoria_api_view"])
+
+    def test_clientes_autorizados(self):
+        url = reverse("diagnostico_memoria_api_view")
+        response = self.client.get(url, headers={"Accept": "application/json"}, REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.get(url, {"top": "x"}, headers={"Accept": "application/json"})
+        self.assertEqual(response.status_code, 400)
+
+        relatorio = self.client.get(url, headers={"Accept": "application/json"}).json()
+        self.assertFalse(relatorio["ativo"])
+
+
+class TesteProlongadoTestCase(TestCase):
+
+    def executar(self, memoria):
+        with mock.patch.object(teste_prolongado, "rss_atual", memoria):
+            call_command(
+                "teste_prolongado", duracao=0.3, aquecimento=0, intervalo=0.05, janelas=3,
+                stdout=io.StringIO())
+
+    def test_memoria_estavel(self):
+        self.executar(lambda: 100 * 2 ** 20)
+
+    def test_crescimento_monotonico(self):
+        contador = count()
+        with self.assertRaisesMessage(CommandError, "Crescimento monotônico"):
+            self.executar(lambda: (100 + next(contador)) * 2 ** 20)
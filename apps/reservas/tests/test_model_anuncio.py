@@ -15,7 +15,6 @@ CREATE_ANUNCIO_DATA = {
 
 
 class AnuncioModelTestCase(TestCase):
-    fixtures = ["test_db_backup.json"]
 
 
     def test_model_creation(self):
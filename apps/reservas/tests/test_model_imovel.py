@@ -18,7 +18,6 @@ CREATE_IMOVEL_DATA = {
 
 
 class ImovelModelTestCase(TestCase):
-    fixtures = ["test_db_backup.json"]
 
 
     def test_model_creation(self):
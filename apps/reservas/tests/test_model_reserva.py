@@ -18,7 +18,6 @@ CREATE_RESERVA_DATA = {
 
 
 class ReservaModelTestCase(TestCase):
-    fixtures = ["test_db_backup.json"]
 
 
     def test_model_creation(self):
@@ -0,0 +1,119 @@
+import io
+import json
+import os
+import pstats
+import re
+import tempfile
+import time
+
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from apps.reservas import perfilamento
+from apps.reservas.perfilamento import Amostrador, assinar
+
+
+def ocupar(segundos: float):
+    fim = time.perf_counter() + segundos
+    while time.perf_counter() < fim:
+        pass
+
+
+class AmostradorTestCase(SimpleTestCase):
+
+    def test_pilhas_collapsed(self):
+        with Amostrador(0.001) as amostrador:
+            ocupar(0.05)
+
+        linhas = amostrador.collapsed().splitlines()
+        self.assertTrue(linhas)
+        for linha in linhas:
+            self.assertRegex(linha, r'^\S+ \d+$')
+        self.assertTrue(any(f'{__name__}.ocupar' in linha for linha in linhas))
+
+
+class PerfilamentoTestCase(TestCase):
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        self.diretorio = diretorio.name
+        configuracoes = override_settings(
+            PERFILAMENTO_CHAVE='chave-de-teste', PERFILAMENTO_DIRETORIO=self.diretorio)
+        configuracoes.enable()
+        self.addCleanup(configuracoes.disable)
+        self.url = reverse("reserva_api_view")
+
+    def get(self, token=None, **extra):
+        cabecalhos = {"Accept": "application/json"}
+        if token is not None:
+            cabecalhos["X-Perfil"] = token
+        return self.client.get(self.url, headers=cabecalhos, **extra)
+
+    def artefato(self, response, extensao):
+        return os.path.join(self.diretorio, f'{response["X-Perfil-Id"]}.{extensao}')
+
+    def test_cprofile(self):
+        response = self.get(assinar(self.url))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("sql;dur=", response["Server-Timing"])
+
+        estatisticas = pstats.Stats(self.artefato(response, "pstats"))
+        self.assertTrue(estatisticas.total_calls)
+
+        with open(self.artefato(response, "json"), encoding="utf-8") as arquivo:
+            perfil = json.load(arquivo)
+        self.assertEqual(perfil["modo"], "cprofile")
+        self.assertEqual(perfil["status"], 200)
+        self.assertTrue(any("reservas_reserva" in consulta["sql"] for consulta in perfil["consultas"]))
+
+    def test_amostragem_por_parametro(self):
+        response = self.client.get(
+            self.url, {"perfil": assinar(self.url, "amostragem")}, headers={"Accept": "application/json"})
+        self.assertEqual(response.status_code, 200)
+
+        with open(self.artefato(response, "collapsed"), encoding="utf-8") as arquivo:
+            for linha in arquivo:
+                self.assertRegex(linha, r'^\S+ \d+\n$')
+        self.assertTrue(os.path.exists(self.artefato(response, "json")))
+
+    def test_tokens_invalidos(self):
+        outro_caminho = assinar(reverse("imovel_api_view"))
+        with override_settings(PERFILAMENTO_CHAVE='outra-chave'):
+            outra_chave = assinar(self.url)
+
+        for token in ("", "cprofile", outro_caminho, outra_chave, assinar(self.url) + "x"):
+            with self.subTest(token=token):
+                response = self.get(token)
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.has_header("X-Perfil-Id"))
+        self.assertEqual(os.listdir(self.diretorio), [])
+
+    def test_token_expirado(self):
+        token = assinar(self.url)
+        with override_settings(PERFILAMENTO_VALIDADE=-1):
+            self.assertFalse(self.get(token).has_header("X-Perfil-Id"))
+
+    def test_clientes_autorizados(self):
+        token = assinar(self.url)
+        with override_settings(PERFILAMENTO_CLIENTES=["10.0.0.0/8"]):
+            self.assertFalse(self.get(token).has_header("X-Perfil-Id"))
+            self.assertTrue(self.get(token, REMOTE_ADDR="10.1.2.3").has_header("X-Perfil-Id"))
+
+    def test_desabilitado(self):
+        token = assinar(self.url)
+        with override_settings(PERFILAMENTO_CHAVE=None), \
+                mock.patch.object(perfilamento, "token_requisicao") as token_requisicao:
+            response = self.get(token)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("X-Perfil-Id"))
+        token_requisicao.assert_not_called()
+
+    def test_comando_assinar(self):
+        saida = io.StringIO()
+        call_command("assinar_perfil", self.url, modo="amostragem", stdout=saida)
+        self.assertTrue(re.match(r'^amostragem\|', saida.getvalue()))
+        self.assertTrue(self.get(saida.getvalue().strip()).has_header("X-Perfil-Id"))
@@ -0,0 +1,128 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from apps.reservas.disponibilidade import MotorDisponibilidade
+from apps.reservas.models import Anuncio, Reserva
+from apps.reservas.pre_reservas import remover_expiradas
+from apps.reservas.serializers import PreReservaSerializer, ReservaSerializer
+
+
+# Tabela que não pode ser lida por completo fora da listagem
+TABELA_AUDITADA = "reservas_reserva"
+
+
+def plano_consulta(sql: str) -> list:
+    """Executa o EXPLAIN da consulta e retorna as linhas do plano"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # Com poucos dados o PostgreSQL prefere varreduras sequenciais
+            # mesmo quando há um índice adequado. Desabilitá-las faz com que
+            # uma varredura só apareça quando nenhum índice atende a consulta.
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute(f"EXPLAIN {sql}")
+            return [linha[0] for linha in cursor.fetchall()]
+
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        return [linha[-1] for linha in cursor.fetchall()]
+
+
+def varredura_completa(linha: str, tabela: str) -> bool:
+    if connection.vendor == 'postgresql':
+        return f"Seq Scan on {tabela}" in linha
+    # "SCAN tabela USING COVERING INDEX" também percorre o índice inteiro
+    return linha.startswith(f"SCAN {tabela}")
+
+
+class PlanosConsultaTestCase(TestCase):
+    """Captura o SQL gerado pelas views e validadores e verifica, via EXPLAIN,
+    que nenhuma consulta percorre a tabela de reservas por completo."""
+
+    def capturar(self, funcao) -> list:
+        # Respostas em cache não executariam as consultas auditadas
+        cache.clear()
+        with CaptureQueriesContext(connection) as contexto:
+            funcao()
+        consultas = [
+            consulta['sql'] for consulta in contexto.captured_queries
+            if consulta['sql'].lstrip().upper().startswith('SELECT')]
+        self.assertTrue(consultas, "Nenhuma consulta foi capturada.")
+        return consultas
+
+    def assertSemVarreduraCompleta(self, funcao, tabela: str = TABELA_AUDITADA):
+        for sql in self.capturar(funcao):
+            plano = plano_consulta(sql)
+            for linha in plano:
+                if varredura_completa(linha, tabela):
+                    self.fail(
+                        f'Varredura completa de "{tabela}".\nSQL: {sql}\n'
+                        'Plano:\n' + '\n'.join(plano))
+
+    def assertIndiceUtilizado(self, funcao, indice: str):
+        planos = ['\n'.join(plano_consulta(sql)) for sql in self.capturar(funcao)]
+        self.assertTrue(
+            any(indice in plano for plano in planos),
+            f'O índice "{indice}" não foi utilizado.\n' + '\n\n'.join(planos))
+
+    def get(self, url, **params):
+        return lambda: self.client.get(url, params, headers={"Accept": "application/json"})
+
+    def test_validacao_de_conflitos(self):
+        def validar():
+            serializer = ReservaSerializer(data={
+                "data_checkin": "2024-03-04", "data_checkout": "2024-03-09",
+                "preco_total": "100.00", "qtd_hospedes": 2, "anuncio": 5})
+            serializer.is_valid()
+
+        self.assertSemVarreduraCompleta(validar)
+        self.assertIndiceUtilizado(validar, "reserva_anuncio_periodo_idx")
+
+    def test_pre_reservas(self):
+        def validar():
+            serializer = PreReservaSerializer(data={
+                "data_checkin": "2024-03-04", "data_checkout": "2024-03-09",
+                "preco_total": "100.00", "qtd_hospedes": 2, "anuncio": 5})
+            serializer.is_valid()
+
+        self.assertSemVarreduraCompleta(validar, tabela="reservas_prereserva")
+        self.assertIndiceUtilizado(validar, "pre_reserva_periodo_idx")
+        self.assertIndiceUtilizado(remover_expiradas, "pre_reserva_expiracao_idx")
+
+    def test_janelas_livres(self):
+        consulta = self.get(
+            reverse("imovel_janelas_api_view", kwargs={"pk": 1}),
+            noites=2, inicio="2024-03-01", fim="2024-06-01")
+        self.assertSemVarreduraCompleta(consulta)
+        self.assertIndiceUtilizado(consulta, "reserva_anuncio_periodo_idx")
+
+    def test_carga_do_motor(self):
+        self.assertSemVarreduraCompleta(lambda: MotorDisponibilidade().agenda(1))
+
+    def test_recuperacao(self):
+        self.assertSemVarreduraCompleta(
+            self.get(reverse("reserva_api_view", kwargs={"pk": 1})))
+        self.assertSemVarreduraCompleta(self.get(reverse("reserva_api_view"), ids="1,2,3"))
+
+    def test_recuperacao_pelo_codigo(self):
+        codigo = Reserva.objects.values_list("codigo_curto", flat=True).get(pk=1)
+        consulta = self.get(reverse("reserva_codigo_api_view", kwargs={"codigo": codigo}))
+        self.assertSemVarreduraCompleta(consulta)
+        self.assertIndiceUtilizado(consulta, "reserva_codigo_curto_unico")
+
+    def test_sincronizacao(self):
+        self.assertSemVarreduraCompleta(self.get(
+            reverse("reserva_api_view"), atualizado_desde="2024-03-06T00:00:00Z"))
+
+    def test_remocao_em_lote(self):
+        anuncio = Anuncio.objects.filter(reservas__isnull=False).first()
+        self.assertSemVarreduraCompleta(lambda: self.client.delete(
+            reverse("reserva_api_view"),
+            data={"filtro": {"anuncio": anuncio.pk}}, content_type="application/json"))
+
+    def test_deteccao_de_varredura(self):
+        # A listagem lê a tabela inteira por definição e serve para validar
+        # que a detecção funciona
+        with self.assertRaises(AssertionError):
+            self.assertSemVarreduraCompleta(self.get(reverse("reserva_api_view")))
@@ -0,0 +1,175 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.reservas.disponibilidade import motor
+from apps.reservas.models import Mudanca, PreReserva, Reserva
+from apps.reservas.pre_reservas import remover_expiradas
+from apps.reservas.serializers import PreReservaSerializer
+
+from .base import *
+
+
+PRE_RESERVA_DATA = {
+    "data_checkin": "2024-05-08",
+    "data_checkout": "2024-05-10",
+    "preco_total": "150.00",
+    "comentario": "Aguardando pagamento",
+    "qtd_hospedes": 2,
+    "anuncio": 5
+}
+
+
+@override_settings(THROTTLE_TAXAS={})
+class PreReservaApiTestCase(BaseApiTestCase):
+    url_name = "pre_reserva_api_view"
+    serializer_class = PreReservaSerializer
+
+    def enviar(self, url, dados=None, expected_status_code=201):
+        response = self.client.post(
+            url, data=json.dumps(dados or {}), content_type="application/json",
+            headers=self.headers)
+        self.assertEqual(response.status_code, expected_status_code, response.content)
+        return response.json()
+
+    def pre_reservar(self, **dados) -> dict:
+        return self.enviar(self.get_url(), {**PRE_RESERVA_DATA, **dados})
+
+    def url_codigo(self, codigo, confirmar: bool = False) -> str:
+        if confirmar:
+            return reverse("pre_reserva_confirmacao_api_view", kwargs={"codigo": codigo})
+        return reverse(self.url_name, kwargs={"codigo": codigo})
+
+    def expirar(self, codigo):
+        PreReserva.objects.filter(codigo=codigo).update(expira_em=timezone.now() - timedelta(seconds=1))
+
+    def test_criacao(self):
+        antes = timezone.now()
+        dados = self.pre_reservar()
+        self.assertIsNotNone(dados['codigo'])
+
+        expira_em = PreReserva.objects.get(codigo=dados['codigo']).expira_em
+        self.assertGreaterEqual(expira_em, antes + timedelta(seconds=600))
+        self.assertLessEqual(expira_em, timezone.now() + timedelta(seconds=600))
+
+        response = self.client.get(self.url_codigo(dados['codigo']), headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], dados['id'])
+
+        # A pré-reserva não é registrada no log de mudanças
+        self.assertFalse(Mudanca.objects.filter(modelo='prereserva').exists())
+
+    def test_validacao_como_reserva(self):
+        # Mesmas validações da reserva: conflito com a reserva 2 e capacidade
+        erros = self.enviar(self.get_url(), {
+            **PRE_RESERVA_DATA, "data_checkin": "2024-03-08", "data_checkout": "2024-03-09"},
+            expected_status_code=400)
+        self.assertIn('non_field_errors', erros)
+        erros = self.enviar(self.get_url(), {**PRE_RESERVA_DATA, "qtd_hospedes": 50},
+                            expected_status_code=400)
+        self.assertIn('qtd_hospedes', erros)
+        erros = self.enviar(self.get_url(), {**PRE_RESERVA_DATA, "anuncio": 999},
+                            expected_status_code=400)
+        self.assertIn('anuncio', erros)
+
+    def test_periodo_ocupado(self):
+        self.pre_reservar()
+
+        # Reservas e pré-reservas em outros anúncios do mesmo imóvel
+        response = self.client.post(
+            reverse("reserva_api_view"),
+            data=json.dumps({**PRE_RESERVA_DATA, "anuncio": 4, "data_checkin": "2024-05-09"}),
+            content_type="application/json", headers=self.headers)
+        self.assertEqual(response.status_code, 400, response.content)
+        self.enviar(self.get_url(), {**PRE_RESERVA_DATA, "anuncio": 6}, expected_status_code=400)
+
+        # Outros imóveis não são afetados
+        self.pre_reservar(anuncio=1)
+
+    @override_settings(DISPONIBILIDADE_MOTOR=True)
+    def test_periodo_ocupado_com_motor(self):
+        self.pre_reservar()
+        response = self.client.post(
+            reverse("reserva_api_view"), data=json.dumps(PRE_RESERVA_DATA),
+            content_type="application/json", headers=self.headers)
+        self.assertEqual(response.status_code, 400, response.content)
+
+    def test_expirada_libera_o_periodo(self):
+        dados = self.pre_reservar()
+        self.expirar(dados['codigo'])
+        self.pre_reservar()
+
+        erros = self.enviar(self.url_codigo(dados['codigo'], confirmar=True), expected_status_code=410)
+        self.assertEqual(erros['detail'], "A pré-reserva expirou. Crie uma nova pré-reserva para o período.")
+
+    def test_confirmacao(self):
+        dados = self.pre_reservar()
+        reserva = self.enviar(self.url_codigo(dados['codigo'], confirmar=True))
+
+        self.assertFalse(PreReserva.objects.filter(pk=dados['id']).exists())
+        instancia = Reserva.objects.get(pk=reserva['id'])
+        for campo in ('data_checkin', 'data_checkout', 'preco_total', 'comentario', 'qtd_hospedes', 'anuncio'):
+            self.assertEqual(reserva[campo], dados[campo])
+        self.assertIsNotNone(instancia.codigo_curto)
+        self.assertTrue(Mudanca.objects.filter(
+            modelo='reserva', objeto_id=instancia.pk, operacao='criacao').exists())
+
+        # Já confirmada
+        self.enviar(self.url_codigo(dados['codigo'], confirmar=True), expected_status_code=404)
+
+    def test_confirmacao_atomica(self):
+        dados = self.pre_reservar()
+        # Uma reserva gravada sem validação ocupa o período: a confirmação
+        # falha e a pré-reserva é mantida
+        Reserva.objects.create(
+            anuncio_id=4, data_checkin=date(2024, 5, 9), data_checkout=date(2024, 5, 12),
+            preco_total=Decimal("100.00"), qtd_hospedes=2)
+        self.enviar(self.url_codigo(dados['codigo'], confirmar=True), expected_status_code=400)
+        self.assertTrue(PreReserva.objects.filter(pk=dados['id']).exists())
+
+    @override_settings(DISPONIBILIDADE_MOTOR=True)
+    def test_confirmacao_valida_no_banco_com_motor(self):
+        cache.clear()
+        motor.limpar()
+        dados = self.pre_reservar()
+        # A agenda do motor, carregada antes da reserva concorrente, não a
+        # contém: com o imóvel bloqueado a confirmação é validada no banco
+        motor.agenda(2)
+        Reserva.objects.create(
+            anuncio_id=4, data_checkin=date(2024, 5, 9), data_checkout=date(2024, 5, 12),
+            preco_total=Decimal("100.00"), qtd_hospedes=2)
+        self.enviar(self.url_codigo(dados['codigo'], confirmar=True), expected_status_code=400)
+        self.assertTrue(PreReserva.objects.filter(pk=dados['id']).exists())
+
+    def test_cancelamento(self):
+        dados = self.pre_reservar()
+        response = self.client.delete(self.url_codigo(dados['codigo']), headers=self.headers)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(PreReserva.objects.exists())
+        self.pre_reservar()
+
+        response = self.client.get(self.url_codigo("00000000-0000-0000-0000-000000000000"),
+                                   headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(self.url_codigo("abc-123"), headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+
+    def test_remocao_das_expiradas(self):
+        validas = [self.pre_reservar(anuncio=anuncio)['id'] for anuncio in (1, 7)]
+        expiradas = [
+            self.pre_reservar(data_checkin=f"2024-06-{dia:02d}", data_checkout=f"2024-06-{dia:02d}")['id']
+            for dia in range(1, 20, 4)]
+        PreReserva.objects.filter(pk__in=expiradas).update(expira_em=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(remover_expiradas(tamanho_bloco=2), 5)
+        self.assertEqual(sorted(PreReserva.objects.values_list('pk', flat=True)), validas)
+
+        saida = StringIO()
+        call_command("remover_pre_reservas_expiradas", stdout=saida)
+        self.assertIn("0 pré-reservas expiradas removidas", saida.getvalue())
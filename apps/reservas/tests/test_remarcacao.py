@@ -0,0 +1,106 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.reservas.models import Mudanca, PreReserva, Reserva
+from apps.reservas.serializers import ReservaSerializer
+from apps.reservas.validators import ReservaDisponivelValidator
+
+from .base import *
+
+
+@override_settings(THROTTLE_TAXAS={})
+class RemarcacaoApiTestCase(BaseApiTestCase):
+    url_name = "reserva_remarcacao_api_view"
+    serializer_class = ReservaSerializer
+
+    def remarcar(self, pk, data_checkin, data_checkout, expected_status_code=200):
+        response = self.client.post(
+            reverse(self.url_name, kwargs={"pk": pk}),
+            data=json.dumps({"data_checkin": data_checkin, "data_checkout": data_checkout}),
+            content_type="application/json", headers=self.headers)
+        self.assertEqual(response.status_code, expected_status_code, response.content)
+        return response.json()
+
+    def test_remarcacao(self):
+        reserva = Reserva.objects.get(pk=8)
+        dados = self.remarcar(8, "2024-05-16", "2024-05-25")
+
+        self.assertEqual((dados['data_checkin'], dados['data_checkout']), ("2024-05-16", "2024-05-25"))
+        remarcada = Reserva.objects.get(pk=8)
+        self.assertEqual((remarcada.data_checkin, remarcada.data_checkout), (date(2024, 5, 16), date(2024, 5, 25)))
+        self.assertEqual(remarcada.codigo, reserva.codigo)
+        self.assertEqual(remarcada.codigo_curto, reserva.codigo_curto)
+        self.assertEqual(remarcada.preco_total, reserva.preco_total)
+
+        mudanca = Mudanca.objects.filter(modelo='reserva', objeto_id=8).latest('id')
+        self.assertEqual(mudanca.operacao, 'atualizacao')
+        self.assertEqual(mudanca.dados['data_checkout'], "2024-05-25")
+
+    def test_conflito(self):
+        # A reserva 4 ocupa 2024-03-08 a 2024-03-09 no mesmo imóvel
+        erros = self.remarcar(5, "2024-03-09", "2024-03-15", expected_status_code=400)
+        self.assertIn('non_field_errors', erros)
+        reserva = Reserva.objects.get(pk=5)
+        self.assertEqual((reserva.data_checkin, reserva.data_checkout), (date(2024, 3, 10), date(2024, 3, 15)))
+
+        # Sobrepor o próprio período não é um conflito
+        self.remarcar(5, "2024-03-11", "2024-03-16")
+
+    def test_pre_reserva_ocupa_o_periodo(self):
+        PreReserva.objects.create(
+            anuncio_id=2, data_checkin=date(2024, 5, 22), data_checkout=date(2024, 5, 24),
+            preco_total=Decimal("100.00"), qtd_hospedes=2,
+            expira_em=timezone.now() + timedelta(minutes=10))
+        self.remarcar(8, "2024-05-14", "2024-05-25", expected_status_code=400)
+
+        PreReserva.objects.update(expira_em=timezone.now() - timedelta(seconds=1))
+        self.remarcar(8, "2024-05-14", "2024-05-25")
+
+    def test_encurtar_nao_consulta_conflitos(self):
+        # Uma reserva gravada sem validação sobrepõe a reserva 8: os dias que
+        # continuam na estadia não são checados novamente
+        Reserva.objects.create(
+            anuncio_id=3, data_checkin=date(2024, 5, 14), data_checkout=date(2024, 5, 16),
+            preco_total=Decimal("100.00"), qtd_hospedes=2)
+        self.remarcar(8, "2024-05-17", "2024-05-19")
+        self.remarcar(8, "2024-05-16", "2024-05-19", expected_status_code=400)
+
+    def test_datas_invalidas(self):
+        erros = self.remarcar(8, "2024-05-20", "2024-05-19", expected_status_code=400)
+        self.assertIn('data_checkin', erros)
+        erros = self.remarcar(8, "2024-05-20", None, expected_status_code=400)
+        self.assertIn('data_checkout', erros)
+        self.remarcar(999, "2024-05-20", "2024-05-21", expected_status_code=404)
+
+    def test_metodos(self):
+        url = reverse(self.url_name, kwargs={"pk": 8})
+        self.assertEqual(self.client.get(url, headers=self.headers).status_code, 405)
+        self.assertEqual(self.client.delete(url, headers=self.headers).status_code, 405)
+        self.assertTrue(Reserva.objects.filter(pk=8).exists())
+
+
+class TrechosAdicionadosTestCase(SimpleTestCase):
+
+    def test_inclusivo(self):
+        trechos = ReservaDisponivelValidator().trechos_adicionados
+        dia = lambda d: date(2024, 5, d)
+
+        self.assertEqual(trechos((dia(10), dia(15)), (dia(11), dia(14))), [])
+        self.assertEqual(trechos((dia(10), dia(15)), (dia(8), dia(17))),
+                         [(dia(8), dia(9)), (dia(16), dia(17))])
+        self.assertEqual(trechos((dia(10), dia(15)), (dia(12), dia(18))), [(dia(16), dia(18))])
+        self.assertEqual(trechos((dia(10), dia(15)), (dia(20), dia(22))), [(dia(20), dia(22))])
+        self.assertEqual(trechos((dia(10), dia(15)), (dia(1), dia(3))), [(dia(1), dia(3))])
+
+    def test_checkout_disponivel(self):
+        trechos = ReservaDisponivelValidator(data_checkout_disponivel=True).trechos_adicionados
+        dia = lambda d: date(2024, 5, d)
+
+        self.assertEqual(trechos((dia(10), dia(15)), (dia(10), dia(15))), [])
+        self.assertEqual(trechos((dia(10), dia(15)), (dia(8), dia(17))),
+                         [(dia(8), dia(10)), (dia(15), dia(17))])
+        self.assertEqual(trechos((dia(10), dia(15)), (dia(15), dia(18))), [(dia(15), dia(18))])
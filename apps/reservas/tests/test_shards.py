@@ -0,0 +1,290 @@
+import threading
+
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from apps.reservas import shards
+from apps.reservas.models import Anuncio, Imovel, LocalizacaoImovel, PreReserva, Reserva
+from apps.reservas.serializers import ReservaSerializer
+
+from .base import *
+from .test_api_imovel import CREATE_IMOVEL_DATA
+from .test_api_reserva import CREATE_RESERVA_DATA
+
+
+SHARDS = ['default', 'shard_1', 'shard_2']
+
+
+@override_settings(SHARDS=SHARDS, MUDANCAS_FEED=False, THROTTLE_TAXAS={})
+class ShardsApiTestCase(BaseApiTestCase):
+    databases = set(SHARDS)
+    url_name = "reserva_api_view"
+    serializer_class = ReservaSerializer
+
+    def setUp(self):
+        cache.clear()
+        # Os imóveis das fixtures estão no primeiro shard
+        shards.registrar_imoveis()
+
+    def mover(self, imovel_id: int, destino: str) -> dict:
+        return shards.mover_imovel(imovel_id, destino, espera=0)
+
+    def criar(self, url_name: str, dados: dict) -> dict:
+        response = self.client.post(
+            reverse(url_name), data=json.dumps(dados), content_type="application/json",
+            headers=self.headers)
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+    def ids(self, response) -> list:
+        self.assertEqual(response.status_code, 200, response.content)
+        dados = response.json()
+        return [obj['id'] for obj in (dados['resultados'] if isinstance(dados, dict) else dados)]
+
+    def test_novos_imoveis_distribuidos(self):
+        criados = []
+        for indice in range(len(SHARDS)):
+            criados.append(self.criar(
+                "imovel_api_view", {**CREATE_IMOVEL_DATA, "codigo": f"Casa Shard {indice}"})['id'])
+
+        localizacoes = dict(LocalizacaoImovel.objects.filter(pk__in=criados).values_list('pk', 'shard'))
+        self.assertEqual(sorted(localizacoes.values()), SHARDS)
+        for imovel_id, alias in localizacoes.items():
+            self.assertIn(imovel_id, shards.faixa(alias))
+            self.assertTrue(Imovel.objects.using(alias).filter(pk=imovel_id).exists())
+
+        # Os anúncios e as reservas ficam no shard do imóvel
+        imovel_id = next(pk for pk, alias in localizacoes.items() if alias == 'shard_2')
+        anuncio = self.criar(
+            "anuncio_api_view", {"plataforma": "AirBnb", "taxa_plataforma": "10.00", "imovel": imovel_id})
+        reserva = self.check_api_view_create({**CREATE_RESERVA_DATA, "anuncio": anuncio['id']}).json()
+        self.assertTrue(Anuncio.objects.using('shard_2').filter(pk=anuncio['id']).exists())
+        self.assertTrue(Reserva.objects.using('shard_2').filter(pk=reserva['id']).exists())
+        self.assertFalse(Reserva.objects.filter(pk=reserva['id']).exists())
+
+    def test_mover_imovel(self):
+        movidos = self.mover(2, 'shard_1')
+        self.assertEqual(movidos, {'imovel': 1, 'anuncio': 3, 'reserva': 2, 'prereserva': 0})
+        self.assertEqual(LocalizacaoImovel.objects.get(pk=2).shard, 'shard_1')
+        self.assertEqual(
+            list(Reserva.objects.using('shard_1').order_by('pk').values_list('pk', flat=True)), [2, 6])
+        self.assertFalse(Reserva.objects.filter(pk__in=[2, 6]).exists())
+        self.assertFalse(Imovel.objects.filter(pk=2).exists())
+
+        # Os objetos movidos continuam acessíveis pelo id
+        response = self.client.get(self.get_url(pk=2), headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['anuncio'], 5)
+
+        url = reverse("anuncio_api_view", kwargs={"pk": 5})
+        response = self.client.patch(
+            url, data=json.dumps({"plataforma": "Vrbo"}),
+            content_type="application/json", headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(Anuncio.objects.using('shard_1').get(pk=5).plataforma, "Vrbo")
+
+        # Um anúncio não pode passar para um imóvel de outro shard
+        response = self.client.patch(
+            url, data=json.dumps({"imovel": 1}),
+            content_type="application/json", headers=self.headers)
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertIn("imovel", response.json())
+
+        codigo = Reserva.objects.using('shard_1').get(pk=2).codigo_curto
+        response = self.client.get(
+            reverse("reserva_codigo_api_view", kwargs={"codigo": codigo}), headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['id'], 2)
+
+        # A disponibilidade é validada no shard do imóvel
+        response = self.client.post(
+            self.get_url(), data=json.dumps({
+                **CREATE_RESERVA_DATA, "data_checkin": "2024-03-08", "data_checkout": "2024-03-09"}),
+            content_type="application/json", headers=self.headers)
+        self.assertEqual(response.status_code, 400, response.content)
+
+        reserva = self.check_api_view_create(CREATE_RESERVA_DATA).json()
+        self.assertIn(reserva['id'], shards.faixa('shard_1'))
+
+    def test_pre_reserva(self):
+        self.mover(2, 'shard_1')
+        pre_reserva = self.criar("pre_reserva_api_view", CREATE_RESERVA_DATA)
+        self.assertIn(pre_reserva['id'], shards.faixa('shard_1'))
+        self.assertTrue(PreReserva.objects.using('shard_1').filter(pk=pre_reserva['id']).exists())
+
+        response = self.client.post(
+            reverse("pre_reserva_confirmacao_api_view", kwargs={"codigo": pre_reserva['codigo']}),
+            headers=self.headers)
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertTrue(Reserva.objects.using('shard_1').filter(pk=response.json()['id']).exists())
+        self.assertFalse(PreReserva.objects.using('shard_1').exists())
+
+    def test_escritas_recusadas_durante_a_movimentacao(self):
+        LocalizacaoImovel.objects.filter(pk=2).update(em_migracao=True)
+        cache.clear()
+
+        response = self.client.post(
+            self.get_url(), data=json.dumps(CREATE_RESERVA_DATA),
+            content_type="application/json", headers=self.headers)
+        self.assertEqual(response.status_code, 503, response.content)
+        self.assertEqual(response["Retry-After"], str(shards.ESPERA_MIGRACAO))
+
+        # As leituras continuam permitidas
+        response = self.client.get(self.get_url(pk=2), headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+
+        # Uma movimentação interrompida é liberada pelo próximo registro
+        shards.registrar_imoveis()
+        self.check_api_view_create(CREATE_RESERVA_DATA)
+
+    def test_listagem_intercalada(self):
+        self.mover(2, 'shard_1')
+        self.mover(3, 'shard_2')
+
+        self.assertEqual(self.ids(self.client.get(self.get_url(), headers=self.headers)),
+                         list(range(1, 9)))
+
+        vistos = []
+        parametros = {"limite": 3}
+        while True:
+            pagina = self.ids(self.client.get(self.get_url(), parametros, headers=self.headers))
+            if not pagina:
+                break
+            self.assertLessEqual(len(pagina), 3)
+            vistos.extend(pagina)
+            parametros["apos"] = pagina[-1]
+        self.assertEqual(vistos, list(range(1, 9)))
+
+        response = self.client.get(self.get_url(), {"limite": 0}, headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_lotes(self):
+        self.mover(2, 'shard_1')
+        self.mover(3, 'shard_2')
+
+        response = self.client.get(self.get_url(), {"ids": "7,1,2,999"}, headers=self.headers)
+        self.assertEqual(self.ids(response), [7, 1, 2])
+        self.assertEqual(response.json()['nao_encontrados'], [999])
+
+        response = self.client.patch(
+            reverse("anuncio_api_view"),
+            data=json.dumps({"ids": [1, 4, 7], "valores": {"plataforma": "Booking"}}),
+            content_type="application/json", headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([r['id'] for r in response.json()['resultados']], [1, 4, 7])
+        self.assertEqual(Anuncio.objects.using('shard_1').get(pk=4).plataforma, "Booking")
+        self.assertEqual(Anuncio.objects.using('shard_2').get(pk=7).plataforma, "Booking")
+
+        # Anúncios de outros shards não podem passar para o imóvel: nada é
+        # gravado, nem no shard do imóvel
+        response = self.client.patch(
+            reverse("anuncio_api_view"),
+            data=json.dumps({"ids": [1, 2, 3, 4, 5, 6], "valores": {"imovel": 1}}),
+            content_type="application/json", headers=self.headers)
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertIn("imovel", response.json())
+        self.assertEqual(Anuncio.objects.using('shard_1').get(pk=4).imovel_id, 2)
+
+        response = self.client.patch(
+            reverse("anuncio_api_view"),
+            data=json.dumps({"ids": [1, 4], "valores": {"imovel": 3}}),
+            content_type="application/json", headers=self.headers)
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(Anuncio.objects.get(pk=1).imovel_id, 1)
+        self.assertEqual(Anuncio.objects.using('shard_1').get(pk=4).imovel_id, 2)
+
+        response = self.client.patch(
+            reverse("anuncio_api_view"),
+            data=json.dumps({"ids": [4, 5], "valores": {"imovel": 2}}),
+            content_type="application/json", headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.content)
+
+        response = self.client.delete(
+            reverse("reserva_api_view"), data=json.dumps({"ids": [1, 6, 7]}),
+            content_type="application/json", headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['removidos'], {'reservas.Reserva': 3})
+        for alias in SHARDS:
+            self.assertFalse(Reserva.objects.using(alias).filter(pk__in=[1, 6, 7]).exists())
+
+    def test_busca(self):
+        self.mover(3, 'shard_2')
+        Reserva.objects.filter(pk=2).update(comentario="Chave na portaria")
+        Reserva.objects.using('shard_2').filter(pk=3).update(comentario="Chave extra, chave na portaria")
+
+        response = self.client.get(
+            reverse("reserva_busca_api_view"), {"q": "chave"}, headers=self.headers)
+        # As relevâncias são calculadas por shard, então só o conjunto é verificado
+        self.assertEqual(sorted(self.ids(response)), [2, 3])
+
+        response = self.client.get(
+            reverse("imovel_busca_api_view"), {"q": "Casa", "limite": 2, "pagina": 3},
+            headers=self.headers)
+        self.assertEqual(len(self.ids(response)), 1)
+        self.assertIsNone(response.json()['proxima_pagina'])
+
+    def test_rebalancear(self):
+        saida = StringIO()
+        call_command("rebalancear_shards", simular=True, stdout=saida)
+        self.assertIn("simulação", saida.getvalue())
+        self.assertEqual(set(LocalizacaoImovel.objects.values_list('shard', flat=True)), {'default'})
+
+        call_command("rebalancear_shards", espera=0, stdout=StringIO())
+        cargas = {alias: sum(pesos.values()) for alias, pesos in shards.pesos_imoveis().items()}
+        self.assertEqual(sum(cargas.values()), 13)
+        self.assertLessEqual(max(cargas.values()) - min(cargas.values()), 2)
+
+        # Nenhum objeto foi perdido ou duplicado
+        for model, total in ((Imovel, 5), (Anuncio, 9), (Reserva, 8)):
+            self.assertEqual(sum(model.objects.using(alias).count() for alias in SHARDS), total)
+
+        call_command("rebalancear_shards", imovel=1, destino="shard_2", espera=0, stdout=StringIO())
+        self.assertTrue(Reserva.objects.using('shard_2').filter(pk=8).exists())
+
+
+@override_settings(SHARDS=SHARDS, SHARDS_PARALELO=True)
+class ShardsTestCase(SimpleTestCase):
+
+    def test_feed_recusado_com_shards(self):
+        with override_settings(MUDANCAS_FEED=True):
+            with self.assertRaises(ImproperlyConfigured):
+                shards.verificar_configuracao()
+        with override_settings(MUDANCAS_FEED=False):
+            shards.verificar_configuracao()
+        with override_settings(SHARDS=['default'], MUDANCAS_FEED=True):
+            shards.verificar_configuracao()
+
+    def test_planejar(self):
+        pesos = {'default': {1: 5, 2: 3, 3: 3, 5: 1, 6: 1}, 'shard_1': {}, 'shard_2': {}}
+        movimentos = shards.planejar(pesos, tolerancia=0)
+        cargas = {alias: sum(imoveis.values()) for alias, imoveis in pesos.items()}
+        for imovel_id, origem, destino in movimentos:
+            cargas[origem] -= pesos[origem][imovel_id]
+            cargas[destino] += pesos[origem][imovel_id]
+        self.assertEqual(sorted(cargas.values()), [4, 4, 5])
+
+        self.assertEqual(len(shards.planejar(pesos, maximo=1)), 1)
+        self.assertEqual(shards.planejar({'default': {1: 1}, 'shard_1': {2: 1}}), [])
+
+    def test_faixas(self):
+        self.assertEqual(shards.faixa('default').start, 0)
+        self.assertEqual(shards.shard_de_origem(5), 'default')
+        self.assertEqual(shards.shard_de_origem(shards.faixa('shard_2').start + 1), 'shard_2')
+
+    def test_em_todos_em_paralelo(self):
+        barreira = threading.Barrier(len(SHARDS), timeout=5)
+
+        def executar(alias):
+            # Só termina se as três chamadas estiverem em execução ao mesmo tempo
+            barreira.wait()
+            return alias.upper()
+
+        self.assertEqual(shards.em_todos(executar), ['DEFAULT', 'SHARD_1', 'SHARD_2'])
+
+    def test_intercalar(self):
+        self.assertEqual(shards.intercalar([[1, 4, 9], [2, 3], [5]], chave=int, limite=4), [1, 2, 3, 4])
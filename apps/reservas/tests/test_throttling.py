@@ -0,0 +1,130 @@
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.request import Request
+
+from apps.reservas.throttling import (
+    BaldeTokens,
+    BaldeTokensCache,
+    BaldeTokensThrottle,
+    interpretar_taxa
+)
+from apps.reservas.views import ReservaAPIView
+
+
+class Relogio:
+
+    def __init__(self):
+        self.agora = 1000.0
+
+    def __call__(self):
+        return self.agora
+
+
+class BaldeTokensTestCase(SimpleTestCase):
+
+    def test_interpretar_taxa(self):
+        self.assertEqual(interpretar_taxa('120/min'), (120, 2))
+        self.assertEqual(interpretar_taxa('10/s'), (10, 10))
+        self.assertEqual(interpretar_taxa('24/hour'), (24, 24 / 3600))
+
+    def test_rajada_e_reposicao(self):
+        relogio = Relogio()
+        baldes = BaldeTokens(3, 1, relogio=relogio)
+
+        for _ in range(3):
+            self.assertEqual(baldes.consumir('cliente'), 0)
+        self.assertAlmostEqual(baldes.consumir('cliente'), 1)
+
+        # Outro cliente possui o próprio balde
+        self.assertEqual(baldes.consumir('outro'), 0)
+
+        relogio.agora += 0.5
+        self.assertAlmostEqual(baldes.consumir('cliente'), 0.5)
+        relogio.agora += 0.5
+        self.assertEqual(baldes.consumir('cliente'), 0)
+
+        # A reposição não ultrapassa a capacidade
+        relogio.agora += 100
+        for _ in range(3):
+            self.assertEqual(baldes.consumir('cliente'), 0)
+        self.assertGreater(baldes.consumir('cliente'), 0)
+
+    def test_descarte_de_baldes(self):
+        relogio = Relogio()
+        baldes = BaldeTokens(2, 1, max_baldes=4, relogio=relogio)
+        for i in range(4):
+            baldes.consumir(f'cliente-{i}')
+        baldes.consumir('cliente-0')
+
+        # Apenas o balde vazio sobrevive após a reposição dos demais
+        relogio.agora += 1
+        baldes.consumir('novo')
+        self.assertEqual(set(baldes._baldes), {'cliente-0', 'novo'})
+
+    def test_backend_cache(self):
+        cache.clear()
+        relogio = Relogio()
+        baldes = BaldeTokensCache(2, 1, relogio=relogio)
+        self.assertEqual(baldes.consumir('cliente'), 0)
+        self.assertEqual(baldes.consumir('cliente'), 0)
+        self.assertAlmostEqual(baldes.consumir('cliente'), 1)
+
+        # Outra instância compartilha os baldes através do cache
+        self.assertGreater(BaldeTokensCache(2, 1, relogio=relogio).consumir('cliente'), 0)
+        relogio.agora += 1
+        self.assertEqual(baldes.consumir('cliente'), 0)
+
+    @override_settings(THROTTLE_TAXAS={'leitura': '1/min'})
+    def test_sem_autenticacao(self):
+        # Perfil `settings_api`: sem autenticação o usuário do DRF é None
+        request = Request(RequestFactory().get('/api/reservas', REMOTE_ADDR='10.0.0.2'))
+        request.user = None
+        throttle = BaldeTokensThrottle()
+        self.assertTrue(throttle.allow_request(request, ReservaAPIView()))
+        self.assertFalse(throttle.allow_request(request, ReservaAPIView()))
+
+
+@override_settings(THROTTLE_TAXAS={
+    'leitura': '3/min', 'escrita': '5/min', 'reservas:escrita': '1/min'})
+class ThrottleAPITestCase(TestCase):
+
+    def get(self, url, **extra):
+        return self.client.get(url, headers={"Accept": "application/json"}, **extra)
+
+    def test_limite_de_leitura(self):
+        url = reverse("imovel_api_view")
+        for _ in range(3):
+            self.assertEqual(self.get(url).status_code, 200)
+
+        response = self.get(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "20")
+
+        # Outros clientes e outras views possuem limites próprios
+        self.assertEqual(self.get(url, REMOTE_ADDR="10.0.0.1").status_code, 200)
+        self.assertEqual(self.get(reverse("anuncio_api_view")).status_code, 200)
+
+    def test_escrita_separada_da_leitura(self):
+        url = reverse("reserva_api_view")
+        dados = {
+            "data_checkin": "2030-01-01", "data_checkout": "2030-01-03",
+            "preco_total": "100.00", "qtd_hospedes": 1, "anuncio": 1}
+
+        self.assertEqual(self.client.post(url, data=dados).status_code, 201)
+        self.assertEqual(self.client.post(url, data=dados).status_code, 429)
+
+        # As leituras continuam disponíveis após o esgotamento das escritas
+        self.assertEqual(self.get(url).status_code, 200)
+
+    @override_settings(THROTTLE_TAXAS={'leitura': '3/min', 'janelas:leitura': '1/min'})
+    def test_limite_das_janelas(self):
+        url = reverse("imovel_janelas_api_view", kwargs={"pk": 1})
+        self.assertEqual(self.get(url, data={"noites": 2}).status_code, 200)
+        self.assertEqual(self.get(url, data={"noites": 2}).status_code, 429)
+
+    @override_settings(THROTTLE_TAXAS={})
+    def test_sem_limite(self):
+        url = reverse("imovel_api_view")
+        for _ in range(10):
+            self.assertEqual(self.get(url).status_code, 200)
@@ -0,0 +1,104 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+
+from apps.reservas.disponibilidade import motor
+from apps.reservas.models import Reserva
+from apps.reservas.serializers import ReservaSerializer
+from apps.reservas.validators import (
+    AcomodacoesDisponiveisValidator,
+    DataCheckInValidator,
+    ReservaDisponivelValidator
+)
+
+from .test_api_reserva import CREATE_RESERVA_DATA, TESTE_RESERVA_DATA
+
+
+class ReservaSerializerValidadores(serializers.ModelSerializer):
+    """Serializer com os validadores independentes, usado como referência
+    para os erros da `ValidacaoReserva`"""
+    codigo = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = Reserva
+        fields = '__all__'
+        validators = [
+            DataCheckInValidator(),
+            AcomodacoesDisponiveisValidator(),
+            ReservaDisponivelValidator()]
+
+
+CASOS = {
+    "valida": CREATE_RESERVA_DATA,
+    "conflito": TESTE_RESERVA_DATA,
+    "checkin_posterior": {**CREATE_RESERVA_DATA, "data_checkin": "2024-05-10"},
+    "acomodacoes": {**CREATE_RESERVA_DATA, "qtd_hospedes": 999},
+    "acomodacoes_e_conflito": {**TESTE_RESERVA_DATA, "qtd_hospedes": 999},
+    "anuncio_inexistente": {**CREATE_RESERVA_DATA, "anuncio": 99999},
+    "anuncio_texto_inexistente": {**CREATE_RESERVA_DATA, "anuncio": "99999"},
+    "anuncio_invalido": {**CREATE_RESERVA_DATA, "anuncio": "abc"},
+    "anuncio_booleano": {**CREATE_RESERVA_DATA, "anuncio": True},
+    "anuncio_ausente": {
+        campo: valor for campo, valor in CREATE_RESERVA_DATA.items() if campo != "anuncio"},
+    "anuncio_inexistente_e_preco": {
+        **CREATE_RESERVA_DATA, "anuncio": 99999, "preco_total": "-1"},
+    "anuncio_valido_e_preco": {**CREATE_RESERVA_DATA, "preco_total": "-1"},
+    "nao_e_objeto": [CREATE_RESERVA_DATA],
+}
+
+
+class ValidacaoReservaTestCase(TestCase):
+
+    def assertMesmosErros(self):
+        for caso, dados in CASOS.items():
+            with self.subTest(caso=caso):
+                esperado = ReservaSerializerValidadores(data=dados)
+                obtido = ReservaSerializer(data=dados)
+                self.assertEqual(obtido.is_valid(), esperado.is_valid())
+                # ErrorDetail compara a mensagem e o código
+                self.assertEqual(obtido.errors, esperado.errors)
+                self.assertEqual(
+                    list(obtido.errors), list(esperado.errors), "Ordem dos campos com erros")
+
+    def test_mesmos_erros(self):
+        self.assertMesmosErros()
+
+    @override_settings(DISPONIBILIDADE_MOTOR=True)
+    def test_mesmos_erros_com_motor(self):
+        motor.limpar()
+        self.assertMesmosErros()
+
+    def test_uma_consulta(self):
+        for dados in (CREATE_RESERVA_DATA, TESTE_RESERVA_DATA, CASOS["acomodacoes"],
+                      CASOS["anuncio_inexistente"]):
+            serializer = ReservaSerializer(data=dados)
+            with self.assertNumQueries(1):
+                serializer.is_valid()
+
+        # Erros que não dependem do banco não executam consultas
+        serializer = ReservaSerializer(data=CASOS["checkin_posterior"])
+        with self.assertNumQueries(0):
+            self.assertFalse(serializer.is_valid())
+
+    def test_anuncio_carregado(self):
+        serializer = ReservaSerializer(data=CREATE_RESERVA_DATA)
+        self.assertTrue(serializer.is_valid())
+        anuncio = serializer.validated_data["anuncio"]
+        self.assertEqual(anuncio.pk, CREATE_RESERVA_DATA["anuncio"])
+
+        # A gravação e o log de mudanças não leem o anúncio novamente
+        with CaptureQueriesContext(connection) as contexto:
+            reserva = serializer.save()
+            self.assertEqual(reserva.anuncio.imovel.pk, anuncio.imovel_id)
+        self.assertFalse([
+            consulta["sql"] for consulta in contexto.captured_queries
+            if consulta["sql"].startswith("SELECT")])
+
+    def test_atualizacao_ignora_a_propria_reserva(self):
+        serializer = ReservaSerializer(data=CREATE_RESERVA_DATA)
+        self.assertTrue(serializer.is_valid())
+        reserva = serializer.save()
+
+        serializer = ReservaSerializer(reserva, data=CREATE_RESERVA_DATA)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
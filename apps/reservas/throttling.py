@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""Limitação de requisições por cliente com baldes de tokens.
+
+Cada combinação de escopo da view, tipo de operação (leitura ou escrita) e
+cliente possui um balde com capacidade igual ao número de requisições da
+taxa configurada, reabastecido continuamente ao longo do período. Assim
+rajadas curtas são aceitas enquanto o consumo médio respeita a taxa.
+
+As taxas são definidas em `THROTTLE_TAXAS`, procurando primeiro a chave
+`<escopo>:<operacao>` e depois apenas `<operacao>`::
+
+    THROTTLE_TAXAS = {
+        'leitura': '1200/min',
+        'escrita': '300/min',
+        'reservas:escrita': '120/min',
+    }
+
+Por padrão os baldes ficam na memória do processo. Com
+`THROTTLE_BACKEND = 'cache'` eles são armazenados no cache do Django e
+compartilhados entre processos; a leitura e a escrita do balde não são
+atômicas, então requisições simultâneas do mesmo cliente podem exceder
+ligeiramente a taxa.
+"""
+import threading
+import time
+
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+PERIODOS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def interpretar_taxa(taxa: str) -> tuple:
+    """Converte uma taxa no formato do DRF (ex: `100/min`) em
+    (capacidade, tokens por segundo)"""
+    quantidade, periodo = taxa.split('/')
+    quantidade = int(quantidade)
+    return quantidade, quantidade / PERIODOS[periodo[0]]
+
+
+class BaldeTokens:
+    """Baldes de tokens mantidos na memória do processo.
+
+    Args:
+        capacidade (int): Quantidade máxima de tokens de um balde.
+        reposicao (float): Tokens repostos por segundo.
+        max_baldes (int, optional): Quantidade de baldes a partir da qual os
+        baldes cheios são descartados. Defaults to 10000.
+        relogio (Callable, optional): Fonte de tempo. Defaults to time.monotonic.
+    """
+
+    def __init__(self, capacidade: int, reposicao: float, max_baldes: int = 10000,
+                 relogio=time.monotonic):
+        self.capacidade = capacidade
+        self.reposicao = reposicao
+        self.max_baldes = max_baldes
+        self.relogio = relogio
+        # chave -> [tokens, instante da última atualização]
+        self._baldes = {}
+        self._lock = threading.Lock()
+
+    def consumir(self, chave: str) -> float:
+        """Consome um token do balde da chave.
+
+        Returns:
+            float: 0 quando a requisição é permitida ou o tempo, em segundos,
+            até o próximo token estar disponível.
+        """
+        agora = self.relogio()
+        with self._lock:
+            balde = self._baldes.get(chave)
+            if balde is None:
+                if len(self._baldes) >= self.max_baldes:
+                    self._descartar(agora)
+                self._baldes[chave] = [self.capacidade - 1, agora]
+                return 0
+
+            tokens = balde[0] + (agora - balde[1]) * self.reposicao
+            if tokens > self.capacidade:
+                tokens = self.capacidade
+            balde[1] = agora
+            if tokens >= 1:
+                balde[0] = tokens - 1
+                return 0
+            balde[0] = tokens
+            return (1 - tokens) / self.reposicao
+
+    def _descartar(self, agora: float):
+        # Um balde cheio equivale a um balde novo e pode ser descartado
+        cheios = [
+            chave for chave, (tokens, instante) in self._baldes.items()
+            if tokens + (agora - instante) * self.reposicao >= self.capacidade]
+        for chave in cheios:
+            del self._baldes[chave]
+
+        # Sem baldes cheios, descarta os mais antigos
+        excedente = len(self._baldes) - self.max_baldes // 2
+        if excedente > 0:
+            for chave in list(self._baldes)[:excedente]:
+                del self._baldes[chave]
+
+    def limpar(self):
+        with self._lock:
+            self._baldes.clear()
+
+
+class BaldeTokensCache(BaldeTokens):
+    """Baldes de tokens armazenados no cache do Django, compartilhados
+    entre os processos que utilizam o mesmo backend de cache."""
+
+    def __init__(self, capacidade: int, reposicao: float, relogio=time.time, **kwargs):
+        super().__init__(capacidade, reposicao, relogio=relogio, **kwargs)
+        # Tempo para um balde vazio ficar cheio, quando ele pode ser esquecido
+        self.expiracao = max(1, int(capacidade / reposicao) + 1)
+
+    def consumir(self, chave: str) -> float:
+        chave = f'throttle:{chave}'
+        agora = self.relogio()
+        tokens, instante = cache.get(chave) or (self.capacidade, agora)
+        tokens = min(self.capacidade, tokens + (agora - instante) * self.reposicao)
+
+        if tokens >= 1:
+            cache.set(chave, (tokens - 1, agora), self.expiracao)
+            return 0
+        cache.set(chave, (tokens, agora), self.expiracao)
+        return (1 - tokens) / self.reposicao
+
+    def limpar(self):
+        pass
+
+
+# (escopo, operação) -> BaldeTokens ou None quando não há limite
+_limitadores = {}
+_limitadores_lock = threading.Lock()
+
+
+def limitador(escopo: str, operacao: str) -> Optional[BaldeTokens]:
+    """Retorna os baldes do escopo e operação, criando-os no primeiro uso"""
+    try:
+        return _limitadores[escopo, operacao]
+    except KeyError:
+        pass
+
+    with _limitadores_lock:
+        if (escopo, operacao) not in _limitadores:
+            taxas = getattr(settings, 'THROTTLE_TAXAS', {})
+            taxa = taxas.get(f'{escopo}:{operacao}', taxas.get(operacao))
+            baldes = None
+            if taxa:
+                classe = BaldeTokensCache if getattr(
+                    settings, 'THROTTLE_BACKEND', 'local') == 'cache' else BaldeTokens
+                baldes = classe(*interpretar_taxa(taxa))
+            _limitadores[escopo, operacao] = baldes
+        return _limitadores[escopo, operacao]
+
+
+@receiver(setting_changed)
+def _reiniciar_limitadores(setting, **kwargs):
+    if setting in ('THROTTLE_TAXAS', 'THROTTLE_BACKEND'):
+        with _limitadores_lock:
+            _limitadores.clear()
+
+
+class BaldeTokensThrottle(BaseThrottle):
+    """Throttle do DRF que separa os limites de leitura e escrita de cada
+    view. O escopo é o atributo `throttle_escopo` da view ou, na ausência
+    dele, o nome da classe. Clientes autenticados são identificados pelo
+    usuário e os demais pelo endereço IP."""
+
+    def allow_request(self, request, view) -> bool:
+        # O throttle é executado em todas as requisições, então os atributos
+        # são lidos direto do HttpRequest, evitando o `__getattr__` do Request
+        http_request = request._request
+        operacao = 'leitura' if http_request.method in SAFE_METHODS else 'escrita'
+        escopo = getattr(view, 'throttle_escopo', None) or view.__class__.__name__
+        baldes = limitador(escopo, operacao)
+        if baldes is None:
+            return True
+
+        usuario = request.user
+        # Sem autenticação configurada (`UNAUTHENTICATED_USER = None`) o
+        # usuário é None
+        if usuario is not None and usuario.is_authenticated:
+            cliente = f'u{usuario.pk}'
+        elif api_settings.NUM_PROXIES is None:
+            # Mesmo resultado de `get_ident` sem proxies configurados
+            meta = http_request.META
+            encaminhado = meta.get('HTTP_X_FORWARDED_FOR')
+            cliente = ''.join(encaminhado.split()) if encaminhado else meta.get('REMOTE_ADDR')
+        else:
+            cliente = self.get_ident(request)
+
+        self.espera = baldes.consumir(f'{escopo}:{operacao}:{cliente}')
+        return not self.espera
+
+    def wait(self) -> Optional[float]:
+        return self.espera
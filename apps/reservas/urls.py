@@ -2,6 +2,8 @@
 
 from django.urls import re_path
 from . import views
+from .models import Imovel, Reserva
+from .serializers import ImovelSerializer, ReservaSerializer
 
 urlpatterns = [
     #
@@ -9,14 +11,49 @@ urlpatterns = [
         views.ImovelAPIView.as_view(), name="imovel_api_view"),
     re_path(r'imoveis/(?P<pk>[0-9]+)/?$',
         views.ImovelAPIView.as_view(), name="imovel_api_view"),
+    re_path(r'imoveis/lote/?$',
+        views.ImovelAPIView.as_view(lote=True), name="imovel_lote_api_view"),
+    re_path(r'imoveis/busca/?$',
+        views.BuscaAPIView.as_view(
+            model=Imovel, serializer_resultado=ImovelSerializer),
+        name="imovel_busca_api_view"),
+    re_path(r'imoveis/(?P<pk>[0-9]+)/janelas/?$',
+        views.JanelasDisponiveisAPIView.as_view(), name="imovel_janelas_api_view"),
     #
     re_path(r'anuncios/?$',
         views.AnuncioAPIView.as_view(), name="anuncio_api_view"),
     re_path(r'anuncios/(?P<pk>[0-9]+)/?$',
         views.AnuncioAPIView.as_view(), name="anuncio_api_view"),
+    re_path(r'anuncios/lote/?$',
+        views.AnuncioAPIView.as_view(lote=True), name="anuncio_lote_api_view"),
     #
     re_path(r'reservas/?$',
         views.ReservaAPIView.as_view(), name="reserva_api_view"),
     re_path(r'reservas/(?P<pk>[0-9]+)/?$',
         views.ReservaAPIView.as_view(), name="reserva_api_view"),
+    re_path(r'reservas/lote/?$',
+        views.ReservaAPIView.as_view(lote=True), name="reserva_lote_api_view"),
+    re_path(r'reservas/(?P<pk>[0-9]+)/remarcar/?$',
+        views.ReservaAPIView.as_view(remarcacao=True), name="reserva_remarcacao_api_view"),
+    re_path(r'reservas/busca/?$',
+        views.BuscaAPIView.as_view(
+            model=Reserva, serializer_resultado=ReservaSerializer),
+        name="reserva_busca_api_view"),
+    re_path(r'reservas/codigo/(?P<codigo>[0-9A-Za-z -]+)/?$',
+        views.ReservaCodigoAPIView.as_view(), name="reserva_codigo_api_view"),
+    re_path(r'reservas/exportacao/?$',
+        views.ExportacaoReservasAPIView.as_view(), name="reserva_exportacao_api_view"),
+    #
+    re_path(r'pre-reservas/?$',
+        views.PreReservaAPIView.as_view(), name="pre_reserva_api_view"),
+    re_path(r'pre-reservas/(?P<codigo>[0-9A-Fa-f-]+)/?$',
+        views.PreReservaAPIView.as_view(), name="pre_reserva_api_view"),
+    re_path(r'pre-reservas/(?P<codigo>[0-9A-Fa-f-]+)/confirmar/?$',
+        views.PreReservaAPIView.as_view(confirmacao=True), name="pre_reserva_confirmacao_api_view"),
+    #
+    re_path(r'mudancas/?$',
+        views.MudancaAPIView.as_view(), name="mudanca_api_view"),
+    #
+    re_path(r'diagnosticos/memoria/?$',
+        views.DiagnosticoMemoriaAPIView.as_view(), name="diagnostico_memoria_api_view"),
 ]
\ No newline at end of file
@@ -1,6 +1,12 @@
 # -*- coding: utf-8 -*-
+from datetime import date, timedelta
+from functools import reduce
+from operator import or_
+from typing import List, Tuple
+
 from rest_framework import serializers
-from django.db.models import Q, F
+from django.db.models import Exists, OuterRef, Q, F
+from django.utils import timezone
 
 from .constants import (
     VALIDADOR_CHECKIN_DATA,
@@ -9,7 +15,9 @@ from .constants import (
 )
 
 
-from .models import Reserva
+from .disponibilidade import motor, motor_habilitado
+from .models import Anuncio, PreReserva, Reserva
+from .shards import candidatos, procurar
 
 
 class DataCheckInValidator:
@@ -26,7 +34,8 @@ class DataCheckInValidator:
 
 
 class ReservaDisponivelValidator:
-    """Valida se o imóvel está disponível para reserva no período
+    """Valida se o imóvel está disponível para reserva no período. As
+    pré-reservas ainda não expiradas também ocupam o período.
 
     Args:
         **data_checkout_disponivel (bool): Indica se o imóvel está
@@ -36,35 +45,118 @@ class ReservaDisponivelValidator:
     data_checkout_disponivel = False
     requires_context = True
 
-    def __init__(self, data_checkout_disponivel: bool=False):
+    def __init__(self, data_checkout_disponivel: bool=False, usar_motor: bool=None):
+        """
+        Args:
+            usar_motor (bool, optional): Quando True a checagem é feita pelo motor
+            de disponibilidade em memória. Por padrão segue a configuração
+            `DISPONIBILIDADE_MOTOR`.
+        """
         self.data_checkout_disponivel = data_checkout_disponivel
+        self.usar_motor = usar_motor
 
     def __call__(self, values, serializer_field):
         anuncio = values['anuncio']
         data_checkin = values['data_checkin']
         data_checkout = values['data_checkout']
 
-        query = Q(anuncio__imovel=anuncio.imovel_id)
-        
         # Verifica se trata-se de uma instância existente.
         # Caso seja, é necessário remover esta instância da
         # checagem
-        if values.get('id'):
-            query.add(~Q(id=values['id']), Q.AND)
-        elif getattr(serializer_field, 'instance', None):
-            query.add(
-                ~Q(id=serializer_field.instance.id), Q.AND)
+        ignorar, ignorar_pre_reserva = ignorados(values, serializer_field)
+
+        if self.pre_reservas(
+                anuncio.imovel_id, data_checkin, data_checkout, ignorar_pre_reserva).exists():
+            raise serializers.ValidationError(VALIDADOR_RESERVA_INDISPONIVEL, "conflict")
+
+        if self.usar_motor_disponibilidade():
+            self.validar_no_motor(anuncio.imovel_id, data_checkin, data_checkout, ignorar)
+            return
+
+        if self.conflitos(anuncio.imovel_id, data_checkin, data_checkout, ignorar).exists():
+            raise serializers.ValidationError(VALIDADOR_RESERVA_INDISPONIVEL, "conflict")
+
+    def usar_motor_disponibilidade(self) -> bool:
+        return motor_habilitado() if self.usar_motor is None else self.usar_motor
+
+    def validar_no_motor(self, imovel_id, data_checkin, data_checkout, ignorar):
+        conflito = motor.conflito(
+            imovel_id, data_checkin, data_checkout,
+            inclusivo=not self.data_checkout_disponivel, ignorar=ignorar)
+        if conflito is not None:
+            raise serializers.ValidationError(VALIDADOR_RESERVA_INDISPONIVEL, "conflict")
+
+    def conflitos(self, imovel, data_checkin, data_checkout, ignorar=None):
+        """Reservas do imóvel que conflitam com o período.
+
+        Args:
+            imovel: Id do imóvel ou uma expressão, como `OuterRef`, quando
+            usado como subconsulta.
+        """
+        return Reserva.objects.filter(self.periodo(imovel, data_checkin, data_checkout, ignorar))
+
+    def pre_reservas(self, imovel, data_checkin, data_checkout, ignorar=None):
+        """Pré-reservas do imóvel, ainda não expiradas, que ocupam o período.
+        Ver `conflitos`."""
+        return PreReserva.objects.filter(
+            self.periodo(imovel, data_checkin, data_checkout, ignorar),
+            expira_em__gt=timezone.now())
+
+    def periodo(self, imovel, data_checkin, data_checkout, ignorar=None) -> Q:
+        """Filtro dos intervalos do imóvel que se sobrepõem ao período"""
+        query = Q(anuncio__imovel=imovel)
+        
+        if ignorar:
+            query.add(~Q(id=ignorar), Q.AND)
+
+        query.add(self.intervalo(data_checkin, data_checkout), Q.AND)
+
+        return query
+
+    def intervalo(self, data_checkin, data_checkout) -> Q:
+        """Filtro dos intervalos que se sobrepõem ao período, de qualquer imóvel"""
+        if self.data_checkout_disponivel:
+            return Q(data_checkout__gt=data_checkin, data_checkin__lt=data_checkout)
+        return Q(data_checkout__gte=data_checkin, data_checkin__lte=data_checkout)
+
+    def trechos_adicionados(self, anterior: Tuple[date, date], novo: Tuple[date, date]) -> List[Tuple[date, date]]:
+        """Trechos do período `novo` que não fazem parte do período `anterior`,
+        no mesmo formato (check-in, check-out) dos períodos.
+
+        Sem o checkout disponível os períodos incluem o dia do check-out e os
+        trechos são fechados; com ele, o dia do check-out fica livre e os
+        trechos terminam no primeiro dia fora do trecho.
+        """
+        (inicio_anterior, fim_anterior), (inicio, fim) = anterior, novo
+        passo = timedelta() if self.data_checkout_disponivel else timedelta(days=1)
+        trechos = [
+            (inicio, min(fim, inicio_anterior - passo)),
+            (max(inicio, fim_anterior + passo), fim)
+        ]
 
         if self.data_checkout_disponivel:
-            query.add(
-                Q(data_checkout__gt=data_checkin,
-                  data_checkin__lt=data_checkout), Q.AND)
-        else:
-            query.add(
-                Q(data_checkout__gte=data_checkin,
-                  data_checkin__lte=data_checkout), Q.AND)
-
-        if Reserva.objects.filter(query).exists():
+            return [(a, b) for a, b in trechos if a < b]
+        return [(a, b) for a, b in trechos if a <= b]
+
+    def validar_remarcacao(self, imovel_id, anterior, novo, ignorar):
+        """Valida a troca do período `anterior` de uma reserva pelo `novo`.
+
+        O período anterior já estava validado, então apenas os trechos
+        adicionados (`trechos_adicionados`) são checados contra as reservas e
+        as pré-reservas do imóvel. Encurtar a estadia não consulta o banco. A
+        checagem é sempre feita no banco, e não no motor, porque é executada
+        com o imóvel bloqueado e deve enxergar as últimas escritas.
+        """
+        trechos = self.trechos_adicionados(anterior, novo)
+        if not trechos:
+            return
+
+        datas = reduce(or_, (self.intervalo(*trecho) for trecho in trechos))
+        reservas = Reserva.objects.filter(datas, anuncio__imovel=imovel_id).exclude(id=ignorar)
+        ocupadas = PreReserva.objects.filter(
+            datas, anuncio__imovel=imovel_id, expira_em__gt=timezone.now())
+
+        if reservas.exists() or ocupadas.exists():
             raise serializers.ValidationError(VALIDADOR_RESERVA_INDISPONIVEL, "conflict")
 
 
@@ -84,3 +176,111 @@ class AcomodacoesDisponiveisValidator:
                 }
             })
 
+class ValidacaoReserva:
+    """Executa as validações de `DataCheckInValidator`,
+    `AcomodacoesDisponiveisValidator` e `ReservaDisponivelValidator` com uma
+    única consulta ao banco.
+
+    O campo `anuncio` do `ReservaSerializer` valida apenas o tipo do id. O
+    anúncio, o imóvel e a existência de conflitos são obtidos juntos, na
+    mesma consulta, e os valores validados passam a conter o anúncio
+    carregado. As checagens que não dependem do banco são executadas antes
+    da consulta e os erros, bem como os seus códigos, são os mesmos dos
+    validadores.
+
+    Com o imóvel bloqueado (`imovel_bloqueado` no contexto do serializer) os
+    conflitos são sempre checados no banco: a agenda do motor pode não
+    refletir uma escrita concorrente confirmada antes do bloqueio.
+
+    Args:
+        **data_checkout_disponivel (bool): Ver `ReservaDisponivelValidator`.
+        **usar_motor (bool): Ver `ReservaDisponivelValidator`.
+    """
+
+    def __init__(self, data_checkout_disponivel: bool=False, usar_motor: bool=None):
+        self.disponibilidade = ReservaDisponivelValidator(
+            data_checkout_disponivel=data_checkout_disponivel, usar_motor=usar_motor)
+
+    @property
+    def data_checkout_disponivel(self) -> bool:
+        return self.disponibilidade.data_checkout_disponivel
+
+    def __call__(self, values, serializer) -> dict:
+        DataCheckInValidator()(values)
+
+        ignorar, ignorar_pre_reserva = ignorados(values, serializer)
+        usar_motor = (self.disponibilidade.usar_motor_disponibilidade()
+                      and not getattr(serializer, 'context', {}).get('imovel_bloqueado'))
+        values['anuncio'] = anuncio = self.carregar_anuncio(
+            values, serializer, ignorar, usar_motor, ignorar_pre_reserva)
+
+        AcomodacoesDisponiveisValidator()(values)
+
+        if anuncio.pre_reservado:
+            raise serializers.ValidationError(VALIDADOR_RESERVA_INDISPONIVEL, "conflict")
+
+        if usar_motor:
+            self.disponibilidade.validar_no_motor(
+                anuncio.imovel_id, values['data_checkin'], values['data_checkout'], ignorar)
+        elif anuncio.conflito:
+            raise serializers.ValidationError(VALIDADOR_RESERVA_INDISPONIVEL, "conflict")
+
+        return values
+
+    def carregar_anuncio(self, values, serializer, ignorar, usar_motor: bool,
+                         ignorar_pre_reserva=None) -> Anuncio:
+        """Carrega o anúncio com o imóvel, com a anotação `pre_reservado` e,
+        quando os conflitos não são checados pelo motor de disponibilidade,
+        com a anotação `conflito`"""
+        # Os valores podem conter o id ou, quando validados por outro
+        # serializer, o próprio anúncio
+        anuncio_id = getattr(values['anuncio'], 'pk', values['anuncio'])
+
+        # As pré-reservas expiram com o tempo e não fazem parte das agendas
+        # do motor, então são sempre checadas no banco
+        queryset = Anuncio.objects.select_related('imovel').annotate(
+            pre_reservado=Exists(self.disponibilidade.pre_reservas(
+                OuterRef('imovel_id'), values['data_checkin'], values['data_checkout'],
+                ignorar_pre_reserva)))
+        if not usar_motor:
+            queryset = queryset.annotate(conflito=Exists(self.disponibilidade.conflitos(
+                OuterRef('imovel_id'), values['data_checkin'], values['data_checkout'], ignorar)))
+
+        # Com sharding a consulta é feita no shard do anúncio, onde também
+        # estão as reservas do imóvel
+        anuncio = procurar(queryset, candidatos(Anuncio, anuncio_id), pk=anuncio_id)
+        if anuncio is None:
+            campo = serializer.fields['anuncio']
+            try:
+                campo.fail('does_not_exist', pk_value=anuncio_valor_informado(serializer, anuncio_id))
+            except serializers.ValidationError as exc:
+                raise serializers.ValidationError({'anuncio': exc.detail})
+        return anuncio
+
+
+def ignorados(values, serializer) -> tuple:
+    """Ids da reserva e da pré-reserva desconsideradas na checagem de
+    conflitos: o próprio objeto, quando atualizado, e a pré-reserva que está
+    sendo confirmada, informada no contexto do serializer (`pre_reserva`)."""
+    instance = getattr(serializer, 'instance', None)
+    pk = values.get('id') or getattr(instance, 'id', None)
+    if isinstance(instance, PreReserva):
+        return None, pk
+    return pk, getattr(serializer, 'context', {}).get('pre_reserva')
+
+
+def anuncio_valor_informado(serializer, padrao):
+    """Valor do campo `anuncio` como enviado pelo cliente, utilizado na
+    mensagem de erro do `PrimaryKeyRelatedField`"""
+    dados = getattr(serializer, 'initial_data', None)
+    if dados is None:
+        return padrao
+    return serializer.fields['anuncio'].get_value(dados)
+
+
+def checkout_disponivel() -> bool:
+    """Indica se, pela regra configurada no `ReservaSerializer`, o imóvel
+    fica disponível na data do check-out de outra reserva."""
+    from .serializers import ReservaSerializer
+
+    return ReservaSerializer.validacao.data_checkout_disponivel
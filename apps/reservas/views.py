@@ -1,21 +1,91 @@
 # -*- coding: utf-8 -*-
+import json
+import time
+
+from collections.abc import Mapping
+from datetime import timedelta
+from operator import attrgetter
+from uuid import UUID
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework import mixins
 from rest_framework import generics
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from apps.tarefas.fila import resposta_tarefa
+
+from .constants import (
+    DATA_HORA_INVALIDA,
+    LOTE_CAMPO_NAO_PERMITIDO,
+    LOTE_FILTRO_INVALIDO,
+    LOTE_IDS_INVALIDOS,
+    LOTE_LIMITE_EXCEDIDO,
+    LOTE_SELECAO_OBRIGATORIA,
+    LOTE_SHARD_DIFERENTE,
+    EXPORTACAO_FORMATO_INVALIDO,
+    EXPORTACAO_INDISPONIVEL,
+    LOTE_VALORES_OBRIGATORIOS,
+    PARAMETRO_INVALIDO
+)
 
 from .models import (
     Imovel,
     Anuncio,
-    Reserva
+    Reserva,
+    PreReserva,
+    Mudanca
 )
 
+from . import pre_reservas, shards
+from .admissao import AdmissaoMixin
+from .coalescencia import RespostaRenderizada, chave_requisicao, coalescedor, coalescivel
+from .codigos import normalizar as normalizar_codigo, numero as numero_codigo
+from .disponibilidade import (
+    bloquear_imovel,
+    carregar_anuncio,
+    janelas_livres,
+    motor,
+    motor_habilitado,
+    versao_agenda
+)
+from .memoria import rastreador
+from .perfilamento import PerfilamentoMixin, token_requisicao
+from .permissions import ClientesDiagnosticoPermission
+from .renderers import EventStreamRenderer, JSONColunarRenderer
+from .throttling import BaldeTokensThrottle
+from .signals import registrar_atualizacoes
+from .tarefas import remover_em_lote, selecao_lote
+
 from .serializers import (
     ImovelSerializer,
     AnuncioSerializer,
-    ReservaSerializer
+    ReservaSerializer,
+    PreReservaSerializer,
+    RemarcacaoSerializer,
+    MudancaSerializer,
+    ConsultaBuscaSerializer,
+    ConsultaJanelasSerializer,
+    ConsultaListagemSerializer,
+    JanelaSerializer
 )
+from .validators import checkout_disponivel
 
 
 class BaseModelAPIView(
+        PerfilamentoMixin,
+        AdmissaoMixin,
+        shards.ShardMixin,
         mixins.ListModelMixin,
         mixins.CreateModelMixin,
         mixins.RetrieveModelMixin,
@@ -33,16 +103,290 @@ class BaseModelAPIView(
     # o método put precisa ser implementado
     atualizar_via_post = False    
     lookup_url_kwarg = 'pk'
+    # Quando True, o post na url é tratado como uma busca em lote pelos ids
+    # informados no corpo da requisição. Utilizado nas urls ".../lote"
+    lote = False
+    # Campos que podem ser usados no filtro das operações em lote
+    campos_filtro_lote = ()
+    # Quantidade de ids por UPDATE nas operações em lote
+    tamanho_bloco_lote = 500
+    # Limites de leitura e escrita por cliente, ver `THROTTLE_TAXAS`
+    throttle_classes = [BaldeTokensThrottle]
+    throttle_escopo = None
+    # `Accept: application/vnd.colunar+json` seleciona a representação colunar
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, JSONColunarRenderer]
         
     def get_queryset(self):
         return self.model.objects.all()
 
     def get(self, request, pk=None, format=None):
+        # Requisições perfiladas e de clientes identificados precisam
+        # executar a view por conta própria
+        if (not settings.COALESCENCIA_REQUISICOES or token_requisicao(request) is not None
+                or not coalescivel(request)):
+            return self.responder_get(request, pk, format=format)
+
+        resultado = coalescedor.executar(
+            chave_requisicao(request),
+            lambda: self.renderizar(self.responder_get(request, pk, format=format)),
+            settings.COALESCENCIA_ESPERA)
+        return resultado.response()
+
+    def renderizar(self, response) -> RespostaRenderizada:
+        """Renderiza a resposta dentro da view para que o conteúdo possa ser
+        compartilhado com as requisições coalescidas"""
+        return RespostaRenderizada(self.finalize_response(self.request, response).render())
+
+    def responder_get(self, request, pk=None, format=None):
         if pk:
             return self.retrieve(request, format=format)
+        if 'atualizado_desde' in request.query_params:
+            return self.sincronizar(request, format=format)
+        if 'ids' in request.query_params:
+            return self.buscar_lote(
+                request.query_params['ids'].split(','), format=format)
         return self.list(request, format=format)
+
+    def list(self, request, *args, **kwargs):
+        """Listagem ordenada pelo id. Com `limite` a listagem é paginada: a
+        próxima página é obtida informando em `apos` o último id recebido.
+        Com sharding, cada shard retorna a sua página e as páginas são
+        intercaladas pelo id."""
+        consulta = ConsultaListagemSerializer(data=request.query_params)
+        consulta.is_valid(raise_exception=True)
+        apos = consulta.validated_data.get('apos')
+        limite = consulta.validated_data.get('limite')
+        if not shards.habilitado() and apos is None and limite is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset()).order_by('pk')
+        if apos is not None:
+            queryset = queryset.filter(pk__gt=apos)
+
+        def pagina(alias):
+            return list(queryset.using(alias)[:limite])
+
+        objetos = shards.intercalar(
+            shards.em_todos(pagina, self.shards_lote()), chave=attrgetter('pk'), limite=limite)
+        return Response(self.get_serializer(objetos, many=True).data)
+
+    def validar_ids(self, ids, campo: str = 'ids') -> list:
+        """Valida e normaliza uma lista de ids, removendo os repetidos e
+        mantendo a ordem em que foram informados."""
+        if not isinstance(ids, list):
+            raise ValidationError({campo: LOTE_IDS_INVALIDOS})
+
+        try:
+            ids = list(dict.fromkeys(int(pk) for pk in ids if pk != ''))
+        except (TypeError, ValueError):
+            raise ValidationError({campo: LOTE_IDS_INVALIDOS})
+
+        if not ids:
+            raise ValidationError({campo: LOTE_IDS_INVALIDOS})
+        if len(ids) > settings.LOTE_LIMITE:
+            raise ValidationError({
+                campo: LOTE_LIMITE_EXCEDIDO % {'limite': settings.LOTE_LIMITE}})
+        return ids
+
+    def buscar_lote(self, ids, format=None):
+        """Busca vários objetos em uma única consulta. Os objetos são retornados
+        na ordem em que os ids foram informados e os ids inexistentes são
+        listados em `nao_encontrados`.
+
+        Args:
+            ids (list): Ids dos objetos. Aceita inteiros ou strings numéricas.
+        """
+        ids = self.validar_ids(ids)
+        queryset = self.filter_queryset(self.get_queryset())
+        objetos = {}
+        for encontrados in shards.em_todos(lambda alias: queryset.using(alias).in_bulk(ids)):
+            objetos.update(encontrados)
+
+        return Response({
+            'resultados': self.get_serializer(
+                [objetos[pk] for pk in ids if pk in objetos], many=True).data,
+            'nao_encontrados': [pk for pk in ids if pk not in objetos]
+        })
+
+    def selecionar_lote(self, dados) -> tuple:
+        """Monta o queryset das operações em lote a partir dos ids e/ou do
+        filtro informados no corpo da requisição. Ao menos um dos dois é
+        obrigatório para evitar que uma requisição vazia afete toda a tabela.
+
+        Returns:
+            tuple: O queryset selecionado e a lista de ids informados (ou None).
+        """
+        if not isinstance(dados, dict) or (
+                dados.get('ids') is None and dados.get('filtro') is None):
+            raise ValidationError({'non_field_errors': LOTE_SELECAO_OBRIGATORIA})
+
+        queryset = self.filter_queryset(self.get_queryset())
+        ids = None
+
+        if dados.get('ids') is not None:
+            ids = self.validar_ids(dados['ids'])
+            queryset = queryset.filter(pk__in=ids)
+
+        filtro = dados.get('filtro')
+        if filtro is not None:
+            if not isinstance(filtro, dict) or not filtro:
+                raise ValidationError({'filtro': LOTE_SELECAO_OBRIGATORIA})
+
+            for campo, valor in filtro.items():
+                if campo not in self.campos_filtro_lote:
+                    raise ValidationError({'filtro': LOTE_CAMPO_NAO_PERMITIDO % {'campo': campo}})
+                try:
+                    queryset = selecao_lote(queryset, filtro={campo: valor})
+                except (TypeError, ValueError, DjangoValidationError):
+                    raise ValidationError({'filtro': LOTE_FILTRO_INVALIDO % {'campo': campo}})
+
+        return queryset, ids
+
+    def campos_atualizaveis_lote(self) -> set:
+        """Campos que podem ser alterados em lote. Campos únicos são excluídos
+        já que um mesmo valor não pode ser atribuído a vários objetos."""
+        return {
+            nome for nome, campo in self.get_serializer().fields.items()
+            if not campo.read_only and not self.model._meta.get_field(
+                campo.source).unique}
+
+    def atualizar_lote(self, request, format=None):
+        """Atribui os mesmos `valores` a todos os objetos selecionados com um
+        único UPDATE por bloco de ids. Como os valores são os mesmos para todas
+        as linhas, as validações dos campos são executadas uma única vez antes
+        da escrita."""
+        queryset, ids = self.selecionar_lote(request.data)
+
+        valores = request.data.get('valores')
+        if not isinstance(valores, dict) or not valores:
+            raise ValidationError({'valores': LOTE_VALORES_OBRIGATORIOS})
+
+        permitidos = self.campos_atualizaveis_lote()
+        for campo in valores:
+            if campo not in permitidos:
+                raise ValidationError({'valores': LOTE_CAMPO_NAO_PERMITIDO % {'campo': campo}})
+
+        serializer = self.get_serializer(data=valores, partial=True)
+        serializer.is_valid(raise_exception=True)
+        if shards.habilitado():
+            self.validar_shards_lote(queryset, serializer.validated_data)
+
+        atualizados = []
+        # Com sharding, uma transação por shard
+        for alias in self.shards_lote():
+            with transaction.atomic(using=alias):
+                objetos = self.model.objects.using(alias)
+                pks = list(queryset.using(alias).select_for_update().values_list('pk', flat=True))
+
+                for inicio in range(0, len(pks), self.tamanho_bloco_lote):
+                    bloco = pks[inicio:inicio + self.tamanho_bloco_lote]
+                    objetos.filter(pk__in=bloco).update(
+                        **serializer.validated_data, data_atualizacao=timezone.now())
+                    atualizados.extend(registrar_atualizacoes(
+                        self.model, objetos.filter(pk__in=bloco)))
+
+        return Response(self.resultado_lote(atualizados, ids, 'atualizado'))
+
+    def validar_shards_lote(self, queryset, valores: dict):
+        """As chaves estrangeiras não atravessam os shards: um objeto
+        relacionado atribuído em lote precisa estar no mesmo shard de todos os
+        objetos selecionados. Checado antes de qualquer escrita, já que cada
+        shard é atualizado em sua própria transação."""
+        for campo, valor in valores.items():
+            if not isinstance(valor, models.Model):
+                continue
+            outros = [alias for alias in self.shards_lote() if alias != valor._state.db]
+            if any(shards.em_todos(lambda alias: queryset.using(alias).exists(), outros)):
+                raise ValidationError({campo: LOTE_SHARD_DIFERENTE % {'campo': campo}})
+
+    def remover_lote(self, request, format=None):
+        """Remove os objetos selecionados, incluindo os dependentes em cascata.
+        Quando a quantidade excede `LOTE_REMOCAO_SINCRONA` a remoção é
+        delegada para a fila de tarefas e a resposta é 202. A tarefa recebe a
+        seleção (ids e filtro), e não os ids selecionados: a requisição lê no
+        máximo `LOTE_REMOCAO_SINCRONA + 1` ids por shard."""
+        queryset, ids = self.selecionar_lote(request.data)
+        limite = settings.LOTE_REMOCAO_SINCRONA
+        pks_shards = dict(zip(self.shards_lote(), shards.em_todos(
+            lambda alias: list(queryset.using(alias).values_list('pk', flat=True)[:limite + 1]),
+            self.shards_lote())))
+        pks = [pk for pks_shard in pks_shards.values() for pk in pks_shard]
+
+        if len(pks) > limite:
+            return resposta_tarefa(remover_em_lote.enfileirar(
+                modelo=self.model._meta.label_lower, ids=ids, filtro=request.data.get('filtro')))
+
+        removidos = {}
+        for alias, pks_shard in pks_shards.items():
+            with transaction.atomic(using=alias):
+                _, removidos_shard = self.model.objects.using(alias).filter(pk__in=pks_shard).delete()
+            for label, quantidade in removidos_shard.items():
+                removidos[label] = removidos.get(label, 0) + quantidade
+
+        return Response({
+            **self.resultado_lote(pks, ids, 'removido'),
+            'removidos': removidos
+        })
+
+    def shards_lote(self) -> list:
+        """Bancos afetados pelas operações em lote: todos os shards ou, sem
+        sharding, o banco do modelo"""
+        return shards.shards() if shards.habilitado() else [self.model.objects.db]
+
+    def resultado_lote(self, pks: list, ids: list, status: str) -> dict:
+        """Formata o resultado por objeto das operações em lote"""
+        afetados = set(pks)
+        return {
+            'resultados': [{'id': pk, 'status': status} for pk in pks],
+            'nao_encontrados': [pk for pk in ids or () if pk not in afetados]
+        }
+
+    def sincronizar(self, request, format=None):
+        """Sincronização incremental. Retorna apenas os objetos alterados a
+        partir de `atualizado_desde`, os ids removidos no mesmo período e a
+        marca d'água a ser usada na próxima sincronização.
+
+        A marca d'água é recuada em `SINCRONIZACAO_MARGEM` segundos para
+        incluir escritas ainda não confirmadas no momento da leitura. Por
+        isso um mesmo objeto pode ser retornado em duas sincronizações
+        consecutivas e o cliente deve aplicar os dados de forma idempotente."""
+        valor = request.query_params.get('atualizado_desde')
+        try:
+            desde = parse_datetime(valor)
+        except ValueError:
+            desde = None
+        if desde is None:
+            raise ValidationError({'atualizado_desde': DATA_HORA_INVALIDA})
+        if timezone.is_naive(desde):
+            desde = timezone.make_aware(desde)
+
+        marca_dagua = timezone.now() - timedelta(seconds=settings.SINCRONIZACAO_MARGEM)
+
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            data_atualizacao__gte=desde).order_by('data_atualizacao', 'id')
+        removidos = Mudanca.objects.filter(
+            modelo=self.model._meta.model_name,
+            operacao=Mudanca.Operacao.REMOCAO,
+            data__gte=desde).values_list('objeto_id', flat=True).distinct()
+
+        # Com sharding as alterações e o log de cada shard são intercalados
+        alteracoes = shards.em_todos(lambda alias: (
+            list(queryset.using(alias)), list(removidos.using(alias))), self.shards_lote())
+        objetos = shards.intercalar(
+            [resultados for resultados, _ in alteracoes],
+            chave=attrgetter('data_atualizacao', 'id'))
+
+        return Response({
+            'resultados': self.get_serializer(objetos, many=True).data,
+            'removidos': list(dict.fromkeys(
+                pk for _, removidos_shard in alteracoes for pk in removidos_shard)),
+            'marca_dagua': marca_dagua
+        })
     
     def post(self, request, pk=None, format=None):
+        if self.lote:
+            ids = request.data.get('ids') if hasattr(request.data, 'get') else request.data
+            return self.buscar_lote(ids, format=format)
         if pk:
             # Permitir alteração criação via post?
             if self.atualizar_via_post and hasattr(self, 'put'):
@@ -56,27 +400,506 @@ class BaseModelAPIView(
 
 class ImovelAPIView(BaseModelAPIView):    
     model = Imovel
+    throttle_escopo = 'imoveis'
     serializer_class = ImovelSerializer
+    campos_filtro_lote = ('capacidade', 'banheiros', 'aceita_animais', 'data_ativacao')
 
     def put(self, request, pk=None, format=None):
         return self.update(request, pk=pk, format=format)
 
+    def patch(self, request, pk=None, format=None):
+        if pk:
+            return self.partial_update(request, pk=pk, format=format)
+        return self.atualizar_lote(request, format=format)
+
     def delete(self, request, pk=None, format=None):
-        return self.destroy(request, pk=pk, format=format)
+        if pk:
+            return self.destroy(request, pk=pk, format=format)
+        return self.remover_lote(request, format=format)
 
 
 class AnuncioAPIView(BaseModelAPIView):
     model = Anuncio
+    throttle_escopo = 'anuncios'
     serializer_class = AnuncioSerializer
+    campos_filtro_lote = ('plataforma', 'imovel')
 
     def put(self, request, pk=None, format=None):
         return self.update(request, pk=pk, format=format)
 
+    def patch(self, request, pk=None, format=None):
+        if pk:
+            return self.partial_update(request, pk=pk, format=format)
+        return self.atualizar_lote(request, format=format)
+
+
+class BloqueioImovelMixin:
+    """Cria o objeto que ocupa um período (reserva ou pré-reserva) com o
+    imóvel do anúncio bloqueado (`bloquear_imovel`): a validação da
+    disponibilidade e a gravação acontecem na mesma transação, sem que
+    outra escrita no imóvel valide o mesmo período nesse meio tempo. Com o
+    imóvel bloqueado a disponibilidade é validada no banco, e não no motor
+    (`imovel_bloqueado` no contexto do serializer)"""
+    imovel_bloqueado = False
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'imovel_bloqueado': self.imovel_bloqueado}
+
+    def create(self, request, *args, **kwargs):
+        dados = request.data if isinstance(request.data, Mapping) else {}
+        anuncio = carregar_anuncio(dados.get('anuncio'))
+        if anuncio is None:
+            # Anúncio inválido ou inexistente, recusado pela validação
+            return super().create(request, *args, **kwargs)
 
-class ReservaAPIView(BaseModelAPIView):
+        using = anuncio._state.db
+        with transaction.atomic(using=using):
+            bloquear_imovel(anuncio.imovel_id, using)
+            self.imovel_bloqueado = True
+            return super().create(request, *args, **kwargs)
+
+
+class ReservaAPIView(BloqueioImovelMixin, BaseModelAPIView):
     model = Reserva
+    throttle_escopo = 'reservas'
     serializer_class = ReservaSerializer
+    campos_filtro_lote = ('anuncio', 'anuncio__imovel', 'data_checkin', 'data_checkout')
+    # Quando True, o post na url com o id da reserva altera as suas datas.
+    # Utilizado na url ".../remarcar"
+    remarcacao = False
+
+    def get(self, request, pk=None, format=None):
+        if self.remarcacao:
+            return self.http_method_not_allowed(request)
+        return super().get(request, pk=pk, format=format)
+
+    def post(self, request, pk=None, format=None):
+        if self.remarcacao:
+            return self.remarcar(request, format=format)
+        return super().post(request, pk=pk, format=format)
 
     def delete(self, request, pk=None, format=None):
-        return self.destroy(request, pk=pk, format=format)
+        if self.remarcacao:
+            return self.http_method_not_allowed(request)
+        if pk:
+            return self.destroy(request, pk=pk, format=format)
+        return self.remover_lote(request, format=format)
+
+    def remarcar(self, request, format=None):
+        """Altera as datas da reserva mantendo o id e os códigos. Apenas os
+        trechos do novo período fora do período atual são validados
+        (`ReservaDisponivelValidator.validar_remarcacao`), com o imóvel e a
+        reserva bloqueados até a gravação."""
+        reserva = self.get_object()
+        consulta = RemarcacaoSerializer(data=request.data)
+        consulta.is_valid(raise_exception=True)
+        novo = (consulta.validated_data['data_checkin'], consulta.validated_data['data_checkout'])
+        imovel_id = Anuncio.objects.using(reserva._state.db).values_list(
+            'imovel_id', flat=True).get(pk=reserva.anuncio_id)
+        validador = ReservaSerializer.validacao.disponibilidade
+        using = reserva._state.db
+
+        with transaction.atomic(using=using):
+            bloquear_imovel(imovel_id, using)
+            # Relida com o imóvel bloqueado: uma requisição concorrente pode
+            # tê-la remarcado ou removido
+            reserva = Reserva.objects.using(using).select_for_update().filter(pk=reserva.pk).first()
+            if reserva is None:
+                raise Http404
+
+            try:
+                validador.validar_remarcacao(
+                    imovel_id, (reserva.data_checkin, reserva.data_checkout), novo, ignorar=reserva.pk)
+            except ValidationError as erro:
+                raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: erro.detail})
+
+            reserva.data_checkin, reserva.data_checkout = novo
+            reserva.save(update_fields=['data_checkin', 'data_checkout', 'data_atualizacao'])
+
+        return Response(self.get_serializer(reserva).data)
+
+
+
+class ReservaCodigoAPIView(mixins.RetrieveModelMixin, generics.GenericAPIView):
+    """Busca uma reserva pelo código curto (ex: `KRVQ-KEBZ-S`, ver
+    `apps/reservas/codigos.py`) ou pelo UUID. Códigos curtos com o dígito
+    verificador inválido são recusados sem consultar o banco."""
+    queryset = Reserva.objects.all()
+    serializer_class = ReservaSerializer
+    throttle_classes = [BaldeTokensThrottle]
+    throttle_escopo = 'reservas'
+
+    def get_object(self):
+        valor = self.kwargs['codigo']
+        try:
+            filtro = {'codigo': UUID(valor)}
+        except ValueError:
+            codigo = normalizar_codigo(valor)
+            if codigo is None:
+                raise Http404
+            filtro = {'codigo_curto': codigo}
+
+        if not shards.habilitado():
+            instance = get_object_or_404(self.get_queryset(), **filtro)
+        else:
+            # O código curto deriva do id, que indica o shard de origem
+            aliases = shards.shards() if 'codigo' in filtro else shards.candidatos(
+                Reserva, numero_codigo(filtro['codigo_curto']))
+            instance = shards.procurar(self.get_queryset(), aliases, **filtro)
+            if instance is None:
+                raise Http404
+        self.check_object_permissions(self.request, instance)
+        return instance
+
+    def get(self, request, codigo=None, format=None):
+        return self.retrieve(request, format=format)
+
+
+class PreReservaAPIView(
+        BloqueioImovelMixin,
+        AdmissaoMixin,
+        mixins.CreateModelMixin,
+        mixins.RetrieveModelMixin,
+        mixins.DestroyModelMixin,
+        generics.GenericAPIView):
+    """Pré-reservas (ver `apps/reservas/pre_reservas.py`): criadas com
+    `POST /api/pre-reservas`, consultadas (`GET`) e canceladas (`DELETE`)
+    pelo código e convertidas em reserva com
+    `POST /api/pre-reservas/<codigo>/confirmar`, que retorna a reserva."""
+    queryset = PreReserva.objects.all()
+    serializer_class = PreReservaSerializer
+    throttle_classes = [BaldeTokensThrottle]
+    throttle_escopo = 'pre_reservas'
+    # Quando True, o POST na url do código confirma a pré-reserva. Utilizado
+    # na url ".../confirmar"
+    confirmacao = False
+
+    def get_object(self):
+        try:
+            codigo = UUID(self.kwargs['codigo'])
+        except ValueError:
+            raise Http404
+
+        aliases = shards.shards() if shards.habilitado() else [PreReserva.objects.db]
+        instance = shards.procurar(
+            self.get_queryset().select_related('anuncio'), aliases, codigo=codigo)
+        if instance is None:
+            raise Http404
+        self.check_object_permissions(self.request, instance)
+        return instance
+
+    def get(self, request, codigo=None, format=None):
+        if codigo is None or self.confirmacao:
+            return self.http_method_not_allowed(request)
+        return self.retrieve(request, format=format)
+
+    def post(self, request, codigo=None, format=None):
+        if codigo is None:
+            return self.create(request, format=format)
+        if self.confirmacao:
+            return self.confirmar(request, format=format)
+        return self.http_method_not_allowed(request)
+
+    def delete(self, request, codigo=None, format=None):
+        if codigo is None or self.confirmacao:
+            return self.http_method_not_allowed(request)
+        return self.destroy(request, format=format)
+
+    def confirmar(self, request, format=None):
+        pre_reserva = self.get_object()
+        using = pre_reserva._state.db
+
+        with transaction.atomic(using=using):
+            bloquear_imovel(pre_reserva.anuncio.imovel_id, using)
+            # Relida com o imóvel bloqueado: uma requisição concorrente pode
+            # tê-la confirmado ou cancelado
+            pre_reserva = PreReserva.objects.using(using).filter(pk=pre_reserva.pk).first()
+            if pre_reserva is None:
+                raise Http404
+            if pre_reserva.expirada:
+                raise pre_reservas.PreReservaExpirada()
+
+            # O período ocupado pela própria pré-reserva não é um conflito
+            serializer = ReservaSerializer(
+                data=self.get_serializer(pre_reserva).dados_reserva(),
+                context={**self.get_serializer_context(), 'pre_reserva': pre_reserva.pk,
+                         'imovel_bloqueado': True})
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            pre_reserva.delete()
+
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class MudancaAPIView(generics.GenericAPIView):
+    """Feed de mudanças dos imóveis, anúncios e reservas.
+
+    O consumidor informa em `desde` a última sequência recebida e obtém
+    apenas as mudanças posteriores, em ordem. Com `espera` a requisição
+    aguarda (long-poll) até que novas mudanças sejam registradas. Clientes
+    que enviam `Accept: text/event-stream` recebem as mudanças via SSE,
+    podendo retomar a leitura pelo cabeçalho `Last-Event-ID`.
+
+    Sequências descartadas por transações revertidas geram lacunas, portanto
+    o consumidor deve sempre usar o valor de `proximo` retornado.
+
+    A sequência é atribuída no INSERT e não no COMMIT. No SQLite as escritas
+    são serializadas e a ordem das sequências é a ordem das confirmações. Em
+    bancos com escritas concorrentes uma sequência menor pode ser confirmada
+    depois de uma maior; `MUDANCAS_MARGEM` retém as mudanças mais recentes
+    que esse tempo para que o consumidor não avance sobre elas."""
+    serializer_class = MudancaSerializer
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, EventStreamRenderer]
+    # Quantidade máxima de mudanças retornadas por leitura
+    limite_maximo = 1000
+
+    def get_queryset(self):
+        return Mudanca.objects.order_by('id')
+
+    def parametro_inteiro(self, nome: str, padrao: int, valor: str = None) -> int:
+        """Parâmetro inteiro não negativo da query string ou, quando
+        informado, o `valor` (ex: um cabeçalho)"""
+        if valor is None:
+            valor = self.request.query_params.get(nome)
+        if valor in (None, ''):
+            return padrao
+        try:
+            valor = int(valor)
+        except ValueError:
+            valor = -1
+        if valor < 0:
+            raise ValidationError({nome: PARAMETRO_INVALIDO % {'parametro': nome}})
+        return valor
+
+    def buscar_mudancas(self, desde: int, limite: int, modelo: str = None) -> list:
+        queryset = self.get_queryset().filter(id__gt=desde)
+        if modelo:
+            queryset = queryset.filter(modelo=modelo)
+        mudancas = list(queryset[:limite])
+
+        if settings.MUDANCAS_MARGEM:
+            # Interrompe a leitura na primeira mudança recente demais: as
+            # sequências anteriores a ela podem não ter sido confirmadas
+            corte = timezone.now() - timedelta(seconds=settings.MUDANCAS_MARGEM)
+            visiveis = next((i for i, mudanca in enumerate(mudancas) if mudanca.data > corte), None)
+            if visiveis is not None:
+                mudancas = mudancas[:visiveis]
+        return mudancas
+
+    def get(self, request, format=None):
+        if not settings.MUDANCAS_FEED:
+            raise Http404
+        desde = self.parametro_inteiro(
+            'desde', self.parametro_inteiro(
+                'Last-Event-ID', 0, valor=request.META.get('HTTP_LAST_EVENT_ID', '')))
+        limite = min(self.parametro_inteiro('limite', 100), self.limite_maximo)
+        espera = min(self.parametro_inteiro('espera', 0), settings.MUDANCAS_ESPERA_MAXIMA)
+        modelo = request.query_params.get('modelo')
+
+        if isinstance(request.accepted_renderer, EventStreamRenderer):
+            return self.transmitir(desde, limite, modelo)
+
+        prazo = time.monotonic() + espera
+        while True:
+            mudancas = self.buscar_mudancas(desde, limite, modelo)
+            if mudancas or time.monotonic() >= prazo:
+                break
+            time.sleep(settings.MUDANCAS_INTERVALO_CONSULTA)
+
+        return Response({
+            'mudancas': self.get_serializer(mudancas, many=True).data,
+            'proximo': mudancas[-1].id if mudancas else desde
+        })
+
+    def transmitir(self, desde: int, limite: int, modelo: str = None) -> StreamingHttpResponse:
+        """Transmite as mudanças via Server-Sent Events. A conexão é encerrada
+        após `MUDANCAS_ESPERA_MAXIMA` segundos para não reter o worker
+        indefinidamente; o cliente reconecta informando o `Last-Event-ID`."""
+
+        def eventos(desde):
+            prazo = time.monotonic() + settings.MUDANCAS_ESPERA_MAXIMA
+            yield f'retry: {int(settings.MUDANCAS_INTERVALO_CONSULTA * 1000)}\n\n'
+
+            while True:
+                mudancas = self.buscar_mudancas(desde, limite, modelo)
+                for dados in self.get_serializer(mudancas, many=True).data:
+                    yield (f'id: {dados["seq"]}\nevent: mudanca\n'
+                           f'data: {json.dumps(dados, cls=DjangoJSONEncoder)}\n\n')
+
+                if time.monotonic() >= prazo:
+                    break
+
+                if mudancas:
+                    desde = mudancas[-1].id
+                else:
+                    # Comentário para manter a conexão aberta em proxies
+                    yield ': \n\n'
+                    time.sleep(settings.MUDANCAS_INTERVALO_CONSULTA)
+
+        response = StreamingHttpResponse(eventos(desde), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class JanelasDisponiveisAPIView(shards.ShardMixin, generics.GenericAPIView):
+    """Retorna as primeiras janelas livres de um imóvel para uma estadia de
+    `noites` noites e `hospedes` hóspedes entre `inicio` e `fim`.
+
+    As janelas são obtidas com uma única varredura ordenada sobre as reservas
+    do imóvel e o resultado é armazenado em cache associado à versão da
+    agenda do imóvel, que muda a cada escrita em suas reservas."""
+    serializer_class = ConsultaJanelasSerializer
+    queryset = Imovel.objects.all()
+    lookup_url_kwarg = 'pk'
+    throttle_classes = [BaldeTokensThrottle]
+    throttle_escopo = 'janelas'
+
+    def intervalos(self, imovel_id, inicio, fim):
+        """Intervalos reservados que podem afetar o período, ordenados pelo check-in"""
+        return Reserva.objects.using(shards.shard_do_imovel(imovel_id)).filter(
+            anuncio__imovel=imovel_id,
+            data_checkout__gte=inicio,
+            data_checkin__lte=fim).order_by('data_checkin').values_list(
+                'data_checkin', 'data_checkout').iterator()
+
+    def buscar_janelas(self, imovel, consulta) -> list:
+        if consulta['hospedes'] > imovel.capacidade:
+            return []
+
+        inclusivo = not checkout_disponivel()
+
+        if motor_habilitado():
+            return motor.janelas_livres(
+                imovel.pk, consulta['inicio'], consulta['fim'], consulta['noites'],
+                limite=consulta['limite'], inclusivo=inclusivo)
+
+        return janelas_livres(
+            self.intervalos(imovel.pk, consulta['inicio'], consulta['fim']),
+            consulta['inicio'], consulta['fim'], consulta['noites'],
+            limite=consulta['limite'], inclusivo=inclusivo)
+
+    def get(self, request, pk=None, format=None):
+        consulta = self.get_serializer(data=request.query_params)
+        consulta.is_valid(raise_exception=True)
+        consulta = consulta.validated_data
+
+        imovel = self.get_object()
+
+        chave = 'janelas:{}:{}:{}:{}'.format(
+            pk, *versao_agenda(imovel.pk),
+            ':'.join(str(consulta[campo]) for campo in ('noites', 'hospedes', 'inicio', 'fim', 'limite')))
+        janelas = cache.get(chave)
+        if janelas is None:
+            janelas = JanelaSerializer(self.buscar_janelas(imovel, consulta), many=True).data
+            cache.set(chave, janelas, settings.JANELAS_CACHE_TTL)
+
+        return Response({
+            'imovel': imovel.pk,
+            **self.get_serializer(consulta).data,
+            'janelas': janelas
+        })
+
+
+class BuscaAPIView(generics.GenericAPIView):
+    """Busca textual nos códigos dos imóveis e nos comentários das reservas
+    por um índice do banco de dados (ver `apps/reservas/busca.py`).
+
+    Os resultados são retornados em ordem de relevância e paginados com
+    `pagina` e `limite`. A quantidade total não é calculada, o que exigiria
+    percorrer todos os resultados; `proxima_pagina` é None na última página."""
+    serializer_class = ConsultaBuscaSerializer
+    throttle_classes = [BaldeTokensThrottle]
+    throttle_escopo = 'busca'
+    # Definidos nas urls
+    model = None
+    serializer_resultado = None
+
+    def get(self, request, format=None):
+        consulta = self.get_serializer(data=request.query_params)
+        consulta.is_valid(raise_exception=True)
+        consulta = consulta.validated_data
+
+        limite = consulta['limite']
+        # Um resultado a mais indica se há uma próxima página
+        encontrados = shards.buscar_em_shards(
+            self.model, consulta['q'], limite + 1, (consulta['pagina'] - 1) * limite)
+        proxima_pagina = consulta['pagina'] + 1 if len(encontrados) > limite else None
+        encontrados = encontrados[:limite]
+
+        # Os objetos são carregados do shard em que foram encontrados
+        por_shard = {}
+        for pk, _, alias in encontrados:
+            por_shard.setdefault(alias, []).append(pk)
+        objetos = {}
+        for alias, pks in por_shard.items():
+            objetos.update({
+                (alias, pk): objeto for pk, objeto in self.model.objects.using(alias).in_bulk(pks).items()})
+        encontrados = [
+            (objetos[alias, pk], relevancia)
+            for pk, relevancia, alias in encontrados if (alias, pk) in objetos]
+        dados = self.serializer_resultado([objeto for objeto, _ in encontrados], many=True).data
+
+        return Response({
+            'resultados': [
+                {**item, 'relevancia': relevancia}
+                for item, (_, relevancia) in zip(dados, encontrados)],
+            'pagina': consulta['pagina'],
+            'proxima_pagina': proxima_pagina
+        })
+
+
+class ExportacaoReservasAPIView(generics.GenericAPIView):
+    """Exporta as reservas, com os dados do anúncio e do imóvel, em Parquet
+    (`?formato=parquet`, padrão) ou Arrow IPC (`?formato=arrow`).
+
+    O arquivo é gerado em streaming, um record batch por vez, então a memória
+    utilizada não depende da quantidade de reservas."""
+    throttle_classes = [BaldeTokensThrottle]
+    throttle_escopo = 'exportacao'
+
+    def perform_content_negotiation(self, request, force=False):
+        # O formato é definido pelo parâmetro da url e não pelo Accept
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, format=None):
+        # Importado sob demanda, pois o pyarrow é a dependência mais pesada
+        # do projeto e só é utilizado nesta view
+        from . import exportacao
+
+        formato = request.query_params.get('formato', 'parquet')
+        if formato not in exportacao.FORMATOS:
+            raise ValidationError({'formato': EXPORTACAO_FORMATO_INVALIDO % {
+                'formatos': ', '.join(exportacao.FORMATOS)}})
+
+        if not exportacao.pyarrow_disponivel():
+            return Response(
+                {'detail': EXPORTACAO_INDISPONIVEL}, status=status.HTTP_501_NOT_IMPLEMENTED)
+
+        response = StreamingHttpResponse(
+            exportacao.exportar_streaming(formato),
+            content_type=exportacao.TIPOS_CONTEUDO[formato])
+        response['Content-Disposition'] = f'attachment; filename="reservas.{formato}"'
+        return response
+
+
+class DiagnosticoMemoriaAPIView(generics.GenericAPIView):
+    """Relatório de memória do processo que atendeu a requisição: memória
+    residente, memória rastreada pelo `tracemalloc` e, por endpoint, a
+    memória retida, o histórico das amostras e os locais de alocação que
+    mais cresceram (`?top=`). O DELETE descarta as medições.
+
+    Ver `apps.reservas.memoria` para habilitar o acompanhamento."""
+    permission_classes = [ClientesDiagnosticoPermission]
+
+    def get(self, request, format=None):
+        top = request.query_params.get('top')
+        if top is not None:
+            if not top.isdigit():
+                raise ValidationError({'top': PARAMETRO_INVALIDO % {'parametro': 'top'}})
+            top = int(top)
+        return Response(rastreador.relatorio(top))
 
+    def delete(self, request, format=None):
+        rastreador.limpar()
+        return Response(status=status.HTTP_204_NO_CONTENT)
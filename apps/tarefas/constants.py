@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+from django.utils.translation import gettext as _
+
+
+TAREFA_NAO_REGISTRADA = _(
+    'A função "%(funcao)s" não está registrada como tarefa.')
+
+TAREFA_TEMPO_ESGOTADO = _(
+    'A tarefa excedeu o tempo limite de execução e foi reagendada.')
+
+TAREFA_TEMPO_ESGOTADO_FALHA = _(
+    'A tarefa excedeu o tempo limite de execução e não possui mais tentativas.')
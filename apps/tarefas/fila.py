@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""Fila de tarefas armazenada no banco de dados.
+
+Funções decoradas com `@tarefa` podem ser enfileiradas e serão executadas
+pelo comando `manage.py worker`. A função recebe a instância da `Tarefa`
+como primeiro argumento, o que permite reportar o progresso da execução::
+
+    @tarefa(max_tentativas=5)
+    def reconstruir(tarefa, imovel_id):
+        ...
+        tarefa.atualizar_progresso(10, total=100)
+
+    reconstruir.enfileirar(imovel_id=1)
+"""
+import json
+import os
+import socket
+import threading
+import traceback
+
+from datetime import timedelta
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.response import Response
+
+from .constants import TAREFA_NAO_REGISTRADA, TAREFA_TEMPO_ESGOTADO, TAREFA_TEMPO_ESGOTADO_FALHA
+from .models import Tarefa
+
+
+# Funções registradas com o decorador `@tarefa`. Somente funções presentes
+# neste registro podem ser executadas pelos trabalhadores.
+REGISTRO = {}
+
+
+def _configuracao(nome, padrao):
+    return getattr(settings, nome, padrao)
+
+
+def identificar_trabalhador() -> str:
+    """Retorna o identificador do processo atual no formato host:pid"""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def tarefa(func: Callable = None, *, max_tentativas: int = 3):
+    """Registra uma função como tarefa. A função decorada ganha o
+    atributo `enfileirar`, que cria uma `Tarefa` com os argumentos
+    informados.
+
+    Args:
+        max_tentativas (int, optional): Quantidade de execuções permitidas
+        antes da tarefa ser marcada como falha. Defaults to 3.
+    """
+    def decorador(func):
+        caminho = f'{func.__module__}.{func.__qualname__}'
+        REGISTRO[caminho] = func
+
+        def enfileirar(executar_apos=None, **argumentos) -> Tarefa:
+            return enfileirar_tarefa(
+                caminho, argumentos, max_tentativas=max_tentativas,
+                executar_apos=executar_apos)
+
+        func.caminho_tarefa = caminho
+        func.enfileirar = enfileirar
+        return func
+
+    if func is not None:
+        return decorador(func)
+    return decorador
+
+
+def enfileirar_tarefa(funcao: str, argumentos: dict = None, max_tentativas: int = 3,
+                      executar_apos=None) -> Tarefa:
+    """Cria uma tarefa pendente para a função registrada em `funcao`.
+
+    Args:
+        funcao (str): Caminho pontuado da função.
+        argumentos (dict, optional): Argumentos nomeados, serializáveis em JSON. Defaults to None.
+        max_tentativas (int, optional): Quantidade máxima de execuções. Defaults to 3.
+        executar_apos (datetime, optional): Data mínima para a execução. Defaults to None.
+
+    Returns:
+        Tarefa: Tarefa criada.
+    """
+    return Tarefa.objects.create(
+        funcao=funcao,
+        argumentos=argumentos or {},
+        max_tentativas=max_tentativas,
+        executar_apos=executar_apos or timezone.now())
+
+
+def resolver_funcao(caminho: str) -> Callable:
+    """Importa a função da tarefa e certifica-se que ela foi registrada"""
+    if caminho not in REGISTRO:
+        # A importação do módulo executa o decorador e popula o registro
+        import_string(caminho)
+    if caminho not in REGISTRO:
+        raise LookupError(TAREFA_NAO_REGISTRADA % {'funcao': caminho})
+    return REGISTRO[caminho]
+
+
+def reservar_tarefa(trabalhador: str = None) -> Optional[Tarefa]:
+    """Reserva a próxima tarefa pendente da fila para o trabalhador.
+
+    Em bancos com suporte a `SKIP LOCKED` os trabalhadores não disputam
+    a mesma linha. Nos demais, a atualização condicional do status garante
+    que apenas um trabalhador obtenha a tarefa.
+
+    Returns:
+        Optional[Tarefa]: A tarefa reservada ou None caso a fila esteja vazia.
+    """
+    trabalhador = trabalhador or identificar_trabalhador()
+
+    while True:
+        agora = timezone.now()
+        with transaction.atomic():
+            fila = Tarefa.objects.filter(
+                status=Tarefa.Status.PENDENTE,
+                executar_apos__lte=agora).order_by('executar_apos', 'id')
+
+            if connection.features.has_select_for_update_skip_locked:
+                fila = fila.select_for_update(skip_locked=True)
+
+            pk = fila.values_list('pk', flat=True).first()
+            if pk is None:
+                return None
+
+            reservada = Tarefa.objects.filter(
+                pk=pk, status=Tarefa.Status.PENDENTE).update(
+                    status=Tarefa.Status.EXECUTANDO,
+                    tentativas=F('tentativas') + 1,
+                    trabalhador=trabalhador,
+                    data_inicio=agora,
+                    data_fim=None,
+                    data_atualizacao=agora)
+
+        if reservada:
+            return Tarefa.objects.get(pk=pk)
+        # Outro trabalhador obteve a tarefa primeiro, tentar a próxima
+
+
+def reagendar_tarefas_expiradas() -> int:
+    """Devolve à fila tarefas cujo trabalhador parou de responder, isto é,
+    que não receberam batimentos nem progresso (`data_atualizacao`) há mais
+    de `TAREFAS_TEMPO_LIMITE` segundos. Tarefas longas que continuam
+    enviando batimentos não são reagendadas.
+
+    Returns:
+        int: Quantidade de tarefas reagendadas.
+    """
+    limite = timezone.now() - timedelta(
+        seconds=_configuracao('TAREFAS_TEMPO_LIMITE', 600))
+    expiradas = Tarefa.objects.filter(
+        status=Tarefa.Status.EXECUTANDO, data_atualizacao__lt=limite)
+
+    falhas = expiradas.filter(tentativas__gte=F('max_tentativas')).update(
+        status=Tarefa.Status.FALHOU, erro=TAREFA_TEMPO_ESGOTADO_FALHA,
+        data_fim=timezone.now(), data_atualizacao=timezone.now())
+
+    return falhas + expiradas.filter(~Q(tentativas__gte=F('max_tentativas'))).update(
+        status=Tarefa.Status.PENDENTE, erro=TAREFA_TEMPO_ESGOTADO,
+        executar_apos=timezone.now(), data_atualizacao=timezone.now())
+
+
+def em_posse(tarefa: Tarefa):
+    """Filtro da tarefa enquanto ela continua reservada pela mesma execução
+    (trabalhador e tentativa). Uma tarefa reagendada e reservada novamente
+    deixa de pertencer à execução anterior, que não pode mais alterá-la."""
+    return Tarefa.objects.filter(
+        pk=tarefa.pk, status=Tarefa.Status.EXECUTANDO,
+        trabalhador=tarefa.trabalhador, tentativas=tarefa.tentativas)
+
+
+def registrar_batimento(tarefa: Tarefa) -> bool:
+    """Sinaliza que a execução da tarefa continua ativa.
+
+    Returns:
+        bool: False quando a tarefa não pertence mais a esta execução.
+    """
+    return bool(em_posse(tarefa).update(data_atualizacao=timezone.now()))
+
+
+class Batimento(threading.Thread):
+    """Envia batimentos a cada `TAREFAS_BATIMENTO` segundos enquanto a
+    tarefa é executada, para que tarefas longas não sejam consideradas
+    abandonadas"""
+
+    def __init__(self, tarefa: Tarefa):
+        super().__init__(name=f'batimento-tarefa-{tarefa.pk}', daemon=True)
+        self.tarefa = tarefa
+        self.parar = threading.Event()
+
+    def run(self):
+        intervalo = _configuracao('TAREFAS_BATIMENTO', 60)
+        try:
+            while not self.parar.wait(intervalo):
+                if not registrar_batimento(self.tarefa):
+                    return
+        finally:
+            # A conexão da thread não é reaproveitada
+            connection.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.parar.set()
+        self.join()
+
+
+def registrar_falha(tarefa: Tarefa, erro: str):
+    """Registra a falha da execução. Enquanto houverem tentativas disponíveis
+    a tarefa é reagendada com espera exponencial. Nada é registrado quando
+    a tarefa não pertence mais a esta execução (ver `em_posse`)."""
+    agora = timezone.now()
+    tarefa.erro = erro
+    tarefa.data_atualizacao = agora
+
+    if tarefa.tentativas < tarefa.max_tentativas:
+        espera = _configuracao('TAREFAS_ESPERA_BASE', 2) ** tarefa.tentativas
+        tarefa.status = Tarefa.Status.PENDENTE
+        tarefa.executar_apos = agora + timedelta(seconds=espera)
+    else:
+        tarefa.status = Tarefa.Status.FALHOU
+        tarefa.data_fim = agora
+
+    registrada = em_posse(tarefa).update(
+        status=tarefa.status, erro=erro, executar_apos=tarefa.executar_apos,
+        data_fim=tarefa.data_fim, data_atualizacao=agora)
+    if not registrada:
+        tarefa.refresh_from_db()
+
+
+def executar_tarefa(pk: int) -> str:
+    """Executa uma tarefa previamente reservada e registra o resultado.
+
+    Esta função é chamada dentro dos processos do pool do trabalhador,
+    por isso recebe apenas o id da tarefa. Durante a execução são enviados
+    batimentos (`Batimento`). Se a tarefa foi reagendada e reservada por
+    outra execução nesse meio tempo, o resultado é descartado.
+
+    Returns:
+        str: Status final da tarefa.
+    """
+    tarefa = Tarefa.objects.get(pk=pk)
+
+    try:
+        with Batimento(tarefa):
+            funcao = resolver_funcao(tarefa.funcao)
+            resultado = funcao(tarefa, **tarefa.argumentos)
+        # Um resultado que não pode ser gravado é uma falha da tarefa
+        json.dumps(resultado, cls=Tarefa._meta.get_field('resultado').encoder)
+    except Exception:
+        registrar_falha(tarefa, traceback.format_exc())
+        return tarefa.status
+
+    agora = timezone.now()
+    concluida = em_posse(tarefa).update(
+        status=Tarefa.Status.CONCLUIDA, resultado=resultado, erro=None,
+        progresso_atual=Coalesce('progresso_total', 'progresso_atual'),
+        data_fim=agora, data_atualizacao=agora)
+    if not concluida:
+        return Tarefa.objects.values_list('status', flat=True).get(pk=pk)
+
+    tarefa.status = Tarefa.Status.CONCLUIDA
+    tarefa.resultado = resultado
+    return tarefa.status
+
+
+def resposta_tarefa(tarefa: Tarefa) -> Response:
+    """Resposta padrão para endpoints que delegam o processamento
+    para a fila. Retorna 202 com o id e a url de acompanhamento da tarefa."""
+    url = reverse('tarefa_api_view', kwargs={'pk': tarefa.pk})
+    return Response({
+        'tarefa': tarefa.pk,
+        'status': tarefa.status,
+        'url': url
+    }, status=status.HTTP_202_ACCEPTED, headers={'Location': url})
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import multiprocessing
+import os
+import signal
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from apps.tarefas.fila import (
+    executar_tarefa,
+    identificar_trabalhador,
+    reagendar_tarefas_expiradas,
+    registrar_falha,
+    reservar_tarefa
+)
+from apps.tarefas import processo
+
+
+class Command(BaseCommand):
+    help = "Executa as tarefas enfileiradas utilizando um pool de processos."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processos', type=int, default=os.cpu_count() or 1,
+            help="Quantidade de processos do pool. Com 0 as tarefas são "
+                 "executadas no próprio processo do comando.")
+        parser.add_argument(
+            '--intervalo', type=float, default=1.0,
+            help="Intervalo, em segundos, entre as consultas à fila vazia.")
+        parser.add_argument(
+            '--uma-vez', action='store_true', dest='uma_vez',
+            help="Encerra o comando assim que a fila estiver vazia.")
+
+    def handle(self, *args, **options):
+        self.encerrar = False
+        signal.signal(signal.SIGTERM, self._sinal_encerramento)
+        signal.signal(signal.SIGINT, self._sinal_encerramento)
+
+        self.trabalhador = identificar_trabalhador()
+        processos = options['processos']
+
+        if processos <= 0:
+            self._executar_local(options)
+        else:
+            self._executar_pool(processos, options)
+
+    def _sinal_encerramento(self, signum, frame):
+        self.stdout.write("Aguardando as tarefas em execução para encerrar...")
+        self.encerrar = True
+
+    def _executar_local(self, options):
+        while not self.encerrar:
+            reagendar_tarefas_expiradas()
+            tarefa = reservar_tarefa(self.trabalhador)
+
+            if tarefa is None:
+                if options['uma_vez']:
+                    return
+                self._aguardar(options['intervalo'])
+                continue
+
+            status = executar_tarefa(tarefa.pk)
+            self.stdout.write(f"Tarefa {tarefa.pk} ({tarefa.funcao}): {status}")
+
+    def _executar_pool(self, processos, options):
+        contexto = multiprocessing.get_context('spawn')
+        em_execucao = {}
+
+        with ProcessPoolExecutor(
+                max_workers=processos, mp_context=contexto,
+                initializer=processo.inicializar) as pool:
+            while not self.encerrar or em_execucao:
+                fila_vazia = False
+                reagendar_tarefas_expiradas()
+
+                # Mantém o pool ocupado reservando uma tarefa por processo livre
+                while not self.encerrar and len(em_execucao) < processos:
+                    tarefa = reservar_tarefa(self.trabalhador)
+                    if tarefa is None:
+                        fila_vazia = True
+                        break
+                    try:
+                        futuro = pool.submit(processo.executar, tarefa.pk)
+                    except BrokenProcessPool as e:
+                        registrar_falha(tarefa, repr(e))
+                        raise
+                    em_execucao[futuro] = tarefa
+
+                if not em_execucao:
+                    if options['uma_vez'] and fila_vazia:
+                        return
+                    self._aguardar(options['intervalo'])
+                    continue
+
+                concluidas, _ = wait(
+                    em_execucao, timeout=options['intervalo'], return_when=FIRST_COMPLETED)
+
+                for futuro in concluidas:
+                    tarefa = em_execucao.pop(futuro)
+                    try:
+                        status = futuro.result()
+                    except Exception as e:
+                        # Falha do próprio processo (ex: encerrado pelo sistema)
+                        registrar_falha(tarefa, repr(e))
+                        status = tarefa.status
+                    self.stdout.write(f"Tarefa {tarefa.pk} ({tarefa.funcao}): {status}")
+
+        connections.close_all()
+
+    def _aguardar(self, intervalo):
+        # Fecha as conexões ociosas enquanto não há trabalho
+        connections.close_all()
+        time.sleep(intervalo)
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.3 on 2026-10-19 13:16
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarefa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_cadastro', models.DateTimeField(auto_now_add=True, verbose_name='Data de Cadastro')),
+                ('data_atualizacao', models.DateTimeField(auto_now=True, verbose_name='Data de Atualização')),
+                ('funcao', models.CharField(max_length=255, verbose_name='Função')),
+                ('argumentos', models.JSONField(blank=True, default=dict, verbose_name='Argumentos')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('executando', 'Executando'), ('concluida', 'Concluída'), ('falhou', 'Falhou')], default='pendente', max_length=20, verbose_name='Status')),
+                ('tentativas', models.PositiveSmallIntegerField(default=0, verbose_name='Tentativas')),
+                ('max_tentativas', models.PositiveSmallIntegerField(default=3, verbose_name='Máximo de Tentativas')),
+                ('progresso_atual', models.PositiveIntegerField(default=0, verbose_name='Progresso Atual')),
+                ('progresso_total', models.PositiveIntegerField(null=True, verbose_name='Progresso Total')),
+                ('resultado', models.JSONField(null=True, verbose_name='Resultado')),
+                ('erro', models.TextField(null=True, verbose_name='Erro')),
+                ('executar_apos', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Executar Após')),
+                ('data_inicio', models.DateTimeField(null=True, verbose_name='Início da Execução')),
+                ('data_fim', models.DateTimeField(null=True, verbose_name='Fim da Execução')),
+                ('trabalhador', models.CharField(max_length=255, null=True, verbose_name='Trabalhador')),
+            ],
+            options={
+                'verbose_name': 'Tarefa',
+                'verbose_name_plural': 'Tarefas',
+                'indexes': [models.Index(fields=['status', 'executar_apos'], name='tarefa_fila_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-19 13:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tarefas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tarefa',
+            name='data_atualizacao',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Data de Atualização'),
+        ),
+    ]
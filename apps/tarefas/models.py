@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+from django.db import models
+from django.db.models import F
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from apps.reservas.models import ModeloAuditavel
+
+
+class Tarefa(ModeloAuditavel):
+    """Modelo que armazena as tarefas executadas em segundo plano pelo
+    comando `worker`. A própria tabela funciona como fila, dispensando
+    a necessidade de um broker externo."""
+
+    class Status(models.TextChoices):
+        PENDENTE = 'pendente', _('Pendente')
+        EXECUTANDO = 'executando', _('Executando')
+        CONCLUIDA = 'concluida', _('Concluída')
+        FALHOU = 'falhou', _('Falhou')
+
+    # Caminho pontuado da função registrada com o decorador `@tarefa`
+    funcao = models.CharField(_("Função"), max_length=255)
+    argumentos = models.JSONField(_("Argumentos"), default=dict, blank=True)
+    status = models.CharField(
+        _("Status"), max_length=20, choices=Status.choices, default=Status.PENDENTE)
+    tentativas = models.PositiveSmallIntegerField(_("Tentativas"), default=0)
+    max_tentativas = models.PositiveSmallIntegerField(_("Máximo de Tentativas"), default=3)
+    progresso_atual = models.PositiveIntegerField(_("Progresso Atual"), default=0)
+    progresso_total = models.PositiveIntegerField(_("Progresso Total"), null=True)
+    resultado = models.JSONField(_("Resultado"), null=True)
+    erro = models.TextField(_("Erro"), null=True)
+    executar_apos = models.DateTimeField(_("Executar Após"), default=timezone.now)
+    data_inicio = models.DateTimeField(_("Início da Execução"), null=True)
+    data_fim = models.DateTimeField(_("Fim da Execução"), null=True)
+    # Identificação do processo que reservou a tarefa (host:pid)
+    trabalhador = models.CharField(_("Trabalhador"), max_length=255, null=True)
+
+    class Meta:
+        verbose_name = _("Tarefa")
+        verbose_name_plural = _("Tarefas")
+        indexes = (
+            # Índice usado pelos trabalhadores para encontrar a próxima tarefa
+            models.Index(
+                fields=['status', 'executar_apos'], name='tarefa_fila_idx'),)
+
+    def __str__(self):
+        return f'{self._meta.verbose_name}: {self.funcao} ({self.status})'
+
+    @property
+    def percentual(self):
+        if not self.progresso_total:
+            return None
+        return round(100 * self.progresso_atual / self.progresso_total, 2)
+
+    def atualizar_progresso(self, atual: int, total: int = None):
+        """Atualiza o progresso da tarefa sem sobrescrever os demais campos.
+
+        Args:
+            atual (int): Quantidade de itens processados.
+            total (int, optional): Quantidade total de itens. Defaults to None.
+        """
+        valores = {'progresso_atual': atual, 'data_atualizacao': timezone.now()}
+        if total is not None:
+            valores['progresso_total'] = total
+        Tarefa.objects.filter(pk=self.pk).update(**valores)
+
+        for campo, valor in valores.items():
+            setattr(self, campo, valor)
+
+    def incrementar_progresso(self, quantidade: int = 1):
+        """Incrementa o progresso de forma atômica no banco de dados."""
+        Tarefa.objects.filter(pk=self.pk).update(
+            progresso_atual=F('progresso_atual') + quantidade,
+            data_atualizacao=timezone.now())
+        self.progresso_atual += quantidade
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""Funções executadas nos processos do pool do comando `worker`.
+
+Os processos são criados com o método `spawn` para que nenhuma conexão
+com o banco de dados seja compartilhada com o processo principal. Por isso
+este módulo não pode importar modelos antes de `django.setup()` ser chamado.
+"""
+import signal
+
+
+def inicializar():
+    """Inicializa o Django no processo do pool"""
+    import django
+    django.setup()
+    # O encerramento é coordenado pelo processo principal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def executar(pk: int) -> str:
+    """Executa a tarefa com o id informado e retorna seu status final"""
+    from .fila import executar_tarefa
+    return executar_tarefa(pk)
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+from rest_framework import serializers
+
+from .models import Tarefa
+
+
+class TarefaSerializer(serializers.ModelSerializer):
+    percentual = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Tarefa
+        fields = (
+            'id', 'funcao', 'status', 'tentativas', 'max_tentativas',
+            'progresso_atual', 'progresso_total', 'percentual', 'resultado',
+            'erro', 'executar_apos', 'data_inicio', 'data_fim',
+            'data_cadastro', 'data_atualizacao')
+        read_only_fields = fields
@@ -0,0 +1,173 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.tarefas.constants import TAREFA_TEMPO_ESGOTADO, TAREFA_TEMPO_ESGOTADO_FALHA
+from apps.tarefas.fila import (
+    enfileirar_tarefa,
+    executar_tarefa,
+    reagendar_tarefas_expiradas,
+    registrar_batimento,
+    reservar_tarefa,
+    resposta_tarefa,
+    tarefa
+)
+from apps.tarefas.models import Tarefa
+
+
+@tarefa
+def somar(tarefa, a, b):
+    tarefa.atualizar_progresso(1, total=2)
+    return a + b
+
+
+@tarefa(max_tentativas=2)
+def falhar(tarefa):
+    raise RuntimeError("Falha esperada")
+
+
+@tarefa
+def reservada_por_outro(tarefa):
+    # Simula o reagendamento e a reserva da tarefa por outro trabalhador
+    # enquanto esta execução ainda está em andamento
+    Tarefa.objects.filter(pk=tarefa.pk).update(
+        trabalhador='outro:1', tentativas=tarefa.tentativas + 1)
+    return 'descartado'
+
+
+@tarefa(max_tentativas=1)
+def resultado_invalido(tarefa):
+    return {'valor': object()}
+
+
+def nao_registrada(tarefa):
+    return None
+
+
+class FilaTarefasTestCase(TestCase):
+
+    def test_enfileirar_e_executar(self):
+        criada = somar.enfileirar(a=1, b=2)
+        self.assertEqual(criada.status, Tarefa.Status.PENDENTE)
+
+        call_command('worker', processos=0, uma_vez=True, stdout=StringIO())
+
+        criada.refresh_from_db()
+        self.assertEqual(criada.status, Tarefa.Status.CONCLUIDA)
+        self.assertEqual(criada.resultado, 3)
+        self.assertEqual(criada.tentativas, 1)
+        self.assertEqual(criada.progresso_atual, 2)
+        self.assertEqual(criada.percentual, 100)
+
+    def test_reserva_respeita_agendamento(self):
+        somar.enfileirar(a=1, b=1, executar_apos=timezone.now() + timedelta(hours=1))
+        self.assertIsNone(reservar_tarefa())
+
+        agendada = somar.enfileirar(a=1, b=1)
+        reservada = reservar_tarefa()
+        self.assertEqual(reservada.pk, agendada.pk)
+        self.assertEqual(reservada.status, Tarefa.Status.EXECUTANDO)
+
+        # A tarefa reservada não pode ser obtida por outro trabalhador
+        self.assertIsNone(reservar_tarefa())
+
+    def test_tentativas(self):
+        criada = falhar.enfileirar()
+
+        executar_tarefa(reservar_tarefa().pk)
+        criada.refresh_from_db()
+        self.assertEqual(criada.status, Tarefa.Status.PENDENTE)
+        self.assertIn("Falha esperada", criada.erro)
+        self.assertGreater(criada.executar_apos, timezone.now())
+
+        Tarefa.objects.filter(pk=criada.pk).update(executar_apos=timezone.now())
+        executar_tarefa(reservar_tarefa().pk)
+        criada.refresh_from_db()
+        self.assertEqual(criada.status, Tarefa.Status.FALHOU)
+        self.assertEqual(criada.tentativas, 2)
+
+    def test_resultado_nao_serializavel(self):
+        criada = resultado_invalido.enfileirar()
+        self.assertEqual(executar_tarefa(reservar_tarefa().pk), Tarefa.Status.FALHOU)
+        criada.refresh_from_db()
+        self.assertEqual(criada.status, Tarefa.Status.FALHOU)
+        self.assertIn("TypeError", criada.erro)
+
+    def test_funcao_nao_registrada(self):
+        criada = enfileirar_tarefa(
+            f'{__name__}.nao_registrada', max_tentativas=1)
+        executar_tarefa(reservar_tarefa().pk)
+        criada.refresh_from_db()
+        self.assertEqual(criada.status, Tarefa.Status.FALHOU)
+        self.assertIn("LookupError", criada.erro)
+
+    def test_reagendar_expiradas(self):
+        criada = somar.enfileirar(a=1, b=1)
+        reservar_tarefa()
+        Tarefa.objects.filter(pk=criada.pk).update(
+            data_inicio=timezone.now() - timedelta(days=1),
+            data_atualizacao=timezone.now() - timedelta(days=1))
+
+        self.assertEqual(reagendar_tarefas_expiradas(), 1)
+        criada.refresh_from_db()
+        self.assertEqual(criada.status, Tarefa.Status.PENDENTE)
+        self.assertEqual(criada.erro, TAREFA_TEMPO_ESGOTADO)
+
+        # Sem tentativas restantes a tarefa falha com outra mensagem
+        Tarefa.objects.filter(pk=criada.pk).update(max_tentativas=2)
+        reservar_tarefa()
+        Tarefa.objects.filter(pk=criada.pk).update(
+            data_atualizacao=timezone.now() - timedelta(days=1))
+        self.assertEqual(reagendar_tarefas_expiradas(), 1)
+        criada.refresh_from_db()
+        self.assertEqual(criada.status, Tarefa.Status.FALHOU)
+        self.assertEqual(criada.erro, TAREFA_TEMPO_ESGOTADO_FALHA)
+
+    def test_batimento_evita_reagendamento(self):
+        criada = somar.enfileirar(a=1, b=1)
+        reservada = reservar_tarefa()
+        Tarefa.objects.filter(pk=criada.pk).update(
+            data_inicio=timezone.now() - timedelta(days=1),
+            data_atualizacao=timezone.now() - timedelta(days=1))
+
+        # Uma tarefa longa que continua enviando batimentos não é reagendada
+        self.assertTrue(registrar_batimento(reservada))
+        self.assertEqual(reagendar_tarefas_expiradas(), 0)
+        criada.refresh_from_db()
+        self.assertEqual(criada.status, Tarefa.Status.EXECUTANDO)
+
+    def test_execucao_sem_posse(self):
+        criada = reservada_por_outro.enfileirar()
+        reservada = reservar_tarefa()
+        self.assertEqual(executar_tarefa(reservada.pk), Tarefa.Status.EXECUTANDO)
+
+        # O resultado da execução anterior é descartado
+        criada.refresh_from_db()
+        self.assertEqual(criada.status, Tarefa.Status.EXECUTANDO)
+        self.assertEqual(criada.trabalhador, 'outro:1')
+        self.assertIsNone(criada.resultado)
+        self.assertFalse(registrar_batimento(reservada))
+
+    def test_api_status(self):
+        criada = somar.enfileirar(a=2, b=2)
+
+        response = resposta_tarefa(criada)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['tarefa'], criada.pk)
+
+        response = self.client.get(response['Location'], headers={"Accept": "application/json"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], Tarefa.Status.PENDENTE)
+
+        response = self.client.get(
+            reverse('tarefa_api_view'), {'status': 'pendente'},
+            headers={"Accept": "application/json"})
+        self.assertEqual([t['id'] for t in response.json()], [criada.pk])
+
+        # Tarefas não podem ser criadas pela API
+        response = self.client.post(reverse('tarefa_api_view'), data={})
+        self.assertEqual(response.status_code, 405)
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+
+from django.urls import re_path
+from . import views
+
+urlpatterns = [
+    #
+    re_path(r'tarefas/?$',
+        views.TarefaAPIView.as_view(), name="tarefa_api_view"),
+    re_path(r'tarefas/(?P<pk>[0-9]+)/?$',
+        views.TarefaAPIView.as_view(), name="tarefa_api_view"),
+]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from rest_framework import mixins
+from rest_framework import generics
+
+from .models import Tarefa
+from .serializers import TarefaSerializer
+
+
+class TarefaAPIView(
+        mixins.ListModelMixin,
+        mixins.RetrieveModelMixin,
+        generics.GenericAPIView):
+    """Permite acompanhar o status e o progresso das tarefas. As tarefas são
+    criadas apenas pelos endpoints que delegam processamento para a fila,
+    por isso esta view é somente leitura."""
+    serializer_class = TarefaSerializer
+    lookup_url_kwarg = 'pk'
+
+    def get_queryset(self):
+        queryset = Tarefa.objects.order_by('-id')
+        status = self.request.query_params.get('status')
+        if status:
+            queryset = queryset.filter(status=status)
+        return queryset
+
+    def get(self, request, pk=None, format=None):
+        if pk:
+            return self.retrieve(request, format=format)
+        return self.list(request, format=format)
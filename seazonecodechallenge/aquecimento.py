@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Aquecimento dos workers.
+
+A primeira requisição de um worker novo monta as expressões regulares das
+urls, os campos dos serializers, os caches de metadados dos modelos, as
+configurações do DRF e os catálogos de tradução, além de abrir a conexão
+com o banco. `aquecer` realiza esse trabalho antecipadamente e é chamada
+pelos módulos `wsgi` e `asgi` após a criação da aplicação.
+
+Com servidores que carregam a aplicação antes do fork (`gunicorn --preload`,
+por exemplo) as estruturas aquecidas são compartilhadas entre os workers por
+copy-on-write. Para que as páginas compartilhadas não sejam copiadas pela
+coleta de lixo de cada worker, os objetos existentes são movidos para a
+geração permanente com `gc.freeze`. Sem o preload cada worker se aquece ao
+inicializar, antes de atender a primeira requisição.
+"""
+import gc
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.urls import URLResolver, get_resolver
+from django.utils import translation
+from rest_framework.settings import api_settings
+
+
+def aquecer(banco: bool = True, congelar_gc: bool = True):
+    """Pré-computa os caches usados pelas requisições.
+
+    Args:
+        banco (bool): Abre e fecha as conexões com os bancos, inicializando
+            as informações do servidor que o Django mantém em cache. As
+            conexões não permanecem abertas, pois não podem ser
+            compartilhadas entre os processos criados pelo fork.
+        congelar_gc (bool): Move os objetos existentes para a geração
+            permanente da coleta de lixo.
+    """
+    aquecer_modelos()
+    views = aquecer_urls()
+    aquecer_serializers(views)
+    aquecer_drf()
+
+    # Os catálogos de tradução são carregados na primeira mensagem traduzida
+    with translation.override(settings.LANGUAGE_CODE):
+        translation.gettext('')
+
+    if banco:
+        aquecer_banco()
+
+    if congelar_gc:
+        gc.collect()
+        gc.freeze()
+
+
+def aquecer_modelos():
+    """Preenche os caches de campos e relações do `_meta` dos modelos"""
+    for model in apps.get_models():
+        opcoes = model._meta
+        opcoes.get_fields()
+        opcoes.concrete_fields
+        opcoes.local_concrete_fields
+        opcoes.related_objects
+        opcoes.fields_map
+        opcoes._forward_fields_map
+        opcoes._property_names
+        opcoes.db_returning_fields
+
+
+def aquecer_urls(resolver: URLResolver = None) -> list:
+    """Compila as expressões regulares de todas as urls e monta os índices
+    usados por `reverse`.
+
+    Returns:
+        list: Classes das views roteadas.
+    """
+    if resolver is None:
+        resolver = get_resolver()
+        # Também importa os módulos de urls incluídos
+        resolver.reverse_dict
+
+    views = []
+    resolver.pattern.regex
+    for padrao in resolver.url_patterns:
+        if isinstance(padrao, URLResolver):
+            views.extend(aquecer_urls(padrao))
+            continue
+        padrao.pattern.regex
+        view_class = getattr(padrao.callback, 'view_class', None)
+        if view_class is not None and view_class not in views:
+            views.append(view_class)
+    return views
+
+
+def aquecer_serializers(views: list):
+    """Preenche o cache de campos dos serializers das views"""
+    for view_class in views:
+        serializer_class = getattr(view_class, 'serializer_class', None)
+        aquecer_campos = getattr(serializer_class, 'aquecer_campos', None)
+        if aquecer_campos is not None:
+            aquecer_campos()
+
+
+def aquecer_drf():
+    """Importa as classes das configurações do DRF, que são carregadas no
+    primeiro acesso a cada configuração"""
+    for nome in api_settings.defaults:
+        getattr(api_settings, nome)
+
+
+def aquecer_banco():
+    for conexao in connections.all():
+        conexao.ensure_connection()
+    connections.close_all()
@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'seazonecodechallenge.settings')
 
 application = get_asgi_application()
+
+# Aquece os caches do worker antes do fork (ver `seazonecodechallenge/aquecimento.py`)
+if settings.AQUECIMENTO_WORKERS:
+    from seazonecodechallenge.aquecimento import aquecer
+
+    aquecer()
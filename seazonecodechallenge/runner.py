@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""Executor dos testes do projeto.
+
+Em relação ao `DiscoverRunner` padrão do Django:
+
+* As fixtures de `TESTES_FIXTURES` são carregadas uma única vez no banco de
+  testes padrão, antes dele ser clonado para os processos do `--parallel`.
+  Os `TestCase` partem desses dados e as alterações de cada teste são
+  revertidas pela transação do próprio `TestCase`, então as classes de
+  teste não precisam declarar `fixtures`. Os demais bancos (ex: os shards)
+  partem vazios.
+* O tempo de cada teste é medido, inclusive nos processos do `--parallel`.
+  Os testes mais lentos são listados ao final (`--tempos`) e o relatório
+  completo pode ser gravado em JSON (`--relatorio-tempos`).
+"""
+import json
+import time
+import unittest
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.runner import DiscoverRunner, ParallelTestSuite, RemoteTestResult, RemoteTestRunner
+from django.test.utils import get_unique_databases_and_mirrors, setup_databases
+
+
+class ResultadoRemotoComTempos(RemoteTestResult):
+    """Resultado dos processos do `--parallel`. O tempo é medido no processo
+    que executou o teste e enviado ao processo principal como um evento
+    `addDuration`, pois os demais eventos só chegam ao processo principal
+    quando o lote de testes termina."""
+
+    def startTest(self, test):
+        self._inicio_teste = time.perf_counter()
+        super().startTest(test)
+
+    def stopTest(self, test):
+        self.events.append(
+            ("addDuration", self.test_index, time.perf_counter() - self._inicio_teste))
+        super().stopTest(test)
+
+    def addDuration(self, test, elapsed):
+        # No Python 3.12+ o unittest também informa a duração, que já é
+        # medida em `stopTest`
+        pass
+
+
+class ExecutorRemotoComTempos(RemoteTestRunner):
+    resultclass = ResultadoRemotoComTempos
+
+
+class SuiteParalelaComTempos(ParallelTestSuite):
+    runner_class = ExecutorRemotoComTempos
+
+
+class ResultadoComTempos(unittest.TextTestResult):
+    """Resultado que registra a duração de cada teste em `tempos`"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tempos = {}
+        self._inicios = {}
+
+    def startTest(self, test):
+        self._inicios[test.id()] = time.perf_counter()
+        super().startTest(test)
+
+    def addDuration(self, test, elapsed):
+        self.tempos[test.id()] = elapsed
+
+    def stopTest(self, test):
+        inicio = self._inicios.pop(test.id(), None)
+        # Nos testes paralelos a duração já foi informada pelo processo do teste
+        if test.id() not in self.tempos and inicio is not None:
+            self.tempos[test.id()] = time.perf_counter() - inicio
+        super().stopTest(test)
+
+
+class ExecutorTestes(DiscoverRunner):
+    parallel_test_suite = SuiteParalelaComTempos
+
+    def __init__(self, tempos=10, relatorio_tempos=None, **kwargs):
+        super().__init__(**kwargs)
+        self.tempos = tempos
+        self.relatorio_tempos = relatorio_tempos
+
+    @classmethod
+    def add_arguments(cls, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--tempos', type=int, default=10, metavar='N',
+            help="Lista os N testes mais lentos ao final da execução. Com 0 a lista é omitida.")
+        parser.add_argument(
+            '--relatorio-tempos', dest='relatorio_tempos', metavar='ARQUIVO',
+            help="Grava a duração de todos os testes em um arquivo JSON.")
+
+    def get_resultclass(self):
+        # Os resultados de depuração (--debug-sql, --pdb) têm prioridade
+        return super().get_resultclass() or ResultadoComTempos
+
+    def setup_databases(self, **kwargs):
+        # Os bancos são criados sem os clones do --parallel, que só são
+        # gerados depois da carga das fixtures compartilhadas
+        configuracoes = setup_databases(
+            self.verbosity, self.interactive, time_keeper=self.time_keeper,
+            keepdb=self.keepdb, debug_sql=self.debug_sql, parallel=0, **kwargs)
+
+        self.carregar_fixtures(kwargs.get('aliases'))
+
+        if self.parallel > 1:
+            bancos, _ = get_unique_databases_and_mirrors(kwargs.get('aliases'))
+            for _, aliases in bancos.values():
+                # Aliases que apontam para o mesmo banco compartilham os clones
+                alias = next(iter(aliases))
+                for indice in range(self.parallel):
+                    with self.time_keeper.timed(f"  Cloning '{alias}'"):
+                        connections[alias].creation.clone_test_db(
+                            suffix=str(indice + 1), verbosity=self.verbosity,
+                            keepdb=self.keepdb)
+        return configuracoes
+
+    def carregar_fixtures(self, aliases):
+        # Importado aqui pois os modelos só podem ser carregados após o setup do Django
+        from apps.reservas.carga import carregar_fixture
+
+        fixtures = getattr(settings, 'TESTES_FIXTURES', [])
+        if not fixtures or (aliases is not None and DEFAULT_DB_ALIAS not in aliases):
+            return
+
+        alias = DEFAULT_DB_ALIAS
+        with self.time_keeper.timed(f"  Loading fixtures '{alias}'"):
+            for fixture in fixtures:
+                carregar_fixture(fixture, using=alias)
+
+        # O conteúdo usado pelo `serialized_rollback` passa a incluir as fixtures
+        conexao = connections[alias]
+        if getattr(conexao, '_test_serialized_contents', None) is not None:
+            conexao._test_serialized_contents = conexao.creation.serialize_db_to_string()
+
+    def run_suite(self, suite, **kwargs):
+        resultado = super().run_suite(suite, **kwargs)
+        tempos = getattr(resultado, 'tempos', None)
+        if tempos:
+            self.reportar_tempos(tempos)
+        return resultado
+
+    def reportar_tempos(self, tempos: dict):
+        if self.tempos:
+            mais_lentos = sorted(tempos.items(), key=lambda item: item[1], reverse=True)
+            self.log(f"\n{self.tempos} testes mais lentos "
+                     f"(total {sum(tempos.values()):.2f} s):")
+            for teste, duracao in mais_lentos[:self.tempos]:
+                self.log(f"  {duracao:8.3f} s  {teste}")
+
+        if self.relatorio_tempos:
+            with open(self.relatorio_tempos, 'w', encoding='utf-8') as arquivo:
+                json.dump(tempos, arquivo, indent=2, sort_keys=True)
@@ -10,6 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
+import sys
+
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -38,11 +41,14 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
-    'apps.reservas'
+    'apps.reservas',
+    'apps.tarefas'
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'apps.reservas.middleware.CompressaoMiddleware',
+    'apps.reservas.memoria.MemoriaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -79,9 +85,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
 }
 
+DATABASE_ROUTERS = ['apps.reservas.shards.RoteadorShards']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -124,3 +132,224 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+
+# Fila de tarefas
+# Tempo, em segundos, que uma tarefa em execução pode ficar sem sinais do seu
+# trabalhador (batimentos ou progresso) antes de ser considerada abandonada e
+# devolvida à fila.
+TAREFAS_TEMPO_LIMITE = 600
+
+# Intervalo, em segundos, entre os batimentos enviados durante a execução de
+# uma tarefa. Deve ser menor que TAREFAS_TEMPO_LIMITE.
+TAREFAS_BATIMENTO = 60
+
+# Base da espera exponencial, em segundos, entre as tentativas de uma tarefa.
+TAREFAS_ESPERA_BASE = 2
+
+
+# Feed de mudanças
+# Quando False, `/api/mudancas` responde 404. Precisa ser False com mais de um
+# shard em SHARDS, já que o feed lê o log de um único banco.
+MUDANCAS_FEED = True
+
+# Tempo máximo, em segundos, que uma leitura do feed pode aguardar por novas
+# mudanças (long-poll) ou manter a transmissão SSE aberta.
+MUDANCAS_ESPERA_MAXIMA = 30
+
+# Intervalo, em segundos, entre as consultas ao log enquanto não há mudanças.
+MUDANCAS_INTERVALO_CONSULTA = 0.5
+
+# Idade mínima, em segundos, das mudanças entregues pelo feed. No SQLite as
+# escritas são serializadas e as sequências são confirmadas em ordem, então
+# nenhuma margem é necessária. Em bancos com escritas concorrentes use um
+# valor maior que a transação de escrita mais longa.
+MUDANCAS_MARGEM = 0
+
+
+# Sincronização incremental
+# Recuo, em segundos, da marca d'água retornada pela sincronização para
+# cobrir escritas confirmadas após a leitura.
+SINCRONIZACAO_MARGEM = 1
+
+
+# Busca em lote
+# Quantidade máxima de ids aceitos em uma busca em lote (`?ids=` ou `.../lote`).
+LOTE_LIMITE = 500
+
+# Quantidade máxima de objetos removidos dentro da requisição. Remoções maiores
+# são delegadas para a fila de tarefas.
+LOTE_REMOCAO_SINCRONA = 1000
+
+
+# Motor de disponibilidade
+# Quando True, a checagem de conflitos das reservas usa as agendas em memória
+# (`apps.reservas.disponibilidade`) em vez de consultar o banco de dados.
+# Em produção com vários processos, configure um CACHES compartilhado para que
+# as versões das agendas sejam invalidadas em todos eles.
+DISPONIBILIDADE_MOTOR = False
+
+# Quantidade máxima de agendas de imóveis mantidas em memória por processo.
+DISPONIBILIDADE_MAX_IMOVEIS = 10000
+
+
+# Janelas livres
+# Horizonte padrão, em dias, da busca por janelas livres de um imóvel.
+JANELAS_HORIZONTE_PADRAO = 180
+
+# Tempo, em segundos, que o resultado de uma busca permanece em cache. O cache
+# também é invalidado quando as reservas do imóvel mudam.
+JANELAS_CACHE_TTL = 300
+
+
+# Limitação de requisições
+# Taxas, no formato do DRF, aplicadas por cliente às views de imóveis,
+# anúncios e reservas. A chave "<escopo>:<operacao>" tem prioridade sobre a
+# chave da operação. Operações sem taxa não são limitadas.
+THROTTLE_TAXAS = {
+    'leitura': '1200/min',
+    'escrita': '300/min',
+    'reservas:escrita': '120/min',
+    'janelas:leitura': '300/min',
+    'exportacao:leitura': '30/hour',
+}
+
+# "local" mantém os baldes na memória de cada processo; "cache" os
+# compartilha entre processos através do backend de CACHES.
+THROTTLE_BACKEND = 'local'
+
+
+# Compressão das respostas
+# Tamanho mínimo, em bytes, para que uma resposta seja comprimida. Respostas
+# em streaming são sempre comprimidas quando o cliente aceita.
+COMPRESSAO_TAMANHO_MINIMO = 1024
+
+
+# Perfilamento sob demanda
+# Chave usada para assinar os tokens que habilitam o perfilamento de uma
+# requisição (ver `apps/reservas/perfilamento.py`). Com None o perfilamento
+# fica desabilitado.
+PERFILAMENTO_CHAVE = None
+
+# Tempo, em segundos, de validade de um token de perfilamento.
+PERFILAMENTO_VALIDADE = 300
+
+# Endereços ou redes (ex: "10.0.0.0/8") autorizados a solicitar o perfilamento,
+# além de possuir um token válido. Com a lista vazia qualquer cliente com um
+# token válido é autorizado.
+PERFILAMENTO_CLIENTES = []
+
+# Diretório onde os perfis são gravados.
+PERFILAMENTO_DIRETORIO = BASE_DIR / 'perfis'
+
+# Intervalo, em segundos, entre as amostras do modo "amostragem".
+PERFILAMENTO_INTERVALO_AMOSTRAGEM = 0.001
+
+
+# Acompanhamento de memória
+# Fração das requisições em que um snapshot do tracemalloc é registrado (ver
+# `apps/reservas/memoria.py`). Com 0 o acompanhamento fica desabilitado e o
+# tracemalloc não é iniciado.
+MEMORIA_TAXA_AMOSTRAGEM = 0
+
+# Quantidade de quadros da pilha guardados por alocação.
+MEMORIA_QUADROS = 1
+
+# Quantidade de amostras mantidas por endpoint.
+MEMORIA_HISTORICO = 100
+
+# Quantidade de locais de alocação listados por endpoint no relatório.
+MEMORIA_TOP = 10
+
+# Endereços ou redes autorizados a acessar os endpoints de diagnóstico.
+DIAGNOSTICOS_CLIENTES = ['127.0.0.1', '::1']
+
+
+# Coalescência de requisições
+# Quando True, GETs idênticos e simultâneos às views de imóveis, anúncios e
+# reservas compartilham uma única execução da consulta e da serialização
+# (ver `apps/reservas/coalescencia.py`).
+COALESCENCIA_REQUISICOES = True
+
+# Cabeçalhos que alteram a resposta e, junto com o método, o host e a url,
+# compõem a chave das requisições coalescidas.
+COALESCENCIA_CABECALHOS = ['Accept', 'Accept-Language']
+
+# Tempo máximo, em segundos, que uma requisição aguarda a execução
+# compartilhada antes de executar a view por conta própria.
+COALESCENCIA_ESPERA = 10
+
+
+# Controle de admissão das escritas
+# Quando True, as escritas das views de imóveis, anúncios e reservas passam
+# por um limitador de concorrência adaptativo por processo (ver
+# `apps/reservas/admissao.py`) e são recusadas com 503 e Retry-After quando
+# não podem ser atendidas dentro de `ADMISSAO_ESPERA`.
+ADMISSAO_ESCRITAS = True
+
+# Limites inicial, mínimo e máximo de escritas simultâneas por escopo. O
+# limite é ajustado entre o mínimo e o máximo conforme a latência observada.
+ADMISSAO_LIMITE_INICIAL = 10
+ADMISSAO_LIMITE_MINIMO = 1
+ADMISSAO_LIMITE_MAXIMO = 100
+
+# Quantidade máxima de escritas aguardando uma vaga, por escopo.
+ADMISSAO_FILA = 100
+
+# Tempo máximo, em segundos, que uma escrita aguarda na fila. Deve ser menor
+# que o tempo limite do proxy.
+ADMISSAO_ESPERA = 5
+
+# Razão entre a latência de uma escrita e a menor latência observada a partir
+# da qual o banco é considerado congestionado e o limite é reduzido.
+ADMISSAO_TOLERANCIA = 3
+
+
+# Sharding
+# Aliases de DATABASES que armazenam os imóveis, anúncios e reservas. Cada
+# imóvel fica em um único shard, com os seus anúncios e reservas (ver
+# `apps/reservas/shards.py`). Com um único alias o sharding fica desabilitado.
+# A posição na lista define a faixa de ids do shard, portanto novos shards
+# devem ser adicionados ao fim. Pode ser definido pela variável de ambiente
+# SHARDS, ex: SHARDS=default,shard_1,shard_2.
+SHARDS = os.environ.get('SHARDS', 'default').split(',')
+
+# Banco do diretório que registra o shard de cada imóvel.
+SHARDS_CATALOGO = 'default'
+
+# Quando True, as consultas executadas em todos os shards são feitas em
+# paralelo, com uma thread por shard.
+SHARDS_PARALELO = True
+
+# Os shards ausentes em DATABASES são declarados como arquivos SQLite locais
+# (db_<alias>.sqlite3), para experimentar o sharding em desenvolvimento. Nos
+# testes `shard_1` e `shard_2` são sempre declarados para os testes do
+# sharding; os bancos de teste do SQLite ficam em memória.
+for alias in [*SHARDS, *(['shard_1', 'shard_2'] if sys.argv[1:2] == ['test'] else [])]:
+    DATABASES.setdefault(alias, {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'db_{alias}.sqlite3',
+    })
+
+
+# Pré-reservas
+# Segundos durante os quais uma pré-reserva ocupa o período antes de
+# expirar. As expiradas são removidas por
+# `python manage.py remover_pre_reservas_expiradas`, que pode ser agendado
+# (ex: cron a cada minuto).
+PRE_RESERVA_DURACAO = 600
+
+
+# Aquecimento dos workers
+# Quando True, os módulos `wsgi` e `asgi` pré-computam as urls, os campos dos
+# serializers e os metadados dos modelos ao carregar a aplicação, antes do
+# fork dos workers (ver `seazonecodechallenge/aquecimento.py`).
+AQUECIMENTO_WORKERS = True
+
+
+# Testes
+# Executor que carrega as fixtures compartilhadas uma única vez e reporta o
+# tempo de cada teste (ver `seazonecodechallenge/runner.py`).
+TEST_RUNNER = 'seazonecodechallenge.runner.ExecutorTestes'
+
+# Fixtures carregadas no banco de testes antes da execução dos testes.
+TESTES_FIXTURES = ['test_db_backup.json']
@@ -0,0 +1,44 @@
+"""
+Perfil de settings dos workers da API.
+
+As urls do projeto servem apenas a API (`api/`), então este perfil remove os
+apps e middlewares que só existem para o admin e para as páginas HTML do
+Django: admin, sessões, mensagens, arquivos estáticos e o renderer navegável
+do DRF. Sem eles os workers importam menos módulos na inicialização e ocupam
+menos memória.
+
+Uso: DJANGO_SETTINGS_MODULE=seazonecodechallenge.settings_api
+
+Os ganhos podem ser medidos com `python manage.py perfil_importacao`.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+
+INSTALLED_APPS = [
+    'rest_framework',
+    'apps.reservas',
+    'apps.tarefas'
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'apps.reservas.middleware.CompressaoMiddleware',
+    'apps.reservas.memoria.MemoriaMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
+# Nenhuma resposta da API é renderizada por templates
+TEMPLATES = []
+
+REST_FRAMEWORK = {
+    # Sem o renderer navegável o DRF não importa os formulários e templates
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+    ],
+    # A API não possui usuários. Sem autenticação o DRF não importa o
+    # `django.contrib.auth` e os clientes são identificados pelo IP.
+    'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'DEFAULT_PERMISSION_CLASSES': [],
+    'UNAUTHENTICATED_USER': None,
+}
@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'seazonecodechallenge.settings')
 
 application = get_wsgi_application()
+
+# Aquece os caches do worker antes do fork (ver `seazonecodechallenge/aquecimento.py`)
+if settings.AQUECIMENTO_WORKERS:
+    from seazonecodechallenge.aquecimento import aquecer
+
+    aquecer()